@@ -0,0 +1,202 @@
+"""
+Analyzes large sets of positions with the bot across a process pool, streaming one JSON result per position to a JSONL
+file: the best move, score, search depth, nodes searched and time taken.
+
+Positions are read lazily, from FEN lines or from every position of the games in PGN files, and at most a fixed number
+of them are waiting in the pool at any time, so memory use stays flat however many positions are analyzed. Results are
+written in input order. Each worker opens the opening book and tablebases once and keeps them for every position it
+analyzes.
+
+Usage examples:
+    python analyzePositions.py positions.fen --depth 2 --out results.jsonl
+    python analyzePositions.py --pgn games.pgn --engine mate --depth 1
+    cat positions.fen | python analyzePositions.py - --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.fen import Fen
+from chessCore.pgn import Pgn, San
+from headlessChess import HeadlessGame, createBrain, engineNames
+
+# Settings of the process's analysis worker, set by initWorker
+workerSettings = None
+
+
+def initWorker(settings):
+    """
+    Pool initializer.
+    :param settings: dict with the keys "engine", "depth", "book", "tablebases" and "mctsSeconds"
+    :return: None
+    """
+    global workerSettings
+    workerSettings = settings
+
+
+def analyzePosition(fenStr, settings=None):
+    """
+    Pool worker. Searches a position for the player to move.
+    :param fenStr: str FEN of the position
+    :param settings: dict of settings, see initWorker. Defaults to the worker's settings
+    :return: dict of the analysis, with the keys "fen", "bestMove" (coordinate notation, e.g. "e2e4"), "san", "score"
+    (black maximizes, None if the engine does not score moves), "depth" (None if the move was not searched to a fixed
+    depth), "nodes" and "timeMs". Positions that cannot be analyzed have an "error" key instead
+    """
+    settings = settings or workerSettings
+    try:
+        chessBoard = ChessBoardSim.fromFen(fenStr, HeadlessGame.pieceValues)
+    except Exception as error:
+        return {"fen": fenStr, "error": f"invalid FEN: {error}"}
+    if chessBoard.gameOver:
+        return {"fen": fenStr, "error": f"game over: {chessBoard.gameOver.lower()}"}
+
+    brain = createBrain(chessBoard, chessBoard.game.currentColor, settings["engine"], settings["depth"],
+                        bookPath=settings["book"], tablebaseDir=settings["tablebases"],
+                        mctsSeconds=settings["mctsSeconds"])
+
+    # Errors are returned rather than raised, as a raised error would end the whole run and lose the results of the
+    # positions analyzed after it
+    try:
+        startTime = time.perf_counter()
+        piece, rowNum, colNum = brain.getMove()
+        elapsed = time.perf_counter() - startTime
+
+        fromPos = (piece.xIndex, piece.yIndex)
+        promotionName = "queen" if piece.name == "pawn" and colNum in (0, 7) else None
+        san = San.fromMove(chessBoard, piece, (rowNum, colNum), promotionName)
+        chessBoard.playMove(piece, rowNum, colNum)
+    except Exception as error:
+        return {"fen": fenStr, "error": f"analysis failed: {type(error).__name__}: {error}"}
+    finally:
+        brain.close()
+
+    # Only the fixed depth searches have a depth, not random or mcts moves, nor book or tablebase ones
+    depth = brain.recursionDepth if brain.searchStats.engine in ["minimax", "mate"] else None
+    return {"fen": fenStr, "bestMove": HeadlessGame.formatMove((fromPos, (rowNum, colNum), promotionName)),
+            "san": san + San.suffix(chessBoard), "score": brain.lastScore, "depth": depth,
+            "nodes": brain.searchStats.nodes, "timeMs": round(elapsed * 1000, 3)}
+
+
+def readFens(fileObj):
+    """
+    :param fileObj: file object of FEN lines. Blank lines and lines starting with "#" are skipped
+    :return: generator of str FENs
+    """
+    for line in fileObj:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def readGamePositions(fileObj):
+    """
+    :param fileObj: file object of a PGN file
+    :return: generator of the str FEN of every position of every game, after each move and before the first
+    """
+    for headers, sanMoves, _ in Pgn.readGames(fileObj):
+        yield headers["FEN"] if headers.get("SetUp") == "1" and "FEN" in headers else Fen.startingFen
+        try:
+            for _, chessBoard in Pgn.replayGame(headers, sanMoves, HeadlessGame.pieceValues):
+                if not chessBoard.gameOver:
+                    yield chessBoard.toFen()
+        except Exception:
+            # The rest of the game cannot be followed, e.g. it contains a move the rules here do not allow
+            continue
+
+
+class Analyzer:
+    """
+    A pool of analysis workers. Positions are submitted as they are read, with at most maxInFlight of them submitted
+    but not yet collected: a slow consumer of the results holds up the reading of further positions rather than letting
+    them queue up in memory.
+    """
+    def __init__(self, settings, workers=os.cpu_count(), maxInFlight=None):
+        """
+        :param settings: dict of settings, see initWorker
+        :param workers: int number of worker processes
+        :param maxInFlight: int positions submitted at a time. Defaults to 4 per worker
+        """
+        self.settings = settings
+        self.workers = workers
+        self.maxInFlight = maxInFlight or 4 * workers
+        self.pool = multiprocessing.Pool(workers, initializer=initWorker, initargs=(settings,))
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def analyze(self, fens):
+        """
+        :param fens: iterable of str FENs, read only as fast as results are collected
+        :return: generator of result dicts (see analyzePosition), in the order of fens
+        """
+        pending = deque()
+        for fenStr in fens:
+            pending.append(self.pool.apply_async(analyzePosition, (fenStr,)))
+            if len(pending) >= self.maxInFlight:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze positions with the bot, writing JSONL results.")
+    parser.add_argument("fenFiles", nargs="*", help="files of FEN lines to analyze, - for stdin")
+    parser.add_argument("--pgn", nargs="*", default=[], help="PGN files whose every position is analyzed")
+    parser.add_argument("--engine", choices=engineNames, default="minimax")
+    parser.add_argument("--depth", type=int, default=2, help="minimax search depth")
+    parser.add_argument("--mcts-seconds", type=float, default=None, help="mcts search time per position")
+    parser.add_argument("--book", default=None, help="opening book file to play from")
+    parser.add_argument("--tablebases", default=None, help="endgame tablebase directory to play from")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="positions queued at a time (default 4 per worker)")
+    parser.add_argument("--out", default=None, help="JSONL file results are written to (default stdout)")
+    args = parser.parse_args()
+
+    settings = {"engine": args.engine, "depth": args.depth, "book": args.book, "tablebases": args.tablebases,
+                "mctsSeconds": args.mcts_seconds}
+
+    def readPositions():
+        for path in args.fenFiles:
+            if path == "-":
+                yield from readFens(sys.stdin)
+            else:
+                with open(path) as fenFile:
+                    yield from readFens(fenFile)
+        for path in args.pgn:
+            with open(path) as pgnFile:
+                yield from readGamePositions(pgnFile)
+
+    outFile = open(args.out, "w") if args.out else sys.stdout
+    positionCount = 0
+    startTime = time.perf_counter()
+    try:
+        with Analyzer(settings, args.workers, args.max_in_flight) as analyzer:
+            for result in analyzer.analyze(readPositions()):
+                outFile.write(json.dumps(result) + "\n")
+                positionCount += 1
+    finally:
+        if args.out:
+            outFile.close()
+
+    elapsed = time.perf_counter() - startTime
+    print(f"Positions: {positionCount}  Time: {elapsed:.2f}s  Positions/sec: {positionCount / elapsed:.1f}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+Benchmarks of the engine's hot paths and the window's drawing, saved as JSON so that later runs can be compared with
+them. The positions measured on are reached by seeded random games, so every run with the same seed measures the same
+work.
+
+Benchmarks, each timed per operation:
+    - moveGen.<piece>: MoveSet.getMoves of every piece of that type
+    - setPieceMovesets: every piece's moves of a position
+    - postMovementUpdates: the board updates after a move
+    - simConstruction: copying a position into a ChessBoardSim, as the search does for every node
+    - convertObjRepr: LightweightChessSim.convertObjRepr of a position
+    - search.minimax: a fixed depth minimax search
+    - render.fullFrame: redrawing the whole window (skipped if pygame is not installed)
+
+Memory benchmarks, measured once with tracemalloc as they do not vary between runs the way times do:
+    - memory.simConstruction: bytes and blocks allocated per ChessBoardSim copy
+    - memory.searchNode: bytes and blocks allocated per search node, a copy with a move played on it
+    - memory.search.minimax: peak memory of the minimax benchmark's search
+
+Usage examples:
+    python benchmark.py run --out baseline.json
+    python benchmark.py compare baseline.json                # runs the benchmarks again and compares them
+    python benchmark.py compare baseline.json current.json --threshold 0.05 --memory-threshold 0.02
+
+compare exits with status 1 if anything slowed down or grew by more than its threshold, for use in scripts.
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.lightweightChess import LightweightChessSim
+from chessCore.profiling import MemoryProfile, measureAllocations
+from headlessChess import HeadlessGame, createBrain
+from profileGame import measureSearchNode
+from startupTime import getCommit
+
+pieceNames = ["pawn", "knight", "bishop", "rook", "queen", "king"]
+
+# Metrics compared between runs, all of which are worse when higher, to the unit they are reported in and its size
+comparedMetrics = {"seconds": ("us/op", 1e-6), "bytes": ("B/op", 1), "blocks": ("blocks/op", 1),
+                   "peakBytes": ("peak KiB", 1024)}
+memoryMetrics = ["bytes", "blocks", "peakBytes"]
+
+
+def getPositions(seed, count=8, plies=6):
+    """
+    Plays seeded random games to reach positions spread over the opening and middlegame.
+    :param seed: int seed of the first game, incremented for each game
+    :param count: int number of positions
+    :param plies: int plies played in the first game, and added for each further game
+    :return: list of str FENs
+    """
+    positions = []
+    gameNum = 0
+    while len(positions) < count:
+        random.seed(seed + gameNum)
+        game = HeadlessGame()
+        brains = {colorPrefix: createBrain(game.chessBoard, colorPrefix, "random", 1) for colorPrefix in ["w_", "b_"]}
+        game.playBots(brains, plies * (len(positions) + 1))
+        if not game.chessBoard.gameOver:
+            positions.append(game.chessBoard.toFen())
+        gameNum += 1
+    return positions
+
+
+def loadBoards(positions):
+    return [ChessBoardSim.fromFen(fenStr, HeadlessGame.pieceValues) for fenStr in positions]
+
+
+def setupMoveGen(positions, args, pieceName):
+    pieces = [piece for chessBoard in loadBoards(positions) for pieceSet in [chessBoard.whitePieces,
+                                                                            chessBoard.blackPieces]
+              for piece in pieceSet.pieces if piece.name == pieceName]
+
+    def workload():
+        for piece in pieces:
+            piece.moveset.getMoves()
+    return workload, len(pieces)
+
+
+def setupSetPieceMovesets(positions, args):
+    chessBoards = loadBoards(positions)
+
+    def workload():
+        for chessBoard in chessBoards:
+            chessBoard.setPieceMovesets()
+    return workload, len(chessBoards)
+
+
+def setupPostMovementUpdates(positions, args):
+    # Each call hands the turn to the other player, so calls alternate between the two players' updates
+    chessBoards = loadBoards(positions)
+
+    def workload():
+        for chessBoard in chessBoards:
+            chessBoard.postMovementUpdates()
+    return workload, len(chessBoards)
+
+
+def setupSimConstruction(positions, args):
+    chessBoards = loadBoards(positions)
+
+    def workload():
+        for chessBoard in chessBoards:
+            ChessBoardSim(chessBoard, HeadlessGame.pieceValues, chessBoard.game.currentColor)
+    return workload, len(chessBoards)
+
+
+def setupConvertObjRepr(positions, args):
+    chessBoards = loadBoards(positions)
+
+    def workload():
+        for chessBoard in chessBoards:
+            LightweightChessSim.convertObjRepr(chessBoard)
+    return workload, len(chessBoards)
+
+
+def setupSearch(positions, args):
+    # A middlegame position, searched from scratch every time
+    chessBoard = loadBoards(positions)[len(positions) // 2]
+    brain = createBrain(chessBoard, chessBoard.game.currentColor, "minimax", args.search_depth)
+
+    def workload():
+        brain.getMove()
+    return workload, 1
+
+
+def setupRender(positions, args):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+    try:
+        import pygame
+        import chessboard
+    except ImportError:
+        return None
+
+    # The window loads its images from the repository's directory
+    workingDir = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        pygame.init()
+        window = chessboard.ChessWindow(pygame.display.set_mode((1350, 800)))
+        window.chessBoard.loadFen(positions[len(positions) // 2])
+        window.draw()
+    finally:
+        os.chdir(workingDir)
+
+    def workload():
+        window.chessBoard.needsFullRedraw = True
+        window.draw()
+    return workload, 1
+
+
+# Benchmark name to its setup function, which takes the positions and the run's options and returns the function to
+# time with the number of operations each of its calls performs, or None if the benchmark cannot run here
+benchmarks = {f"moveGen.{pieceName}": functools.partial(setupMoveGen, pieceName=pieceName) for pieceName in pieceNames}
+benchmarks.update({"setPieceMovesets": setupSetPieceMovesets, "postMovementUpdates": setupPostMovementUpdates,
+                   "simConstruction": setupSimConstruction, "convertObjRepr": setupConvertObjRepr,
+                   "search.minimax": setupSearch, "render.fullFrame": setupRender})
+
+
+def measureSimMemory(positions, args, count=100):
+    chessBoard = loadBoards(positions)[len(positions) // 2]
+    profile = measureAllocations(lambda: ChessBoardSim(chessBoard, HeadlessGame.pieceValues,
+                                                       chessBoard.game.currentColor), count)
+    return {"bytes": profile.bytes / count, "blocks": profile.blocks / count}
+
+
+def measureNodeMemory(positions, args, count=100):
+    profile = measureSearchNode(positions[len(positions) // 2], count)
+    return {"bytes": profile.bytes / count, "blocks": profile.blocks / count}
+
+
+def measureSearchMemory(positions, args):
+    chessBoard = loadBoards(positions)[len(positions) // 2]
+    brain = createBrain(chessBoard, chessBoard.game.currentColor, "minimax", args.search_depth)
+    with MemoryProfile():
+        _, searchStats = brain.getMoveWithStats()
+    return {"peakBytes": searchStats.peakBytes, "nodes": searchStats.nodes}
+
+
+# Memory benchmark name to its function, which takes the positions and the run's options and returns a dict of the
+# memoryMetrics it measures
+memoryBenchmarks = {"memory.simConstruction": measureSimMemory, "memory.searchNode": measureNodeMemory,
+                    "memory.search.minimax": measureSearchMemory}
+
+
+def measure(workload, operations, repeats, minSeconds):
+    """
+    Times a workload, calling it enough times per repeat for each repeat to take at least minSeconds.
+    :param workload: function to time
+    :param operations: int operations each call of workload performs
+    :param repeats: int number of timed repeats
+    :param minSeconds: float shortest time of a repeat
+    :return: dict of the median ("seconds") and fastest ("minSeconds") time per operation of the repeats, and the
+    calls per repeat ("loops")
+    """
+    workload()
+    loops = 1
+    while True:
+        startTime = time.perf_counter()
+        for _ in range(loops):
+            workload()
+        if time.perf_counter() - startTime >= minSeconds:
+            break
+        loops *= 2
+
+    times = []
+    for _ in range(repeats):
+        startTime = time.perf_counter()
+        for _ in range(loops):
+            workload()
+        times.append((time.perf_counter() - startTime) / (loops * operations))
+    return {"seconds": statistics.median(times), "minSeconds": min(times), "loops": loops, "operations": operations}
+
+
+def runBenchmarks(args):
+    """
+    :param args: argparse.Namespace of the run options, see main
+    :return: dict of the run's settings and of each benchmark's results, under "benchmarks"
+    """
+    positions = getPositions(args.seed)
+    results = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": getCommit(),
+               "python": sys.version.split()[0], "seed": args.seed, "repeats": args.repeats,
+               "searchDepth": args.search_depth, "benchmarks": {}}
+
+    for name, setup in benchmarks.items():
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        random.seed(args.seed)
+        setupResult = setup(positions, args)
+        if setupResult is None:
+            print(f"{name:<24} skipped")
+            continue
+        workload, operations = setupResult
+        result = measure(workload, operations, args.repeats, args.min_seconds)
+        results["benchmarks"][name] = result
+        print(f"{name:<24} {result['seconds'] * 1e6:>12.1f}us  (min {result['minSeconds'] * 1e6:.1f}us)")
+
+    for name, measureMemory in memoryBenchmarks.items():
+        if args.only and not any(name.startswith(prefix) for prefix in args.only):
+            continue
+        random.seed(args.seed)
+        result = measureMemory(positions, args)
+        results["benchmarks"][name] = result
+        print(f"{name:<24} " + "  ".join(f"{result[metric] / comparedMetrics[metric][1]:,.1f} "
+                                          f"{comparedMetrics[metric][0]}" for metric in memoryMetrics
+                                          if metric in result))
+    return results
+
+
+def compareResults(baseline, results, thresholds):
+    """
+    :param baseline: dict of results, see runBenchmarks
+    :param results: dict of results to compare with the baseline
+    :param thresholds: dict of metric name to float fraction by which it may grow before it counts as a regression
+    :return: tuple of (list of str report lines, list of str names of the regressed benchmarks)
+    """
+    lines = [f"{'Benchmark':<24} {'Metric':<10} {'Baseline':>12} {'Current':>12} {'Change':>8}"]
+    regressions = []
+    for name in sorted(set(baseline["benchmarks"]) | set(results["benchmarks"])):
+        if name not in results["benchmarks"] or name not in baseline["benchmarks"]:
+            lines.append(f"{name:<24} only in the {'baseline' if name in baseline['benchmarks'] else 'current run'}")
+            continue
+        for metric, threshold in thresholds.items():
+            before = baseline["benchmarks"][name].get(metric)
+            after = results["benchmarks"][name].get(metric)
+            if before is None or after is None:
+                continue
+            change = after / before - 1 if before else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  SLOWER" if metric == "seconds" else "  LARGER"
+                regressions.append(name)
+            elif change < -threshold:
+                flag = "  faster" if metric == "seconds" else "  smaller"
+            unitName, unitSize = comparedMetrics[metric]
+            lines.append(f"{name:<24} {unitName:<10} {before / unitSize:>12.1f} {after / unitSize:>12.1f} "
+                         f"{change:>+8.1%}{flag}")
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the engine and compare runs with a baseline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    runParser = subparsers.add_parser("run", help="run the benchmarks and save the results")
+    runParser.add_argument("--out", default="benchmark.json", help="JSON file the results are written to")
+    compareParser = subparsers.add_parser("compare", help="compare results with a baseline")
+    compareParser.add_argument("baseline", help="JSON results of an earlier run")
+    compareParser.add_argument("results", nargs="?", default=None,
+                               help="JSON results to compare, by default the benchmarks are run again")
+    compareParser.add_argument("--threshold", type=float, default=0.1,
+                               help="fraction by which a benchmark may slow down before it is flagged")
+    compareParser.add_argument("--memory-threshold", type=float, default=0.05,
+                               help="fraction by which a memory benchmark may grow before it is flagged")
+
+    for subparser in [runParser, compareParser]:
+        subparser.add_argument("--seed", type=int, default=0, help="seed of the games the positions come from")
+        subparser.add_argument("--repeats", type=int, default=5, help="timed repeats of each benchmark")
+        subparser.add_argument("--min-seconds", type=float, default=0.05, help="shortest time of a repeat")
+        subparser.add_argument("--search-depth", type=int, default=2, help="depth of the minimax benchmark")
+        subparser.add_argument("--only", nargs="*", default=None,
+                               help="run only the benchmarks whose names start with these")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = runBenchmarks(args)
+        with open(args.out, "w") as outFile:
+            json.dump(results, outFile, indent=2)
+        print(f"Wrote {args.out}")
+        return
+
+    with open(args.baseline) as baselineFile:
+        baseline = json.load(baselineFile)
+    if args.results:
+        with open(args.results) as resultsFile:
+            results = json.load(resultsFile)
+    else:
+        # Measure the same work as the baseline did
+        args.seed = baseline["seed"]
+        args.search_depth = baseline["searchDepth"]
+        results = runBenchmarks(args)
+        print()
+
+    thresholds = {"seconds": args.threshold}
+    thresholds.update(dict.fromkeys(memoryMetrics, args.memory_threshold))
+    lines, regressions = compareResults(baseline, results, thresholds)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import threading
+from queue import Queue, Empty
+
+from chessCore.ChessBrain import SearchCancelled
+
+
+class BotWorker:
+    """
+    Runs a ChessBrain search on a background thread so that the window keeps drawing and handling events while the bot
+    is thinking. Finished moves are placed onto a queue which the window polls once per frame.
+
+    A thread is used rather than a process since the search reads the live ChessBoard, whose pieces, tiles and movesets
+    hold pygame surfaces and cyclic references that cannot be cheaply sent to another process. The board is not mutated
+    while a bot is thinking, as only the current player's moves are ever applied.
+    :var self.brain: ChessBrain object that performs the search
+    :var self.results: Queue of finished moves, each in the same tuple format returned by ChessBrain.getMove
+    :var self.thread: Thread object of the search currently running, or None
+    :var self.onResult: function called from the search thread once a move has been placed onto the queue, e.g. to wake
+    a window waiting for events. None to only be polled
+    """
+    def __init__(self, brain, onResult=None):
+        self.brain = brain
+        self.results = Queue()
+        self.thread = None
+        self.onResult = onResult
+
+    def isThinking(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def requestMove(self):
+        """
+        Starts a search for the brain's next move if one is not already running or waiting to be collected.
+        :return: None
+        """
+        if self.isThinking() or not self.results.empty():
+            return
+
+        self.brain.resetCancel()
+        self.thread = threading.Thread(target=self.search, daemon=True)
+        self.thread.start()
+
+    def search(self):
+        """
+        Thread target. Cancelled searches are discarded, as the position they were searching is no longer relevant.
+        :return: None
+        """
+        try:
+            move = self.brain.getMove()
+        except SearchCancelled:
+            return
+
+        self.results.put(move)
+        if self.onResult:
+            self.onResult()
+
+    def pollMove(self):
+        """
+        Non-blocking check for a finished search.
+        :return: the move tuple of a finished search, or None if the bot is still thinking
+        """
+        try:
+            return self.results.get_nowait()
+        except Empty:
+            return None
+
+    def cancel(self):
+        """
+        Stops the running search (if any), waits for the thread to exit, discards any uncollected results and stops
+        the brain's playout processes.
+        :return: None
+        """
+        self.brain.cancelSearch()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.brain.close()
+
+        while self.pollMove():
+            pass
@@ -0,0 +1,35 @@
+"""
+Builds an opening book (see chessCore/openingBook.py) from PGN game collections.
+
+Usage example:
+    python buildBook.py games1.pgn games2.pgn --out book.bin --max-ply 16 --min-games 2
+"""
+import argparse
+import time
+
+from chessCore.openingBook import OpeningBook
+from headlessChess import HeadlessGame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN files.")
+    parser.add_argument("pgnPaths", nargs="+", help="PGN files to read")
+    parser.add_argument("--out", default="book.bin", help="book file to write")
+    parser.add_argument("--max-ply", type=int, default=16, help="number of plies of each game to add")
+    parser.add_argument("--min-games", type=int, default=1, help="leave out moves played in fewer games than this")
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    pgnFiles = [open(path) for path in args.pgnPaths]
+    try:
+        gameCount, entryCount = OpeningBook.build(pgnFiles, args.out, HeadlessGame.pieceValues, args.max_ply,
+                                                  args.min_games)
+    finally:
+        for pgnFile in pgnFiles:
+            pgnFile.close()
+
+    print(f"Games: {gameCount}  Entries: {entryCount}  Time: {time.perf_counter() - startTime:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Generates endgame tablebases (see chessCore/tablebase.py). Tables of the smaller endings that captures lead to are
+generated first if they are missing. Three piece endings take seconds, four piece endings several minutes each.
+
+Usage example:
+    python buildTablebases.py KQvK KRvK KQvKR --dir tablebases
+"""
+import argparse
+import time
+
+from chessCore.tablebase import Tablebase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases.")
+    parser.add_argument("endings", nargs="+", help="pawnless endings of up to four pieces, e.g. KQvK or KBNvK")
+    parser.add_argument("--dir", default="tablebases", help="directory the tables are written to")
+    args = parser.parse_args()
+
+    tablebase = Tablebase(args.dir)
+    startTime = time.perf_counter()
+
+    def progress(message):
+        print(f"[{time.perf_counter() - startTime:7.1f}s] {message}")
+
+    for ending in args.endings:
+        tablebase.generate(ending, progress)
+        progress(f"{ending} done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+TODO:
+    - implement way to create deep copy of the entire ChessBoard object OR
+    - store the state of its attributes only
+        - Ensure that this does not occur during promotion (separate method call)
+"""
+import time
+import tracemalloc
+from random import randrange
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.chessGame import Game
+from chessCore.mateSolver import MateSolver
+from chessCore.mcts import Mcts
+from chessCore.searchStats import SearchStats
+from chessCore.tracing import Trace
+
+
+class SearchCancelled(Exception):
+    """
+    Raised from within a search once ChessBrain.cancelSearch has been called, unwinding the recursion immediately.
+    """
+    pass
+
+
+class ChessBrain:
+    def __init__(self, chessBoard, selfPieceset):
+        self.chessBoard = chessBoard
+        self.pieceSet = selfPieceset
+
+        # White pieces are always the minimizer
+        self.minimizer = True if selfPieceset.colorPrefix == "w_" else False
+        self.boardValue = None
+
+        self.recursionDepth = 3
+        self.pieceValues = {"pawn": 10, "knight": 30, "bishop": 30, "rook": 40, "queen": 90, "king": 900}
+
+        # Score given to drawn positions, i.e. neither side is ahead
+        self.drawScore = 0
+
+        # Set from another thread to stop a search in progress
+        self.searchCancelled = False
+
+        # SearchStats object of the last (or current) getMove, and the score of the move the last miniMax search chose
+        self.searchStats = None
+        self.lastScore = None
+
+        # Method that chooses a move once the position is out of book
+        self.searchMethod = self.getRandomMove
+        # OpeningBook object, or None to always search
+        self.openingBook = None
+        # Tablebase object, or None to always search
+        self.tablebase = None
+        # Score of a tablebase win with mate on the board, from the winner's point of view. Slower mates score lower
+        self.tablebaseWinScore = 100 * self.pieceValues["king"]
+        # Number of moves within which getMateMove looks for a forced mate
+        self.mateSearchMoves = 3
+
+        # Limits of each getMctsMove search: playouts, seconds (None for no time limit), and playout processes
+        self.mctsIterations = 1000
+        self.mctsSeconds = None
+        self.mctsWorkers = 1
+        # Mcts object, kept between moves so that its tree can be reused
+        self.mcts = None
+
+    # Names of the search methods in SearchStats
+    engineNames = {"getRandomMove": "random", "getMiniMaxMove": "minimax", "getMateMove": "mate",
+                   "getMctsMove": "mcts"}
+
+    def getMove(self):
+        """
+        Plays a book move if the position is in the opening book, or the tablebase's best move if it is in the
+        tablebase, otherwise searches for a move.
+        :return: tuple of the ChessPiece object to move and the x and y indices of the tile to move it to
+        """
+        return self.getMoveWithStats()[0]
+
+    def getMoveWithStats(self):
+        """
+        :return: tuple of (move tuple as returned by getMove, SearchStats object of the search that chose it)
+        """
+        methodName = self.searchMethod.__name__
+        self.searchStats = SearchStats(ChessBrain.engineNames.get(methodName, methodName))
+        # The peak memory is only known while tracemalloc is tracing, e.g. when profiling memory
+        tracingMemory = tracemalloc.is_tracing()
+        if tracingMemory:
+            tracemalloc.reset_peak()
+            startBytes = tracemalloc.get_traced_memory()[0]
+        startTime = time.perf_counter()
+        move = self.chooseMove()
+        self.searchStats.seconds = time.perf_counter() - startTime
+        if tracingMemory:
+            self.searchStats.peakBytes = tracemalloc.get_traced_memory()[1] - startBytes
+
+        if Trace.search <= Trace.INFO:
+            Trace.emit("search", Trace.INFO, "searchStats", color=self.pieceSet.colorPrefix,
+                       **self.searchStats.toDict())
+        return move, self.searchStats
+
+    def chooseMove(self):
+        if self.openingBook:
+            bookMove = self.openingBook.getMove(self.chessBoard)
+            if bookMove:
+                # Book promotions are not followed, as promotion choices are made separately through
+                # getPromotionChoice
+                self.searchStats.engine = "book"
+                piece, xIndex, yIndex, _ = bookMove
+                return piece, xIndex, yIndex
+
+        if self.tablebase:
+            tablebaseMove = self.getTablebaseMove()
+            if tablebaseMove:
+                self.searchStats.engine = "tablebase"
+                return tablebaseMove
+
+        return self.searchMethod()
+
+    def getTablebaseMove(self):
+        """
+        Picks the move that mates fastest in won positions, draws in drawn ones and delays mate longest in lost ones.
+        :return: tuple in the same format as getMove, or None if the position is not in the tablebase
+        """
+        if not self.tablebase.probe(self.chessBoard):
+            return None
+
+        bestMove = None
+        bestRank = None
+        for piece in self.pieceSet.pieces:
+            for move in piece.moveset.getListifiedVerifiedset():
+                chessSim = ChessBoardSim(self.chessBoard, self.pieceValues, self.pieceSet.colorPrefix)
+                chessSim.getBotMove(piece, move[0], move[1])
+                childResult = self.tablebase.probe(chessSim)
+                if chessSim.gameOver == "CHECKMATE":
+                    rank = (0, 0)
+                elif not childResult or childResult[0] == "DRAW":
+                    rank = (1, 0)
+                elif childResult[0] == "LOSS":
+                    # The opponent is lost after the move
+                    rank = (0, childResult[1])
+                else:
+                    rank = (2, -childResult[1])
+
+                if bestRank is None or rank < bestRank:
+                    bestMove = (piece, move[0], move[1])
+                    bestRank = rank
+
+        return bestMove
+
+    def getTablebaseScore(self, chessBoard, tablebaseResult):
+        """
+        :param chessBoard: ChessBoardSim object reached during search
+        :param tablebaseResult: tuple returned by Tablebase.probe for the position
+        :return: int score of the position, on the same scale as ChessBoardSim.score (black maximizes)
+        """
+        result, plies = tablebaseResult
+        if result == "DRAW":
+            return self.drawScore
+
+        score = self.tablebaseWinScore - plies
+        if (result == "WIN") != (chessBoard.game.currentColor == "b_"):
+            score = -score
+        return score
+
+    def cancelSearch(self):
+        """
+        Requests that the current search stop as soon as possible. Safe to call from a thread other than the one
+        performing the search.
+        :return: None
+        """
+        self.searchCancelled = True
+
+    def resetCancel(self):
+        self.searchCancelled = False
+
+    def close(self):
+        """
+        Stops the MCTS playout processes, if any. The brain can still be used afterwards, starting them again if needed.
+        :return: None
+        """
+        if self.mcts:
+            self.mcts.close()
+
+    def getPromotionChoice(self):
+        # always pick queen
+        # TODO: implement proper promotion mechanism. How do we work promotion in?
+        return 0
+
+    def getRandomMove(self):
+        randoPiece = self.pieceSet.pieces[randrange(0, len(self.pieceSet.pieces))]
+
+        # make sure the randomly selected piece has a valid move (Presence of at least 1 legal move is checked external)
+        while not len(randoPiece.moveset):
+            randoPiece = self.pieceSet.pieces[randrange(0, len(self.pieceSet.pieces))]
+
+        listVerifiedMoveset = randoPiece.moveset.getListifiedVerifiedset()
+
+        xIndex, yIndex = listVerifiedMoveset[randrange(0, len(listVerifiedMoveset))]
+
+        return randoPiece, xIndex, yIndex
+
+    def getRandomPromotion(self):
+        return randrange(0, 3)
+
+    def getMiniMaxMove(self):
+        nodesBefore = self.searchStats.nodes
+        startTime = time.perf_counter()
+        miniMaxDict = self.miniMax(self.chessBoard, 0)
+        self.searchStats.iterations.append((self.recursionDepth, self.searchStats.nodes - nodesBefore,
+                                            time.perf_counter() - startTime))
+
+        if self.pieceSet.colorPrefix == "w_":
+            key = min(miniMaxDict)
+        elif self.pieceSet.colorPrefix == "b_":
+            key = max(miniMaxDict)
+
+        self.lastScore = key
+        if Trace.search <= Trace.INFO:
+            # Scores are the dict's keys, which JSON objects cannot have as numbers
+            Trace.emit("search", Trace.INFO, "miniMax", color=self.pieceSet.colorPrefix, depth=self.recursionDepth,
+                       score=key, moves=[[score, pieceIndex, moveIndex]
+                                                           for score, (pieceIndex, moveIndex) in miniMaxDict.items()])
+
+        piece = self.pieceSet.pieces[miniMaxDict[key][0]]
+        moveTuple = piece.moveset.getListifiedVerifiedset()[miniMaxDict[key][1]]
+
+        return piece, moveTuple[0], moveTuple[1]
+
+    def getMateMove(self):
+        """
+        Plays the first move of the shortest forced mate within mateSearchMoves moves if there is one, otherwise
+        searches with miniMax.
+        :return: tuple in the same format as getMove
+        """
+        solver = MateSolver(self.pieceValues)
+        line = solver.findMate(self.chessBoard, self.mateSearchMoves)
+        self.searchStats.nodes += solver.nodes
+        self.searchStats.hashProbes = solver.hashProbes
+        self.searchStats.hashHits = solver.hashHits
+        # Iterations of the solver are numbered by the attacker's moves rather than by plies
+        self.searchStats.iterations += solver.iterations
+        if line is None:
+            return self.getMiniMaxMove()
+
+        (fromX, fromY), (toX, toY) = line[0]
+        return self.chessBoard.board[fromX][fromY].currentPiece, toX, toY
+
+    def getMctsMove(self):
+        """
+        Searches with Monte Carlo tree search, see Mcts.
+        :return: tuple in the same format as getMove
+        """
+        if self.mcts is None:
+            self.mcts = Mcts(self.pieceValues, self.mctsWorkers)
+
+        maxIterations = self.mctsIterations if self.mctsSeconds is None else None
+        move = self.mcts.search(self.chessBoard, maxIterations, self.mctsSeconds, lambda: self.searchCancelled)
+        if self.searchCancelled:
+            raise SearchCancelled()
+        # Each playout adds a node to the tree and evaluates it
+        self.searchStats.nodes = self.searchStats.leafEvaluations = self.mcts.iterations
+
+        if move is None:
+            # No playout finished, e.g. with a very short time limit, or the position counts as over (such as a
+            # repetition) though moves can still be played
+            if not any(len(piece.moveset) for piece in self.pieceSet.pieces):
+                raise Exception("No legal move to play")
+            return self.getRandomMove()
+
+        (fromX, fromY), (toX, toY) = move
+        return self.chessBoard.board[fromX][fromY].currentPiece, toX, toY
+
+    @staticmethod
+    def isDrawnPosition(chessBoard):
+        """
+        Checks whether a simulated position is a draw. A position that repeats within the search is treated as a draw
+        already: if repeating it once was best, repeating it again will be too.
+        :param chessBoard: ChessBoardSim object reached during search
+        :return: bool
+        """
+        return chessBoard.gameOver in Game.drawResults or chessBoard.game.repetitionCount() >= 2
+
+    def miniMax(self, chessBoard, depth):
+        self.searchStats.countNode(depth)
+        selfPieceSet = chessBoard.getPieceSet(chessBoard.game.currentColor)
+
+        # print("Depth: ", depth, "    currentColor: ", chessBoard.game.currentColor)
+
+        boardValues = {}
+
+        if depth and self.isDrawnPosition(chessBoard):
+            self.searchStats.leafEvaluations += 1
+            return {self.drawScore: "empty"}
+
+        if depth and self.tablebase:
+            tablebaseResult = self.tablebase.probe(chessBoard)
+            if tablebaseResult:
+                self.searchStats.leafEvaluations += 1
+                return {self.getTablebaseScore(chessBoard, tablebaseResult): "empty"}
+
+        if depth == self.recursionDepth or chessBoard.gameOver:
+            self.searchStats.leafEvaluations += 1
+            return {chessBoard.score: "empty"}
+
+
+
+        pieceIndex = 0
+        while pieceIndex < len(selfPieceSet.pieces):
+            piece = selfPieceSet.pieces[pieceIndex]
+
+            listVerifiedset = piece.moveset.getListifiedVerifiedset()
+            moveIndex = 0
+            while moveIndex < len(listVerifiedset):
+                if self.searchCancelled:
+                    raise SearchCancelled()
+
+                move = listVerifiedset[moveIndex]
+                assert selfPieceSet.colorPrefix == chessBoard.game.currentColor, "bruh"
+                chessSim = ChessBoardSim(chessBoard, self.pieceValues, selfPieceSet.colorPrefix)
+                chessSim.getBotMove(piece, move[0], move[1])
+
+                if selfPieceSet.colorPrefix == "w_":
+                    boardValues[min(self.miniMax(chessSim, depth + 1))] = (pieceIndex, moveIndex)
+                else:
+                    boardValues[max(self.miniMax(chessSim, depth + 1))] = (pieceIndex, moveIndex)
+
+                moveIndex += 1
+            pieceIndex += 1
+
+        return boardValues
+
+
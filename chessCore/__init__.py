@@ -0,0 +1,35 @@
+"""
+Chess rules and engine, independent of pygame. Nothing in this package touches the display, loads images or has other
+side effects at import time, so it can be imported cheaply by engine worker processes and on display-less machines.
+
+    - moveset: MoveSet, per-piece move generation
+    - chessGame: Game and CheckPiece, turn flow, check, and game-ending conditions
+    - chessboardBot: ChessBoardSim, the display-less board used for search and headless games
+    - ChessBrain: the bot
+    - boardState/fen/zobrist: position snapshots, FEN and hashing
+    - pgn: SAN and PGN game records
+    - openingBook: memory-mapped opening books
+    - tablebase: endgame tablebases for small pawnless endings
+    - mateSolver: forced mate search
+    - mcts: Monte Carlo tree search
+    - searchStats: statistics of the bot's searches
+    - profiling: sampling profiler, collapsed stacks for flamegraphs and tracemalloc memory profiles
+    - timing: timers for measuring where the time goes
+    - tracing: structured JSONL tracing of the engine, off by default
+"""
+from chessCore.moveset import MoveSet
+from chessCore.chessGame import Game, CheckPiece
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.ChessBrain import ChessBrain
+from chessCore.boardState import BoardState
+from chessCore.fen import Fen
+from chessCore.zobrist import Zobrist
+from chessCore.pgn import San, GameRecord, Pgn, PgnWriter
+from chessCore.openingBook import OpeningBook
+from chessCore.tablebase import Material, Tablebase
+from chessCore.mateSolver import MateSolver
+from chessCore.mcts import Mcts, MctsNode
+from chessCore.searchStats import SearchStats
+from chessCore.profiling import MemoryProfile, StackSampler
+from chessCore.timing import RollingStats, Timings
+from chessCore.tracing import Trace
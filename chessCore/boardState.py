@@ -0,0 +1,166 @@
+import struct
+
+
+class BoardState:
+    """
+    Plain description of a full game state, independent of any particular board class. Used to move positions between
+    ChessBoard, ChessBoardSim and LightweightChessSim objects, and to/from compact binary snapshots.
+
+    Binary snapshots are a fixed 45 bytes:
+        - 1 byte format version
+        - 32 bytes of tiles, two tiles per byte. Each 4 bit code is 0 for an empty tile, otherwise the piece code (see
+          pieceCodes) with bit 3 set for black pieces. Tiles are ordered the same way as ChessBoard.board, i.e. x major
+        - 1 byte of flags: bit 0 is set when black is to move, bits 1/2 when the white/black king is in check
+        - 8 bytes of unMoved flags, one bit per tile index (x * 8 + y)
+        - 1 byte of the recent double step pawn's tile index, 255 if there is none
+        - 2 bytes of turnsSinceCapture
+    :var self.squares: 8x8 list indexed [x][y] like ChessBoard.board. Each item is None or a (colorPrefix, pieceName)
+    tuple
+    :var self.currentColor: str color prefix of the player to move
+    :var self.unMoved: set of (x, y) tuples of the pieces that have not moved yet
+    :var self.recentDoublestep: (x, y) tuple of the pawn that double stepped in the previous turn, or None
+    :var self.turnsSinceCapture: int
+    :var self.inCheck: dict of two bool values, same as Game.inCheck
+    :var self.fullmoveNumber: int of the current move number, same as Game.fullmoveNumber. Not part of binary
+    snapshots
+    """
+    version = 1
+    byteFormat = struct.Struct("<B32sBQBH")
+    size = byteFormat.size
+
+    pieceCodes = {"pawn": 1, "knight": 2, "bishop": 3, "rook": 4, "queen": 5, "king": 6}
+    pieceNames = {code: name for name, code in pieceCodes.items()}
+    blackBit = 8
+    noDoublestep = 255
+
+    def __init__(self):
+        self.squares = [[None] * 8 for x in range(8)]
+        self.currentColor = "w_"
+        self.unMoved = set()
+        self.recentDoublestep = None
+        self.turnsSinceCapture = 0
+        self.inCheck = {"b_": False, "w_": False}
+        self.fullmoveNumber = 1
+
+    def __eq__(self, other):
+        return isinstance(other, BoardState) and self.squares == other.squares and \
+            self.currentColor == other.currentColor and self.unMoved == other.unMoved and \
+            self.recentDoublestep == other.recentDoublestep and \
+            self.turnsSinceCapture == other.turnsSinceCapture and self.inCheck == other.inCheck
+
+    @staticmethod
+    def opponentOf(colorPrefix):
+        return "b_" if colorPrefix == "w_" else "w_"
+
+    def getPieces(self):
+        """
+        Gets every piece in the state along with its position.
+        :return: list of (colorPrefix, pieceName, (x, y)) tuples, ordered by tile
+        """
+        pieces = []
+        for x in range(8):
+            for y in range(8):
+                if self.squares[x][y]:
+                    colorPrefix, pieceName = self.squares[x][y]
+                    pieces.append((colorPrefix, pieceName, (x, y)))
+
+        return pieces
+
+    @staticmethod
+    def pawnStartPos(colorPrefix, pos):
+        """
+        Pawns are only allowed to double step while on their starting tile, so the start position of a loaded pawn is
+        taken to be its starting row on its current column.
+        :param colorPrefix: str color of the pawn
+        :param pos: tuple of the pawn's current indices
+        :return: tuple of the pawn's start indices
+        """
+        return (pos[0], 1) if colorPrefix == "b_" else (pos[0], 6)
+
+    @staticmethod
+    def fromBoard(chessBoard):
+        """
+        Reads the state of a ChessBoard or ChessBoardSim object.
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :return: BoardState object
+        """
+        state = BoardState()
+
+        for pieceSet in [chessBoard.whitePieces, chessBoard.blackPieces]:
+            for piece in pieceSet.pieces:
+                state.squares[piece.xIndex][piece.yIndex] = (piece.colorPrefix, piece.name)
+                if piece.unMoved:
+                    state.unMoved.add((piece.xIndex, piece.yIndex))
+
+        game = chessBoard.game
+        state.currentColor = game.currentColor
+        if game.recentDoublestep:
+            state.recentDoublestep = (game.recentDoublestep.xIndex, game.recentDoublestep.yIndex)
+        state.turnsSinceCapture = game.turnsSinceCapture
+        state.fullmoveNumber = game.fullmoveNumber
+        state.inCheck = dict(game.inCheck)
+
+        return state
+
+    def toBytes(self):
+        """
+        Encodes the state into a fixed size binary snapshot.
+        :return: bytes of length BoardState.size
+        """
+        tiles = bytearray(32)
+        unMovedMask = 0
+
+        for x in range(8):
+            column = self.squares[x]
+            for y in range(8):
+                if column[y]:
+                    colorPrefix, pieceName = column[y]
+                    code = BoardState.pieceCodes[pieceName]
+                    if colorPrefix == "b_":
+                        code |= BoardState.blackBit
+
+                    index = x * 8 + y
+                    tiles[index >> 1] |= code << (4 * (index & 1))
+
+        for x, y in self.unMoved:
+            unMovedMask |= 1 << (x * 8 + y)
+
+        flags = (self.currentColor == "b_") | (self.inCheck["w_"] << 1) | (self.inCheck["b_"] << 2)
+
+        if self.recentDoublestep:
+            doublestepIndex = self.recentDoublestep[0] * 8 + self.recentDoublestep[1]
+        else:
+            doublestepIndex = BoardState.noDoublestep
+
+        return BoardState.byteFormat.pack(BoardState.version, bytes(tiles), flags, unMovedMask, doublestepIndex,
+                                          self.turnsSinceCapture)
+
+    @staticmethod
+    def fromBytes(data):
+        """
+        Decodes a binary snapshot created by toBytes.
+        :param data: bytes-like object of length BoardState.size
+        :return: BoardState object
+        """
+        version, tiles, flags, unMovedMask, doublestepIndex, turnsSinceCapture = BoardState.byteFormat.unpack(data)
+        if version != BoardState.version:
+            raise Exception(f"Unsupported snapshot version {version}")
+
+        state = BoardState()
+
+        for index in range(64):
+            code = (tiles[index >> 1] >> (4 * (index & 1))) & 0xF
+            if code:
+                colorPrefix = "b_" if code & BoardState.blackBit else "w_"
+                state.squares[index >> 3][index & 7] = (colorPrefix, BoardState.pieceNames[code & 7])
+
+                if unMovedMask >> index & 1:
+                    state.unMoved.add((index >> 3, index & 7))
+
+        state.currentColor = "b_" if flags & 1 else "w_"
+        state.inCheck = {"b_": bool(flags & 4), "w_": bool(flags & 2)}
+        if doublestepIndex != BoardState.noDoublestep:
+            state.recentDoublestep = (doublestepIndex >> 3, doublestepIndex & 7)
+        state.turnsSinceCapture = turnsSinceCapture
+
+        return state
@@ -1,4 +1,6 @@
-from moveset import MoveSet
+from chessCore.moveset import MoveSet
+from chessCore.tracing import Trace
+from chessCore.zobrist import Zobrist
 
 
 class Game:
@@ -9,8 +11,13 @@ class Game:
     :var self.currentColor: str representation of the current turn
     :var self.opponentColor: str representation of the other player
     :var self.inCheck: dict of two bool values. Represents whether either player's king is in check.
+    :var self.positionHash: int Zobrist hash of the current position, updated incrementally on every move
+    :var self.positionHistory: dict of position hashes to the number of times they have occurred since the last
+    irreversible move (capture or pawn move)
     """
-    diagnostic = False
+
+    # checkGameOver results that end the game without a winner
+    drawResults = ["STALEMATE", "DRAW", "REPETITION", "INSUFFICIENT MATERIAL"]
 
     def __init__(self, board):
         self.chessBoard = board
@@ -23,24 +30,128 @@ class Game:
 
         self.kingStuck = False
         self.legalMoveExists = False
+        # Halfmove clock of the 50 move rule and FEN: turns since the last capture or pawn move
         self.turnsSinceCapture = 0
+        # Whether the clock was reset by the move of the current turn, which is then not counted when the turn passes
+        self.halfmoveClockReset = False
+        self.fullmoveNumber = 1
+
+        self.positionHash = 0
+        # En passant key XOR'd into positionHash, see Zobrist.enPassantKey
+        self.enPassantHashKey = 0
+        self.positionHistory = {}
 
     def alternateCurrentColor(self):
         temp = self.currentColor
         self.currentColor = self.opponentColor
         self.opponentColor = temp
 
-        self.turnsSinceCapture += 1
-        if Game.diagnostic:
-            print(f"[[[[[[[[[[[[[[[[[[[[[[[[[[[[{self.turnsSinceCapture}]]]]]]]]]]]]]]]]]")
+        if self.halfmoveClockReset:
+            self.halfmoveClockReset = False
+        else:
+            self.turnsSinceCapture += 1
+        if self.currentColor == "w_":
+            self.fullmoveNumber += 1
+        if Trace.game <= Trace.DEBUG:
+            Trace.emit("game", Trace.DEBUG, "turn", color=self.currentColor, turnsSinceCapture=self.turnsSinceCapture,
+                       fullmoveNumber=self.fullmoveNumber)
+
+        # The position is complete once the turn changes, so it is recorded here
+        self.positionHash ^= Zobrist.blackToMoveKey ^ self.enPassantHashKey
+        self.enPassantHashKey = Zobrist.enPassantKey(self.chessBoard, self.recentDoublestep, self.currentColor)
+        self.positionHash ^= self.enPassantHashKey
+        self.positionHistory[self.positionHash] = self.positionHistory.get(self.positionHash, 0) + 1
+
+    def initPositionHash(self):
+        """
+        Computes the hash of the current position from scratch and restarts the position history from it. To be called
+        once the board's pieces have been placed.
+        :return: None
+        """
+        self.positionHash = Zobrist.hashBoard(self.chessBoard, self.currentColor)
+        self.enPassantHashKey = Zobrist.enPassantKey(self.chessBoard, self.recentDoublestep, self.currentColor)
+        self.positionHistory = {self.positionHash: 1}
 
-    @staticmethod
-    def movePiece(oldTile, newTileIndices):
+    def rehashPosition(self):
+        """
+        Recomputes the position hash without touching the history. Needed after promotion, since the promoted piece
+        changes name outside of the Game object.
+        :return: None
+        """
+        self.positionHash = Zobrist.hashBoard(self.chessBoard, self.currentColor)
+        self.enPassantHashKey = Zobrist.enPassantKey(self.chessBoard, self.recentDoublestep, self.currentColor)
+
+    def clearPositionHistory(self):
+        """
+        Positions before an irreversible move can never occur again, so they are dropped from the history.
+        :return: None
+        """
+        self.positionHistory = {}
+
+    def resetHalfmoveClock(self):
+        """
+        Called on captures and pawn moves.
+        :return: None
+        """
+        self.turnsSinceCapture = 0
+        self.halfmoveClockReset = True
+
+    def repetitionCount(self):
+        """
+        :return: int of the number of times the current position has occurred since the last irreversible move
+        """
+        return self.positionHistory.get(self.positionHash, 0)
+
+    def loadState(self, state):
+        """
+        Sets the turn-based attributes from a BoardState. The board's pieces must already have been placed.
+        :param state: BoardState object
+        :return: None
+        """
+        self.currentColor = state.currentColor
+        self.opponentColor = "b_" if state.currentColor == "w_" else "w_"
+        self.inCheck = dict(state.inCheck)
+        self.turnsSinceCapture = state.turnsSinceCapture
+        self.halfmoveClockReset = False
+        self.fullmoveNumber = state.fullmoveNumber
+
+        if state.recentDoublestep:
+            self.recentDoublestep = self.chessBoard.board[state.recentDoublestep[0]][state.recentDoublestep[1]].currentPiece
+        else:
+            self.recentDoublestep = False
+
+        self.initPositionHash()
+
+    def findCheckingPieces(self, opponentPieceSet, king):
+        """
+        Flags the opponent pieces attacking the current color's king and updates its check status. Unlike
+        updateCheckStatus, this is for positions that were loaded rather than moved into, where no previous move exists
+        to have caused the check.
+        :param opponentPieceSet: PieceSet object of the opponent
+        :param king: ChessPiece object of the current color's king
+        :return: None
+        """
+        checkStatus = False
+        for piece in opponentPieceSet.pieces:
+            piece.moveset.checkingKing = (king.xIndex, king.yIndex) in piece.moveset.getListifiedCaptureset()
+            if piece.moveset.checkingKing:
+                checkStatus = True
+
+        self.inCheck[king.colorPrefix] = checkStatus
+
+    def movePiece(self, oldTile, newTileIndices):
         chessPiece = oldTile.currentPiece
+
+        self.positionHash ^= Zobrist.pieceKey(chessPiece) ^ Zobrist.unMovedKey(chessPiece)
         chessPiece.unMoved = False
 
         oldTile.currentPiece = None
         chessPiece.setIndices(newTileIndices)
+        self.positionHash ^= Zobrist.pieceKey(chessPiece)
+
+        if chessPiece.name == "pawn":
+            self.clearPositionHistory()
+            self.resetHalfmoveClock()
 
     def currentColorCheck(self):
         """
@@ -75,8 +186,8 @@ class Game:
         """
         checkPieceList = Game.getCheckPieces(opponentPieceSet)
 
-        if Game.diagnostic:
-            print("CHECK PIECES:", [checkPiece.name for checkPiece in checkPieceList])
+        if Trace.check <= Trace.DEBUG:
+            Trace.emit("check", Trace.DEBUG, "checkPieces", pieces=[checkPiece.name for checkPiece in checkPieceList])
         for checkPiece in checkPieceList:
             checkPieceObj = CheckPiece(checkPiece, selfPieceSet.king)
             for piece in selfPieceSet.pieces:
@@ -100,11 +211,49 @@ class Game:
             elif not self.legalMoveExists:
                 return "STALEMATE"
 
+        # Neither side can possibly checkmate
+        if self.insufficientMaterial():
+            return "INSUFFICIENT MATERIAL"
+
         # 50 move rule
         # deleteme temp changed for testing
         if self.turnsSinceCapture > 100:
             return "DRAW"
 
+        # Threefold repetition
+        if self.repetitionCount() >= 3:
+            return "REPETITION"
+
+    def insufficientMaterial(self):
+        """
+        Checks whether the position is dead, i.e. no sequence of moves could end in checkmate. Decided from the piece
+        counts of each PieceSet so that it is cheap to call every turn. Covers K v K, K + minor piece v K, and kings
+        with any number of bishops that are all on the same colored tiles.
+        :return: bool of whether the game should be drawn
+        """
+        pieceCounts = [self.chessBoard.whitePieces.pieceCounts, self.chessBoard.blackPieces.pieceCounts]
+
+        for counts in pieceCounts:
+            if counts["pawn"] or counts["rook"] or counts["queen"]:
+                return False
+
+        numKnights = pieceCounts[0]["knight"] + pieceCounts[1]["knight"]
+        numBishops = pieceCounts[0]["bishop"] + pieceCounts[1]["bishop"]
+
+        if numKnights + numBishops <= 1:
+            return True
+        elif numKnights:
+            return False
+
+        # Bishops can never attack tiles of the opposite color, so same colored bishops alone cannot checkmate
+        bishopTileColors = set()
+        for pieceSet in [self.chessBoard.whitePieces, self.chessBoard.blackPieces]:
+            for piece in pieceSet.pieces:
+                if piece.name == "bishop":
+                    bishopTileColors.add((piece.xIndex + piece.yIndex) % 2)
+
+        return len(bishopTileColors) == 1
+
     def preventKingCapture(self, king, opponentPieceSet):
         """
         Update the king's moveset to avoid any moves that could leave him in check. Works proactively and reactively,
@@ -113,10 +262,6 @@ class Game:
         :param opponentPieceSet: PieceSet object of the opponent
         :return: None
         """
-        if Game.diagnostic:
-            print(f"\n********************preventKingCapture*************** kingColor{king.colorPrefix} "
-                    f"**********************\n")
-
         for quadrantKey in king.moveset.verifiedMoveset.keys():
             updatedQuadrant = []
 
@@ -128,12 +273,6 @@ class Game:
                     opponentPieceCaptureset = opponentPieceSet.pieces[index].moveset.getListifiedCaptureset()
                     protectedPositions = opponentPieceSet.pieces[index].moveset.protectedPieces
 
-                    if Game.diagnostic:
-                        print("King move:", move)
-                        print(f"Opponent captureset and protectedpos for {opponentPieceSet.pieces[index].moveset}:")
-                        print(opponentPieceCaptureset)
-                        print(protectedPositions, "\n")
-
                     # Does not append moves that could result in the king being captured
                     if move in opponentPieceCaptureset or move in protectedPositions:
                         legalMove = False
@@ -141,17 +280,16 @@ class Game:
                     index += 1
 
                 if not legalMove:
-                    if Game.diagnostic:
-                        print("======DISCARDED====\n")
+                    if Trace.check <= Trace.DEBUG:
+                        attacker = opponentPieceSet.pieces[index]
+                        Trace.emit("check", Trace.DEBUG, "kingMoveDiscarded", king=king.colorPrefix, move=move,
+                                   attacker=attacker.name, attackerPosition=(attacker.xIndex, attacker.yIndex))
 
                     if abs(move[0] - king.xIndex) == 1:
                         # If the king cannot move to its immediate left/right, prevent castling
                         updatedQuadrant = []
                     break
                 elif legalMove:
-                    if Game.diagnostic:
-                        print("======APPENDED====\n")
-
                     updatedQuadrant.append(move)
 
             # Assign the newly created list of quadrant moves
@@ -163,8 +301,9 @@ class Game:
         else:
             self.kingStuck = True
 
-        if Game.diagnostic:
-            print("*********************************************************************\n")
+        if Trace.check <= Trace.DEBUG:
+            Trace.emit("check", Trace.DEBUG, "preventKingCapture", king=king.colorPrefix,
+                       moves=king.moveset.getListifiedVerifiedset(), kingStuck=self.kingStuck)
 
     def updateCheckStatus(self, selfPieceset, opponentKing):
         """
@@ -185,13 +324,15 @@ class Game:
                 checkStatus = True
                 selfPieceset.pieces[index].moveset.checkingKing = True
 
-                if Game.diagnostic:
-                    print(f"{self.opponentColor} is now in check")
             else:
                 selfPieceset.pieces[index].moveset.checkingKing = False
             index += 1
 
         self.inCheck[self.opponentColor] = checkStatus
+        # A legal move never leaves the mover's own king in check
+        self.inCheck[self.currentColor] = False
+        if checkStatus and Trace.check <= Trace.INFO:
+            Trace.emit("check", Trace.INFO, "inCheck", color=self.opponentColor)
 
     def checkCastling(self, tileIndices, king):
         kingMoveset = king.moveset["verifiedMoveset"]
@@ -215,15 +356,19 @@ class Game:
         capturedPiece = newTile.currentPiece
         assert capturedPiece.name != "king", "The king cannot be captured!!"
 
-        opponentPieces = self.chessBoard.getPieceSet(capturedPiece.colorPrefix).pieces
+        opponentPieceSet = self.chessBoard.getPieceSet(capturedPiece.colorPrefix)
+        opponentPieces = opponentPieceSet.pieces
         capturedPiecesObj = self.chessBoard.getCapturedMargin(self.chessBoard.currentlyClicked.currentPiece.colorPrefix)
 
         opponentPieces.pop(opponentPieces.index(capturedPiece))
+        opponentPieceSet.changePieceCount(capturedPiece.name, -1)
         capturedPiece.captured = True
         newTile.currentPiece = None
         capturedPiecesObj.addCapturedPiece(capturedPiece)
 
-        self.turnsSinceCapture = 0
+        self.positionHash ^= Zobrist.pieceKey(capturedPiece) ^ Zobrist.unMovedKey(capturedPiece)
+        self.clearPositionHistory()
+        self.resetHalfmoveClock()
 
     def checkPawnDoublestep(self, chessPiece, newTileY):
         """
@@ -266,13 +411,22 @@ class Game:
             else:
                 raise Exception("Pieces are in wrong locations for en passant.")
 
-            opponentPieces = self.chessBoard.getPieceSet(capturedPiece.colorPrefix).pieces
+            opponentPieceSet = self.chessBoard.getPieceSet(capturedPiece.colorPrefix)
+            opponentPieces = opponentPieceSet.pieces
             capturedPiecesObj = self.chessBoard.getCapturedMargin(self.chessBoard.currentlyClicked.currentPiece.colorPrefix)
 
             opponentPieces.pop(opponentPieces.index(capturedPiece))
+            opponentPieceSet.changePieceCount(capturedPiece.name, -1)
             tileContainingPawn.currentPiece = None
             capturedPiecesObj.addCapturedPiece(capturedPiece)
 
+            self.positionHash ^= Zobrist.pieceKey(capturedPiece)
+
+        # Moves replayed on copied boards skip the tile click checks, so a diagonal move that is not en passant on this
+        # board would otherwise leave the pawn it was meant to capture in place
+        elif newTileIndices[0] != currentPiece.xIndex:
+            raise Exception("Pawn moved diagonally onto an empty tile without an en passant capture.")
+
     def verifyCheckBlockingMovesets(self, king):
         """
         Method that checks whether a self piece is stopping a check from occurring. If so, updates said piece's moveset
@@ -315,9 +469,9 @@ class Game:
 
     @staticmethod
     def verifySacrificialPiece(sacrificialPiece, quadrant, kingVulnerablePaths):
-        if Game.diagnostic:
-            print("===========Piece blocking check (proactive)")
-            print(sacrificialPiece.moveset)
+        if Trace.check <= Trace.DEBUG:
+            Trace.emit("check", Trace.DEBUG, "pinnedPiece", piece=sacrificialPiece.colorPrefix + sacrificialPiece.name,
+                       position=(sacrificialPiece.xIndex, sacrificialPiece.yIndex), quadrant=quadrant)
 
         for key in sacrificialPiece.moveset.verifiedMoveset.keys():
             updatedQuadrant = []
@@ -405,9 +559,9 @@ class CheckPiece:
                 elif move in self.checkQuadrant:
                     blockMoves[key].append(move)
 
-        if Game.diagnostic:
-            print(f"=sacrificial piece: {piece.colorPrefix}{piece.name:<6}[{piece.num:}]"
-                    f"                                                 {blockMoves}")
+        if Trace.check <= Trace.DEBUG:
+            Trace.emit("check", Trace.DEBUG, "blockMoves", piece=piece.colorPrefix + piece.name, id=piece.num,
+                       moves=blockMoves)
 
         return blockMoves
 
@@ -1,5 +1,9 @@
-from moveset import MoveSet
-from chessGame import Game
+from chessCore.moveset import MoveSet
+from chessCore.chessGame import Game
+from chessCore.zobrist import Zobrist
+from chessCore.boardState import BoardState
+from chessCore.fen import Fen
+from chessCore.tracing import Trace
 
 class PromotionSim:
     """
@@ -10,6 +14,7 @@ class PromotionSim:
     promotion the instance is thrown to the garbage collector implicitly.
     """
     promotedPieceID = -1
+    promotionOptions = ["queen", "knight", "rook", "bishop"]
 
     def __init__(self, colorPrefix, promotionPiece):
         """
@@ -18,11 +23,11 @@ class PromotionSim:
         """
         self.colorPrefix = colorPrefix
         self.promotionPiece = promotionPiece
-        self.promotionOptionList = ["queen", "knight", "rook", "bishop"]
+        self.promotionOptionList = list(PromotionSim.promotionOptions)
 
-    def getBotPromotionSelection(self):
-        # TODO: temporarily set to always promote to queen
-        selectedPieceName = self.promotionOptionList[0]
+    def getBotPromotionSelection(self, optionIndex=0):
+        # Defaults to queen
+        selectedPieceName = self.promotionOptionList[optionIndex]
 
         self.promotePiece(selectedPieceName)
 
@@ -33,10 +38,13 @@ class PromotionSim:
 
 
 class ChessBoardSim:
-    diagnostic = False
     def __init__(self, realChessBoard, pieceValueDict, currentTurn):
-
-
+        """
+        :param realChessBoard: ChessBoard (or ChessBoardSim) object to copy, or None to create an empty board that is
+        filled by loadState
+        :param pieceValueDict: dict of piece names to their values used for scoring
+        :param currentTurn: str color prefix of the player to move
+        """
         self.gameOver = False
         self.realChessBoard = realChessBoard
 
@@ -50,15 +58,88 @@ class ChessBoardSim:
 
         # Piece specific attributes/methods
         PieceSetSim.setBoard(self)
-        self.blackPieces = PieceSetSim("b_", realChessBoard.blackPieces)
-        self.whitePieces = PieceSetSim("w_", realChessBoard.whitePieces)
+        self.blackPieces = PieceSetSim("b_", realChessBoard.blackPieces if realChessBoard else None)
+        self.whitePieces = PieceSetSim("w_", realChessBoard.whitePieces if realChessBoard else None)
 
         # Promotion board specific attributes/methods
         self.promotionBoard = None
 
         # Game flow specific attributes/methods
-        self.game = GameSim(self, realChessBoard.game.currentColor, realChessBoard.game.opponentColor)
+        if realChessBoard:
+            self.game = GameSim(self, realChessBoard.game.currentColor, realChessBoard.game.opponentColor)
+            self.game.copyPositionHistory(realChessBoard.game)
+            self.game.copyTurnState(realChessBoard.game)
+            self.setPieceMovesets()
+        else:
+            self.game = GameSim(self, currentTurn, BoardState.opponentOf(currentTurn))
+
+    @classmethod
+    def fromState(cls, state, pieceValueDict):
+        """
+        Creates a simulation directly from a BoardState, without a real ChessBoard.
+        :param state: BoardState object
+        :param pieceValueDict: dict of piece names to their values used for scoring
+        :return: ChessBoardSim object
+        """
+        chessSim = cls(None, pieceValueDict, state.currentColor)
+        chessSim.loadState(state)
+        return chessSim
+
+    @classmethod
+    def fromBytes(cls, data, pieceValueDict):
+        return cls.fromState(BoardState.fromBytes(data), pieceValueDict)
+
+    @classmethod
+    def fromFen(cls, fenStr, pieceValueDict):
+        return cls.fromState(Fen.toState(fenStr), pieceValueDict)
+
+    def getState(self):
+        return BoardState.fromBoard(self)
+
+    def toFen(self):
+        return Fen.fromState(self.getState())
+
+    def loadFen(self, fenStr):
+        self.loadState(Fen.toState(fenStr))
+
+    def toBytes(self):
+        """
+        Creates a compact binary snapshot of the simulation. See BoardState for the format.
+        :return: bytes
+        """
+        return self.getState().toBytes()
+
+    def loadBytes(self, data):
+        self.loadState(BoardState.fromBytes(data))
+
+    def loadState(self, state):
+        """
+        Replaces the simulated position with the given state, rebuilding tiles and pieces directly.
+        :param state: BoardState object
+        :return: None
+        """
+        for row in self.board:
+            for tile in row:
+                tile.currentPiece = None
+                tile.validMove = False
+                tile.clicked = False
+
+        self.currentlyClicked = None
+        self.promotionBoard = None
+        self.gameOver = False
+
+        PieceSetSim.setBoard(self)
+        for pieceSet in [self.blackPieces, self.whitePieces]:
+            pieceSet.initPiecesFromState(state)
+
+        self.game = GameSim(self, state.currentColor, BoardState.opponentOf(state.currentColor))
+        self.game.loadState(state)
+
         self.setPieceMovesets()
+        self.game.findCheckingPieces(self.getPieceSet(self.game.opponentColor),
+                                     self.getPieceSet(self.game.currentColor).king)
+        self.restrictLegalMoves()
+        self.calcBoardScore()
 
     def createTiles(self):
         for i in range(8):
@@ -92,13 +173,23 @@ class ChessBoardSim:
             for piece in pieceSet.pieces:
                 piece.getMoveSet()
 
-    def getBotMove(self, piece, rowNum, colNum):
+    def getBotMove(self, piece, rowNum, colNum, promotionSelection=0):
+        """
+        Applies a move, or the promotion selection if the promotion board is open.
+        :param piece: ChessPieceSim object to move. Ignored while the promotion board is open
+        :param rowNum: int index of the destination tile's row
+        :param colNum: int index of the destination tile's col
+        :param promotionSelection: int index into PromotionSim.promotionOptionList, queen by default
+        :return: None
+        """
+        # Pieces place themselves onto PieceSetSim's board, which is the most recently created simulation. Searching
+        # creates many simulations, so it must point back to this one before moving
+        PieceSetSim.setBoard(self)
 
         if not self.gameOver:
             if self.promotionBoard:
-                if ChessBoardSim.diagnostic:
-                    print("BOT PROMOTION BOARD")
-                self.promotionBoard.getBotPromotionSelection()
+                self.promotionBoard.getBotPromotionSelection(promotionSelection)
+                self.game.rehashPosition()
 
                 self.promotionBoard = None
                 self.postMovementUpdates()
@@ -116,6 +207,19 @@ class ChessBoardSim:
 
             self.calcBoardScore()
 
+    def playMove(self, piece, rowNum, colNum, promotionName="queen"):
+        """
+        Applies a whole move, including the promotion selection if the move promotes a pawn.
+        :param piece: ChessPieceSim object to move
+        :param rowNum: int index of the destination tile's row
+        :param colNum: int index of the destination tile's col
+        :param promotionName: str name of the piece to promote to, if the move is a promotion
+        :return: None
+        """
+        self.getBotMove(piece, rowNum, colNum)
+        if self.promotionBoard:
+            self.getBotMove(None, None, None, self.promotionBoard.promotionOptionList.index(promotionName))
+
     def movementUpdates(self, tile, rowNum, colNum):
         """
         Wrapper method to perform a piece move. Toggles tile attributes to return it to its default state after a piece
@@ -125,8 +229,10 @@ class ChessBoardSim:
         :param colNum: int index of the tile's col
         :return: None
         """
-        if ChessBoardSim.diagnostic:
-            print(f"\n\n============={self.currentlyClicked.currentPiece.name} has moved")  # Diagnostic
+        if Trace.game <= Trace.DEBUG:
+            piece = self.currentlyClicked.currentPiece
+            Trace.emit("game", Trace.DEBUG, "move", piece=piece.colorPrefix + piece.name,
+                       fromPos=(piece.xIndex, piece.yIndex), toPos=(rowNum, colNum), simulated=True)
 
         # If the valid new tile contains an opposing piece, capture it
         if tile.currentPiece and tile.validMove:
@@ -168,9 +274,15 @@ class ChessBoardSim:
         # TODO: testing player change turns
         if not self.promotionBoard:
             self.game.alternateCurrentColor()
-            if ChessBoardSim.diagnostic:
-                print("BOT HAS CHANGED COLOUR")
 
+        self.restrictLegalMoves()
+
+    def restrictLegalMoves(self):
+        """
+        Restricts the current player's movesets to moves that are legal w.r.t. check, then decides whether the game has
+        ended. Expects every piece's moveset to have been generated and the check status to be up to date.
+        :return: None
+        """
         # Check immediately after turn change whether a check has occurred
         if self.game.inCheck[self.game.currentColor]:
             # Force a sacrifice or a king movement if the king is in check
@@ -197,6 +309,9 @@ class ChessBoardSim:
         else:
             raise Exception("Invalid color prefix")
 
+    def getCapturedMargin(self, currentColorPrefix):
+        return self.getPieceSet(currentColorPrefix).capturedPiecesMargin
+
     def toggleClickAttributes(self, tile):
         if self.currentlyClicked == tile:  # unnecessary to check this condition again, but defensive
             self.currentlyClicked = None
@@ -206,11 +321,12 @@ class ChessBoardSim:
         tile.clicked = not tile.clicked
 
     def checkPromotion(self, movedPawn):
-        if ChessBoardSim.diagnostic:
-            print(movedPawn.yIndex)
         if (movedPawn.colorPrefix == "b_" and movedPawn.yIndex == 7) or \
                 (movedPawn.colorPrefix == "w_" and movedPawn.yIndex == 0):
             self.promotionBoard = PromotionSim(movedPawn.colorPrefix, movedPawn)
+            if Trace.game <= Trace.DEBUG:
+                Trace.emit("game", Trace.DEBUG, "promotion", color=movedPawn.colorPrefix,
+                           position=(movedPawn.xIndex, movedPawn.yIndex), simulated=True)
 
 
 class PieceSetSim:
@@ -226,11 +342,19 @@ class PieceSetSim:
         self.pieces = []
         self.king = None
 
+        # Number of each piece type still on the board, maintained incrementally on capture and promotion
+        self.pieceCounts = {"pawn": 0, "knight": 0, "bishop": 0, "rook": 0, "queen": 0, "king": 0}
+        self.capturedPiecesMargin = CapturedPiecesSim()
+
         self.setSimulation()
 
     def setSimulation(self):
         # Clear previous usage
         self.pieces = []
+        self.pieceCounts = dict.fromkeys(self.pieceCounts, 0)
+
+        if not self.realPieceSet:
+            return
 
         for piece in self.realPieceSet.pieces:
             pieceCopy = self.makePieceCopy(piece)
@@ -242,7 +366,44 @@ class PieceSetSim:
             if pieceCopy.name == "king":
                 self.king = pieceCopy
 
-            self.pieces.append(pieceCopy)
+            self.addPiece(pieceCopy)
+
+    def addPiece(self, piece):
+        self.pieces.append(piece)
+        self.changePieceCount(piece.name, 1)
+
+    def initPiecesFromState(self, state):
+        """
+        Replaces this set's pieces with those of its color in the given state.
+        :param state: BoardState object
+        :return: None
+        """
+        self.pieces = []
+        self.king = None
+        self.pieceCounts = dict.fromkeys(self.pieceCounts, 0)
+        pieceNums = dict.fromkeys(self.pieceCounts, 0)
+
+        for colorPrefix, pieceName, pos in state.getPieces():
+            if colorPrefix != self.colorPrefix:
+                continue
+
+            piece = ChessPieceSim(pieceName, pieceNums[pieceName], self.colorPrefix)
+            pieceNums[pieceName] += 1
+            piece.setIndices(pos)
+            piece.loadState(state)
+
+            if pieceName == "king":
+                self.king = piece
+            self.addPiece(piece)
+
+    def changePieceCount(self, pieceName, amount):
+        """
+        Keeps self.pieceCounts up to date. Called whenever a piece is added, captured or promoted.
+        :param pieceName: str name of the piece type whose count changes
+        :param amount: int to add to the count (negative for removal)
+        :return: None
+        """
+        self.pieceCounts[pieceName] += amount
 
     @staticmethod
     def makePieceCopy(piece):
@@ -257,6 +418,7 @@ class PieceSetSim:
         pieceCopy.startPos = piece.startPos
         pieceCopy.xIndex = piece.xIndex
         pieceCopy.yIndex = piece.yIndex
+        pieceCopy.unMoved = piece.unMoved
 
         # captured attribute is False by default so does not need to be set
 
@@ -266,6 +428,18 @@ class PieceSetSim:
         return pieceCopy
 
 
+class CapturedPiecesSim:
+    """
+    Display-less counterpart of CapturedPiecesMargin. Only keeps a list of the pieces captured by a PieceSetSim, which
+    allows moves such as en passant to use the same capture logic as the real board.
+    """
+    def __init__(self):
+        self.capturedPieces = []
+
+    def addCapturedPiece(self, chessPieceObj):
+        self.capturedPieces.append(chessPieceObj)
+
+
 class TileSim:
     def __init__(self):
         self.clicked = False
@@ -305,6 +479,10 @@ class ChessPieceSim:
         tile.currentPiece = self
 
     def setName(self, name):
+        pieceSet = PieceSetSim.chessBoard.getPieceSet(self.colorPrefix)
+        pieceSet.changePieceCount(self.name, -1)
+        pieceSet.changePieceCount(name, 1)
+
         self.name = name
         self.moveset.pieceName = name
 
@@ -318,6 +496,19 @@ class ChessPieceSim:
     def getMoveSet(self):
         self.moveset.getMoves()
 
+    def loadState(self, state):
+        """
+        Sets the piece's movement history from a BoardState, after it has been placed with setIndices.
+        :param state: BoardState object
+        :return: None
+        """
+        self.unMoved = (self.xIndex, self.yIndex) in state.unMoved
+        if self.name == "pawn":
+            self.startPos = BoardState.pawnStartPos(self.colorPrefix, (self.xIndex, self.yIndex))
+
+        self.moveset.unMoved = self.unMoved
+        self.moveset.startPos = self.startPos
+
 
 class GameSim(Game):
     def __init__(self, chessBoard, currentColor, opponentColor):
@@ -325,15 +516,48 @@ class GameSim(Game):
         self.currentColor = currentColor
         self.opponentColor = opponentColor
 
+    def copyPositionHistory(self, realGame):
+        """
+        Carries the real game's position hash and history into the simulation so that repetitions can be detected
+        during search. The history is copied since simulations branch off of the same parent.
+        :param realGame: Game object of the board being simulated
+        :return: None
+        """
+        self.positionHash = realGame.positionHash
+        self.enPassantHashKey = realGame.enPassantHashKey
+        self.positionHistory = dict(realGame.positionHistory)
+        self.turnsSinceCapture = realGame.turnsSinceCapture
+        self.halfmoveClockReset = realGame.halfmoveClockReset
+        self.fullmoveNumber = realGame.fullmoveNumber
+
+    def copyTurnState(self, realGame):
+        """
+        Carries the real game's check status and en passant rights into the simulation. Movesets compare the double
+        stepped pawn by identity, so it is mapped to the simulation's own pawn on the same tile.
+        :param realGame: Game object of the board being simulated
+        :return: None
+        """
+        self.inCheck = dict(realGame.inCheck)
+
+        if realGame.recentDoublestep:
+            doublestepPawn = realGame.recentDoublestep
+            self.recentDoublestep = self.chessBoard.board[doublestepPawn.xIndex][doublestepPawn.yIndex].currentPiece
+        else:
+            self.recentDoublestep = False
+
     def capturePiece(self, newTile):
         capturedPiece = newTile.currentPiece
         assert capturedPiece.name != "king", "The king cannot be captured!!"
 
-        opponentPieces = self.chessBoard.getPieceSet(capturedPiece.colorPrefix).pieces
+        opponentPieceSet = self.chessBoard.getPieceSet(capturedPiece.colorPrefix)
+        opponentPieces = opponentPieceSet.pieces
 
         # Let garbage collector eat the captured piece
         opponentPieces.pop(opponentPieces.index(capturedPiece))
+        opponentPieceSet.changePieceCount(capturedPiece.name, -1)
         capturedPiece.captured = True
         newTile.currentPiece = None
 
-        self.turnsSinceCapture = 0
\ No newline at end of file
+        self.positionHash ^= Zobrist.pieceKey(capturedPiece) ^ Zobrist.unMovedKey(capturedPiece)
+        self.clearPositionHistory()
+        self.resetHalfmoveClock()
\ No newline at end of file
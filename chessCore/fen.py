@@ -0,0 +1,161 @@
+from chessCore.boardState import BoardState
+
+
+class Fen:
+    """
+    Converts between Forsyth-Edwards Notation strings and BoardState objects.
+
+    Board indices follow ChessBoard.board: x is the column (0 = file a) and y is the row from the top of the board
+    (0 = rank 8, where black starts).
+
+    Castling rights are stored as the unMoved flags of the king and rook involved, and the en passant target square as
+    the recent double step of the pawn that passed it. Since FEN does not record whether other pieces have moved, pieces
+    found on their starting tile are marked as unmoved.
+    """
+    startingFen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+    pieceLetters = {"pawn": "p", "knight": "n", "bishop": "b", "rook": "r", "queen": "q", "king": "k"}
+    letterPieces = {letter: name for name, letter in pieceLetters.items()}
+    files = "abcdefgh"
+
+    # Castling letter: (king tile, rook tile, colorPrefix)
+    castlingTiles = {"K": ((4, 7), (7, 7), "w_"), "Q": ((4, 7), (0, 7), "w_"),
+                     "k": ((4, 0), (7, 0), "b_"), "q": ((4, 0), (0, 0), "b_")}
+
+    @staticmethod
+    def tileName(pos):
+        """
+        :param pos: tuple of board indices
+        :return: str of the algebraic tile name, e.g. (4, 6) -> "e2"
+        """
+        return f"{Fen.files[pos[0]]}{8 - pos[1]}"
+
+    @staticmethod
+    def tileIndices(name):
+        """
+        :param name: str of an algebraic tile name, e.g. "e2"
+        :return: tuple of board indices, e.g. (4, 6)
+        """
+        if len(name) != 2 or name[0] not in Fen.files or name[1] not in "12345678":
+            raise Exception(f"Invalid tile name: {name}")
+        return Fen.files.index(name[0]), 8 - int(name[1])
+
+    @staticmethod
+    def isStartingTile(colorPrefix, pieceName, pos):
+        """
+        Checks whether a piece is on one of the tiles its type starts the game on.
+        :return: bool
+        """
+        homeRow = 7 if colorPrefix == "w_" else 0
+        if pieceName == "pawn":
+            return pos == BoardState.pawnStartPos(colorPrefix, pos)
+
+        startingColumns = {"rook": [0, 7], "knight": [1, 6], "bishop": [2, 5], "queen": [3], "king": [4]}
+        return pos[1] == homeRow and pos[0] in startingColumns[pieceName]
+
+    @staticmethod
+    def toState(fenStr):
+        """
+        Parses a FEN string.
+        :param fenStr: str in FEN. The halfmove clock and fullmove number fields are optional
+        :return: BoardState object
+        """
+        fields = fenStr.split()
+        if len(fields) < 4:
+            raise Exception(f"Invalid FEN, expected at least 4 fields: {fenStr}")
+        placement, sideToMove, castling, enPassant = fields[:4]
+
+        state = BoardState()
+
+        rows = placement.split("/")
+        if len(rows) != 8:
+            raise Exception(f"Invalid FEN, expected 8 rows: {fenStr}")
+
+        for y in range(8):
+            x = 0
+            for char in rows[y]:
+                if char.isdigit():
+                    x += int(char)
+                elif char.lower() in Fen.letterPieces and x < 8:
+                    colorPrefix = "w_" if char.isupper() else "b_"
+                    pieceName = Fen.letterPieces[char.lower()]
+                    state.squares[x][y] = (colorPrefix, pieceName)
+
+                    if pieceName not in ["king", "rook"] and Fen.isStartingTile(colorPrefix, pieceName, (x, y)):
+                        state.unMoved.add((x, y))
+                    x += 1
+                else:
+                    raise Exception(f"Invalid FEN, bad placement row {rows[y]}: {fenStr}")
+            if x != 8:
+                raise Exception(f"Invalid FEN, row {rows[y]} does not span 8 tiles: {fenStr}")
+
+        if sideToMove not in ["w", "b"]:
+            raise Exception(f"Invalid FEN, bad side to move: {fenStr}")
+        state.currentColor = f"{sideToMove}_"
+
+        if castling != "-":
+            for char in castling:
+                if char not in Fen.castlingTiles:
+                    raise Exception(f"Invalid FEN, bad castling rights: {fenStr}")
+
+                kingPos, rookPos, colorPrefix = Fen.castlingTiles[char]
+                # Castling rights are ignored if the pieces are not where castling needs them to be
+                if state.squares[kingPos[0]][kingPos[1]] == (colorPrefix, "king") and \
+                        state.squares[rookPos[0]][rookPos[1]] == (colorPrefix, "rook"):
+                    state.unMoved.add(kingPos)
+                    state.unMoved.add(rookPos)
+
+        if enPassant != "-":
+            targetX, targetY = Fen.tileIndices(enPassant)
+            # The pawn that double stepped sits just past the target tile, i.e. on row 3 for black or 4 for white
+            pawnPos = (targetX, 3) if targetY == 2 else (targetX, 4)
+            if state.squares[pawnPos[0]][pawnPos[1]] == (BoardState.opponentOf(state.currentColor), "pawn"):
+                state.recentDoublestep = pawnPos
+
+        if len(fields) > 4:
+            state.turnsSinceCapture = int(fields[4])
+        if len(fields) > 5:
+            state.fullmoveNumber = int(fields[5])
+
+        return state
+
+    @staticmethod
+    def fromState(state):
+        """
+        Emits a FEN string.
+        :param state: BoardState object
+        :return: str in FEN
+        """
+        rows = []
+        for y in range(8):
+            row = ""
+            emptyTiles = 0
+            for x in range(8):
+                if state.squares[x][y]:
+                    colorPrefix, pieceName = state.squares[x][y]
+                    if emptyTiles:
+                        row += str(emptyTiles)
+                        emptyTiles = 0
+
+                    letter = Fen.pieceLetters[pieceName]
+                    row += letter.upper() if colorPrefix == "w_" else letter
+                else:
+                    emptyTiles += 1
+            if emptyTiles:
+                row += str(emptyTiles)
+            rows.append(row)
+
+        castling = ""
+        for char, (kingPos, rookPos, colorPrefix) in Fen.castlingTiles.items():
+            if state.squares[kingPos[0]][kingPos[1]] == (colorPrefix, "king") and \
+                    state.squares[rookPos[0]][rookPos[1]] == (colorPrefix, "rook") and \
+                    kingPos in state.unMoved and rookPos in state.unMoved:
+                castling += char
+
+        enPassant = "-"
+        if state.recentDoublestep:
+            pawnX, pawnY = state.recentDoublestep
+            enPassant = Fen.tileName((pawnX, pawnY - 1) if pawnY == 3 else (pawnX, pawnY + 1))
+
+        return f"{'/'.join(rows)} {state.currentColor[0]} {castling or '-'} {enPassant} " \
+               f"{state.turnsSinceCapture} {state.fullmoveNumber}"
@@ -3,8 +3,11 @@ TODO:
     1. verify king moveset PRIOR to actual movement
 """
 
-from lightweightChessGame import GameSim
-from lightweightMoveset import MoveSetLightweight
+from chessCore.lightweightChessGame import GameSim
+from chessCore.lightweightMoveset import MoveSetLightweight
+from chessCore.boardState import BoardState
+from chessCore.fen import Fen
+from chessCore.tracing import Trace
 
 
 class LightweightChessSim:
@@ -31,7 +34,80 @@ class LightweightChessSim:
             row += 1
         return newRepr
 
-    diagnostic = False
+    @classmethod
+    def fromState(cls, state, pieceValueDict):
+        """
+        Creates a lightweight simulation directly from a BoardState.
+        :param state: BoardState object
+        :param pieceValueDict: dict of piece names to their values used for scoring
+        :return: LightweightChessSim object
+        """
+        lightweightBoard = [[0] * 8 for row in range(8)]
+        pieceNums = {}
+
+        for colorPrefix, pieceName, pos in state.getPieces():
+            pieceNum = pieceNums.get((colorPrefix, pieceName), 0)
+            pieceNums[(colorPrefix, pieceName)] = pieceNum + 1
+
+            # Same repr as convertObjRepr, which is indexed [y][x]
+            lightweightBoard[pos[1]][pos[0]] = f"{colorPrefix}-{pieceName}-{pieceNum}-{pos in state.unMoved}-" \
+                                               f"{pos[0]}-{pos[1]}"
+
+        lightSim = cls(lightweightBoard, pieceValueDict, state.currentColor, BoardState.opponentOf(state.currentColor))
+
+        lightSim.lightGame.inCheck = dict(state.inCheck)
+        lightSim.lightGame.turnsSinceCapture = state.turnsSinceCapture
+        lightSim.lightGame.fullmoveNumber = state.fullmoveNumber
+        if state.recentDoublestep:
+            lightSim.lightGame.recentDoublestep = lightweightBoard[state.recentDoublestep[1]][state.recentDoublestep[0]]
+
+        return lightSim
+
+    @classmethod
+    def fromBytes(cls, data, pieceValueDict):
+        return cls.fromState(BoardState.fromBytes(data), pieceValueDict)
+
+    @classmethod
+    def fromFen(cls, fenStr, pieceValueDict):
+        return cls.fromState(Fen.toState(fenStr), pieceValueDict)
+
+    def getState(self):
+        """
+        Reads the simulation into a BoardState. Piece attributes are read from the end of each repr, since promoted
+        pieces have negative ids which contain an extra "-".
+        :return: BoardState object
+        """
+        state = BoardState()
+
+        for colorPrefix in ["w_", "b_"]:
+            for pieceRepr in self.pieces[colorPrefix]:
+                pieceAttrList = pieceRepr.split("-")
+                pos = (int(pieceAttrList[-2]), int(pieceAttrList[-1]))
+
+                state.squares[pos[0]][pos[1]] = (pieceAttrList[0], pieceAttrList[1])
+                if pieceAttrList[-3] == "True":
+                    state.unMoved.add(pos)
+
+        state.currentColor = self.lightGame.currentColor
+        state.inCheck = dict(self.lightGame.inCheck)
+        state.turnsSinceCapture = self.lightGame.turnsSinceCapture
+        state.fullmoveNumber = self.lightGame.fullmoveNumber
+        if self.lightGame.recentDoublestep:
+            doublestepAttrList = self.lightGame.recentDoublestep.split("-")
+            state.recentDoublestep = (int(doublestepAttrList[-2]), int(doublestepAttrList[-1]))
+
+        return state
+
+    def toBytes(self):
+        """
+        Creates a compact binary snapshot of the simulation. See BoardState for the format.
+        :return: bytes
+        """
+        return self.getState().toBytes()
+
+    def toFen(self):
+        return Fen.fromState(self.getState())
+
     def __init__(self, lightweightBoard, pieceValueDict, currentColor, opponentColor):
 
         self.gameOver = False
@@ -55,8 +131,8 @@ class LightweightChessSim:
 
         self.promotion = False
 
-        # deleteme
-        print(self)
+        if Trace.movegen <= Trace.DEBUG:
+            Trace.emit("movegen", Trace.DEBUG, "lightweightBoard", board=str(self))
 
 
     def __str__(self):
@@ -1,4 +1,4 @@
-from chessGame import Game
+from chessCore.chessGame import Game
 
 
 def getListifiedVersion(dictSet):
@@ -1,4 +1,4 @@
-from moveset import MoveSet
+from chessCore.moveset import MoveSet
 
 class MoveSetLightweight(MoveSet):
 
@@ -0,0 +1,254 @@
+"""
+Forced mate search, e.g. for solving mate-in-N puzzles.
+"""
+import time
+
+from chessCore.boardState import BoardState
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.pgn import San
+from chessCore.tablebase import diagonalDirections, knightOffsets, orthogonalDirections
+
+
+class MateSolver:
+    """
+    Depth-first search for forced mates. Unlike miniMax, which looks at every move of both players, the attacker only
+    tries moves that give check while the defender tries all of their legal replies, and a defender's reply that
+    escapes cuts the search of the attacker's move short. Positions proven to have no mate within a number of moves
+    are remembered by hash, so transpositions are not searched twice.
+
+    Since only checking moves are tried, mates that begin with a quiet move are not found.
+    :var self.nodes: int number of positions created by the last solve
+    :var self.hashProbes: int lookups of positions proven to have no mate, and self.hashHits the ones that cut the
+    search short
+    :var self.iterations: list of (int moves, int nodes, float seconds) tuples of each mate length searched
+    """
+    def __init__(self, pieceValues):
+        """
+        :param pieceValues: dict of piece names to values, needed to create the simulated boards
+        """
+        self.pieceValues = pieceValues
+        self.nodes = 0
+        self.hashProbes = 0
+        self.hashHits = 0
+        self.iterations = []
+        # Position hash to the largest number of moves the attacker to move was proven not to mate within
+        self.noMateWithin = {}
+
+    def solve(self, chessBoard, maxMoves):
+        """
+        Finds the shortest forced mate of the player to move within maxMoves moves.
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :param maxMoves: int number of the attacker's moves, e.g. 2 for a mate in 2
+        :return: list of str SAN moves of the mating line, alternating attacker and defender and ending with mate, or
+        None if there is no such mate
+        """
+        line = self.findMate(chessBoard, maxMoves)
+        if line is None:
+            return None
+        return MateSolver.toSan(chessBoard, self.pieceValues, line)
+
+    def findMate(self, chessBoard, maxMoves):
+        """
+        :return: list of (fromPos, toPos) tuples of the mating line, or None. See solve
+        """
+        self.nodes = 0
+        self.hashProbes = 0
+        self.hashHits = 0
+        self.iterations = []
+        self.noMateWithin = {}
+        rootSim = MateSolver.copyBoard(chessBoard, self.pieceValues)
+        if rootSim.gameOver:
+            return None
+
+        # Searching with an increasing number of moves finds the shortest mate first
+        for moves in range(1, maxMoves + 1):
+            nodesBefore = self.nodes
+            startTime = time.perf_counter()
+            line = self.attack(rootSim, moves)
+            self.iterations.append((moves, self.nodes - nodesBefore, time.perf_counter() - startTime))
+            if line is not None:
+                return line
+        return None
+
+    def attack(self, chessBoard, moves):
+        """
+        :param chessBoard: ChessBoardSim object with the attacker to move
+        :param moves: int number of attacker moves left to mate in
+        :return: list of (fromPos, toPos) tuples of the mating line, or None if there is no mate within moves
+        """
+        positionHash = chessBoard.game.positionHash
+        self.hashProbes += 1
+        if self.noMateWithin.get(positionHash, 0) >= moves:
+            self.hashHits += 1
+            return None
+
+        checks = []
+        for piece, toPos in MateSolver.getCheckCandidates(chessBoard):
+            chessSim = self.playMove(chessBoard, piece, toPos)
+            if chessSim.gameOver == "CHECKMATE":
+                return [((piece.xIndex, piece.yIndex), toPos)]
+            if chessSim.game.inCheck[chessSim.game.currentColor] and not chessSim.gameOver:
+                checks.append(((piece.xIndex, piece.yIndex), toPos, chessSim))
+
+        if moves > 1:
+            for fromPos, toPos, chessSim in checks:
+                line = self.defend(chessSim, moves - 1)
+                if line is not None:
+                    return [(fromPos, toPos)] + line
+
+        self.noMateWithin[positionHash] = moves
+        return None
+
+    def defend(self, chessBoard, moves):
+        """
+        :param chessBoard: ChessBoardSim object with the defender to move, in check
+        :param moves: int number of attacker moves left to mate in after the defender's reply
+        :return: list of (fromPos, toPos) tuples of the mating line after the defender's longest resisting reply, or
+        None if some reply escapes the mate
+        """
+        replies = []
+        for piece in chessBoard.getPieceSet(chessBoard.game.currentColor).pieces:
+            for toPos in piece.moveset.getListifiedVerifiedset():
+                # Captures are tried first, as taking the checking piece is the likeliest escape
+                isCapture = chessBoard.board[toPos[0]][toPos[1]].currentPiece is not None
+                replies.append((not isCapture, piece, toPos))
+        replies.sort(key=lambda reply: reply[0])
+
+        longestLine = None
+        for _, piece, toPos in replies:
+            fromPos = (piece.xIndex, piece.yIndex)
+            line = self.attack(self.playMove(chessBoard, piece, toPos), moves)
+            if line is None:
+                return None
+            if longestLine is None or len(line) + 1 > len(longestLine):
+                longestLine = [(fromPos, toPos)] + line
+        return longestLine
+
+    def playMove(self, chessBoard, piece, toPos):
+        self.nodes += 1
+        chessSim = ChessBoardSim(chessBoard, self.pieceValues, chessBoard.game.currentColor)
+        chessSim.playMove(chessSim.board[piece.xIndex][piece.yIndex].currentPiece, toPos[0], toPos[1])
+        return chessSim
+
+    @staticmethod
+    def copyBoard(chessBoard, pieceValues):
+        """
+        Copies made with the ChessBoardSim constructor only have their moves restricted to legal ones once a move is
+        played on them, so the root position is loaded from a snapshot instead.
+        :return: ChessBoardSim object of the board's position, with legal movesets
+        """
+        return ChessBoardSim.fromState(BoardState.fromBoard(chessBoard), pieceValues)
+
+    @staticmethod
+    def getCheckCandidates(chessBoard):
+        """
+        Cheaply narrows the current player's moves down to those that might give check, so only these have to be
+        played out: moves that attack the opposing king from the destination, moves that uncover a line from a friendly
+        rook, bishop or queen to it, and special moves (castling, en passant and promotion).
+        :param chessBoard: ChessBoardSim object
+        :return: list of (ChessPiece object, tuple of the destination's (x, y) indices) tuples
+        """
+        board = chessBoard.board
+        kingPiece = chessBoard.getPieceSet(chessBoard.game.opponentColor).king
+        kingPos = (kingPiece.xIndex, kingPiece.yIndex)
+
+        candidates = []
+        for piece in chessBoard.getPieceSet(chessBoard.game.currentColor).pieces:
+            fromPos = (piece.xIndex, piece.yIndex)
+            for toPos in piece.moveset.getListifiedVerifiedset():
+                if MateSolver.isSpecialMove(board, piece, fromPos, toPos) or \
+                        MateSolver.attacksFrom(board, piece, toPos, kingPos, fromPos) or \
+                        MateSolver.uncoversLine(board, piece.colorPrefix, fromPos, toPos, kingPos):
+                    candidates.append((piece, toPos))
+        return candidates
+
+    @staticmethod
+    def isSpecialMove(board, piece, fromPos, toPos):
+        if piece.name == "king":
+            return abs(toPos[0] - fromPos[0]) == 2
+        elif piece.name == "pawn":
+            # Promotion, or a diagonal move onto an empty tile (en passant)
+            return toPos[1] in (0, 7) or (toPos[0] != fromPos[0] and board[toPos[0]][toPos[1]].currentPiece is None)
+        return False
+
+    @staticmethod
+    def attacksFrom(board, piece, square, kingPos, vacated):
+        """
+        :return: bool whether piece would attack kingPos from square once it has left the vacated square
+        """
+        dx = kingPos[0] - square[0]
+        dy = kingPos[1] - square[1]
+        if piece.name == "knight":
+            return (dx, dy) in knightOffsets
+        elif piece.name == "pawn":
+            # White pawns advance towards y index 0
+            forward = -1 if piece.colorPrefix == "w_" else 1
+            return abs(dx) == 1 and dy == forward
+        elif piece.name == "king":
+            return False
+
+        if dx and dy and abs(dx) != abs(dy):
+            return False
+        direction = ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+        if direction in orthogonalDirections and piece.name not in ("rook", "queen"):
+            return False
+        if direction in diagonalDirections and piece.name not in ("bishop", "queen"):
+            return False
+        return MateSolver.isLineClear(board, square, kingPos, direction, vacated)
+
+    @staticmethod
+    def uncoversLine(board, colorPrefix, fromPos, toPos, kingPos):
+        """
+        :return: bool whether moving a piece from fromPos to toPos could open a line of a friendly slider to kingPos
+        """
+        dx = fromPos[0] - kingPos[0]
+        dy = fromPos[1] - kingPos[1]
+        if dx and dy and abs(dx) != abs(dy):
+            return False
+        direction = ((dx > 0) - (dx < 0), (dy > 0) - (dy < 0))
+        if not MateSolver.isLineClear(board, kingPos, fromPos, direction, None):
+            return False
+
+        sliders = ("rook", "queen") if direction in orthogonalDirections else ("bishop", "queen")
+        x, y = fromPos[0] + direction[0], fromPos[1] + direction[1]
+        while 0 <= x < 8 and 0 <= y < 8:
+            if (x, y) == toPos:
+                # The piece stays on the line
+                return False
+            behindPiece = board[x][y].currentPiece
+            if behindPiece:
+                return behindPiece.colorPrefix == colorPrefix and behindPiece.name in sliders
+            x += direction[0]
+            y += direction[1]
+        return False
+
+    @staticmethod
+    def isLineClear(board, fromPos, toPos, direction, vacated):
+        """
+        :return: bool whether every tile strictly between fromPos and toPos along direction is empty, treating the
+        vacated tile as empty
+        """
+        x, y = fromPos[0] + direction[0], fromPos[1] + direction[1]
+        while (x, y) != toPos:
+            if board[x][y].currentPiece and (x, y) != vacated:
+                return False
+            x += direction[0]
+            y += direction[1]
+        return True
+
+    @staticmethod
+    def toSan(chessBoard, pieceValues, line):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object in the position the line starts from
+        :param pieceValues: dict of piece names to values
+        :param line: list of (fromPos, toPos) tuples
+        :return: list of str SAN moves
+        """
+        chessSim = MateSolver.copyBoard(chessBoard, pieceValues)
+        sanMoves = []
+        for fromPos, toPos in line:
+            piece = chessSim.board[fromPos[0]][fromPos[1]].currentPiece
+            san = San.fromMove(chessSim, piece, toPos, "queen" if piece.name == "pawn" and toPos[1] in (0, 7) else None)
+            chessSim.playMove(piece, toPos[0], toPos[1])
+            sanMoves.append(san + San.suffix(chessSim))
+        return sanMoves
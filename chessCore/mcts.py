@@ -0,0 +1,243 @@
+"""
+Monte Carlo tree search (MCTS) with UCT selection and random playouts.
+"""
+import math
+import multiprocessing
+import random
+import time
+
+from chessCore.boardState import BoardState
+from chessCore.chessboardBot import ChessBoardSim
+
+
+class MctsNode:
+    """
+    A node of the search tree, i.e. a position reached by a move from its parent's position. Positions are not stored:
+    a search replays the moves on the path from the root instead, which keeps nodes small enough for trees of hundreds
+    of thousands of them.
+    :var self.move: tuple of the (fromPos, toPos) of the move leading to the node, None at the root
+    :var self.untriedMoves: list of the moves that have no child node yet, or None until the node is first expanded
+    :var self.visits: int number of playouts through the node, including ones still in progress
+    :var self.score: float total playout score from the point of view of the player who made the move
+    :var self.positionHash: int Zobrist hash of the node's position, used to find the node again when reusing the tree
+    """
+    __slots__ = ("move", "parent", "children", "untriedMoves", "visits", "score", "positionHash")
+
+    def __init__(self, move, parent, positionHash):
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untriedMoves = None
+        self.visits = 0
+        self.score = 0.0
+        self.positionHash = positionHash
+
+    def getUct(self, logParentVisits):
+        return self.score / self.visits + Mcts.explorationConstant * math.sqrt(logParentVisits / self.visits)
+
+
+def getLegalMoves(chessBoard):
+    """
+    Moves capturing the king, which the rules occasionally allow after a check has been missed, are left out as
+    ChessBoardSim cannot play them.
+    :param chessBoard: ChessBoard or ChessBoardSim object
+    :return: list of (fromPos, toPos) tuples of the current player's legal moves
+    """
+    board = chessBoard.board
+    return [((piece.xIndex, piece.yIndex), toPos)
+            for piece in chessBoard.getPieceSet(chessBoard.game.currentColor).pieces
+            for toPos in piece.moveset.getListifiedVerifiedset()
+            if not board[toPos[0]][toPos[1]].currentPiece or board[toPos[0]][toPos[1]].currentPiece.name != "king"]
+
+
+def playMove(chessBoard, move):
+    fromPos, toPos = move
+    chessBoard.playMove(chessBoard.board[fromPos[0]][fromPos[1]].currentPiece, toPos[0], toPos[1])
+
+
+def runPlayout(chessBoard, pieceValues, maxPlies):
+    """
+    Plays uniformly random legal moves until the game ends or maxPlies moves have been played. Unfinished playouts are
+    scored by material, as random play rarely reaches mate within a useful number of plies.
+    :param chessBoard: ChessBoardSim object, played on in place
+    :param pieceValues: dict of piece names to values
+    :param maxPlies: int
+    :return: float score for black between 0 and 1
+    """
+    for _ in range(maxPlies):
+        if chessBoard.gameOver:
+            break
+        moves = getLegalMoves(chessBoard)
+        if not moves:
+            break
+        playMove(chessBoard, random.choice(moves))
+
+    if chessBoard.gameOver == "CHECKMATE":
+        # The player to move is the one that has been checkmated
+        return 0.0 if chessBoard.game.currentColor == "b_" else 1.0
+    elif chessBoard.gameOver:
+        return 0.5
+
+    materialMargin = sum(pieceValues[piece.name] for piece in chessBoard.blackPieces.pieces if piece.name != "king") - \
+        sum(pieceValues[piece.name] for piece in chessBoard.whitePieces.pieces if piece.name != "king")
+    return 1 / (1 + 10 ** (-materialMargin / Mcts.materialScale))
+
+
+def runPlayoutFromBytes(task):
+    """
+    Pool worker. Positions are sent to workers as BoardState snapshots, as boards cannot be pickled.
+    :param task: tuple of (bytes snapshot of the position, dict of piece values, int max plies)
+    :return: float score for black, see runPlayout
+    """
+    data, pieceValues, maxPlies = task
+    return runPlayout(ChessBoardSim.fromBytes(data, pieceValues), pieceValues, maxPlies)
+
+
+class Mcts:
+    """
+    Runs searches for one player and keeps the tree between them, so the subtree of the position reached after the
+    opponent's reply starts the next search with the playouts already made through it.
+
+    With more than one worker, leaves are selected in batches of one per worker and their playouts run in parallel on
+    a process pool. A virtual loss (a visit counted before its playout has finished) steers the selections of a batch
+    apart. Daemonic processes, such as multiprocessing.Pool workers, cannot start a pool of their own, so searches in
+    them run their playouts in-process whatever the number of workers.
+    :var self.root: MctsNode object of the last searched position, or None
+    :var self.iterations: int number of playouts made by the last search
+    """
+    explorationConstant = 1.4
+    # Material margin at which an unfinished playout scores about 0.9 for the side ahead
+    materialScale = 40
+    playoutPlies = 20
+
+    def __init__(self, pieceValues, workers=1):
+        """
+        :param pieceValues: dict of piece names to values
+        :param workers: int number of processes running playouts, 1 to run them in the searching process
+        """
+        self.pieceValues = pieceValues
+        self.workers = workers
+        self.pool = None
+        self.root = None
+        self.iterations = 0
+
+    def close(self):
+        if self.pool:
+            self.pool.terminate()
+            self.pool = None
+
+    def search(self, chessBoard, maxIterations=None, maxSeconds=None, isCancelled=None):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object. It is copied, not played on
+        :param maxIterations: int number of playouts to make, or None for no limit
+        :param maxSeconds: float seconds to search for, or None for no limit. At least one limit must be given
+        :param isCancelled: function returning True once the search should stop early, or None
+        :return: tuple of the (fromPos, toPos) of the most visited move, or None if cancelled, if the position is over or
+        if no playout finished within the limits
+        """
+        if maxIterations is None and maxSeconds is None:
+            raise Exception("An MCTS search needs an iteration or time limit")
+        if self.workers > 1 and self.pool is None and not multiprocessing.current_process().daemon:
+            self.pool = multiprocessing.Pool(self.workers)
+
+        # Copies made with the ChessBoardSim constructor only have their moves restricted to legal ones once a move is
+        # played on them, so the root's moves are generated on a board loaded from a snapshot
+        rootSim = ChessBoardSim.fromState(BoardState.fromBoard(chessBoard), self.pieceValues)
+        if rootSim.gameOver:
+            return None
+        self.root = self.findReusableRoot(chessBoard.game.positionHash)
+        if self.root.untriedMoves is None:
+            self.root.untriedMoves = getLegalMoves(rootSim)
+            random.shuffle(self.root.untriedMoves)
+        self.iterations = 0
+        endTime = time.perf_counter() + maxSeconds if maxSeconds is not None else None
+
+        while (maxIterations is None or self.iterations < maxIterations) and \
+                (endTime is None or time.perf_counter() < endTime):
+            if isCancelled and isCancelled():
+                return None
+
+            batchSize = self.workers
+            if maxIterations is not None:
+                batchSize = min(batchSize, maxIterations - self.iterations)
+            leaves = [self.selectLeaf(rootSim) for _ in range(batchSize)]
+            # Playouts made in this process play on the leaves' boards, so the player to move is read beforehand
+            leafColors = [chessSim.game.currentColor for _, chessSim in leaves]
+
+            if self.pool:
+                tasks = [(chessSim.toBytes(), self.pieceValues, Mcts.playoutPlies) for _, chessSim in leaves]
+                scores = self.pool.map(runPlayoutFromBytes, tasks)
+            else:
+                scores = [runPlayout(chessSim, self.pieceValues, Mcts.playoutPlies) for _, chessSim in leaves]
+
+            for (node, _), leafColor, blackScore in zip(leaves, leafColors, scores):
+                Mcts.backpropagate(node, leafColor, blackScore)
+            self.iterations += batchSize
+
+        if not self.root.children:
+            return None
+        return max(self.root.children, key=lambda child: child.visits).move
+
+    def findReusableRoot(self, positionHash):
+        """
+        Looks for the position in the previous tree: the previous root itself, or a position after one move from each
+        player.
+        :param positionHash: int Zobrist hash of the position to search
+        :return: MctsNode object to search from, detached from the rest of the previous tree
+        """
+        if self.root:
+            candidates = [self.root] + [grandchild for child in self.root.children for grandchild in child.children]
+            for node in candidates:
+                if node.positionHash == positionHash:
+                    node.parent = None
+                    node.move = None
+                    return node
+        return MctsNode(None, None, positionHash)
+
+    def selectLeaf(self, rootSim):
+        """
+        Walks down the tree by UCT until reaching a node with untried moves, adds a child for one of them, and counts
+        a visit to every node on the way.
+        :param rootSim: ChessBoardSim object of the root position
+        :return: tuple of (MctsNode object of the leaf, ChessBoardSim object of the leaf's position)
+        """
+        chessSim = ChessBoardSim(rootSim, self.pieceValues, rootSim.game.currentColor)
+        node = self.root
+        node.visits += 1
+
+        while not chessSim.gameOver:
+            if node.untriedMoves is None:
+                node.untriedMoves = getLegalMoves(chessSim)
+                random.shuffle(node.untriedMoves)
+
+            if node.untriedMoves:
+                move = node.untriedMoves.pop()
+                playMove(chessSim, move)
+                child = MctsNode(move, node, chessSim.game.positionHash)
+                node.children.append(child)
+                child.visits += 1
+                return child, chessSim
+            elif not node.children:
+                break
+
+            logVisits = math.log(node.visits)
+            node = max(node.children, key=lambda child: child.getUct(logVisits))
+            playMove(chessSim, node.move)
+            node.visits += 1
+
+        return node, chessSim
+
+    @staticmethod
+    def backpropagate(node, leafColor, blackScore):
+        """
+        :param node: MctsNode object of the leaf the playout started from
+        :param leafColor: str color prefix of the player to move in the leaf's position
+        :param blackScore: float playout score for black
+        :return: None
+        """
+        # The player who made the leaf's move is the one not to move in its position
+        blackMoved = leafColor == "w_"
+        while node:
+            node.score += blackScore if blackMoved else 1 - blackScore
+            blackMoved = not blackMoved
+            node = node.parent
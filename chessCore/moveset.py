@@ -1,3 +1,6 @@
+from chessCore.tracing import Trace
+
+
 class MoveSet:
     """
     Object that gets legal chess moves within the given piece's (via getMoves) position. Ultimately returns a list
@@ -27,7 +30,6 @@ class MoveSet:
     :var self.position: tuple of the current piece's indices
     :var self.colorPrefix: string of the current piece's color prefix
     """
-    diagnostic = False
 
     def __init__(self, piece, board):
         """
@@ -126,20 +128,16 @@ class MoveSet:
         self.protectedPieces = []
 
     def getMoves(self):
-        if MoveSet.diagnostic:
-            print(" ========================================================\n"
-                  "                      NAME: ", self.pieceName)
         self.clearMovesets()
 
         self.setUnverifiedMoveset()
         self.verifyMoveset()
         self.setCaptureset()
 
-        if MoveSet.diagnostic:
-            print(f"getMoves called on ======================================{self}:\n"
-                  f"    verified: {self.verifiedMoveset}\n"
-                  f"    protected: {self.protectedPieces}\n"
-                  f"    capture: {self.verifiedCaptureset}")
+        if Trace.movegen <= Trace.DEBUG:
+            Trace.emit("movegen", Trace.DEBUG, "getMoves", piece=self.colorPrefix + self.pieceName, id=self.id,
+                       position=self.position, verified=self.verifiedMoveset, protected=self.protectedPieces,
+                       capture=self.verifiedCaptureset)
 
     def setUnverifiedMoveset(self):
         self.pieceMovesets[self.pieceName]()
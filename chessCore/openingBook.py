@@ -0,0 +1,210 @@
+"""
+Opening books in a Polyglot-style binary format.
+"""
+import mmap
+import os
+import struct
+from random import randrange
+
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.fen import Fen
+from chessCore.pgn import Pgn, San
+
+
+class OpeningBook:
+    """
+    A read-only opening book file. The file is a sequence of 16 byte big-endian entries, sorted by hash:
+
+        uint64 hash     Zobrist hash of the position (see Zobrist), i.e. Game.positionHash
+        uint16 move     bits 0-2 destination file, 3-5 destination rank, 6-8 origin file, 9-11 origin rank,
+                        12-14 promotion piece (0 none, 1 knight, 2 bishop, 3 rook, 4 queen)
+        uint16 weight   relative probability of the move being played
+        uint32 learn    unused, kept for compatibility with the layout of Polyglot books
+
+    The layout is Polyglot's, but the hashes are this project's Zobrist keys, so books made by other Polyglot tools
+    cannot be read. Files are memory-mapped and binary searched rather than loaded, so every process using the same
+    book shares the operating system's single cached copy of it.
+    :var self.entryCount: int number of entries in the book
+    """
+    entryStruct = struct.Struct(">QHHI")
+    promotionNames = [None, "knight", "bishop", "rook", "queen"]
+
+    # Books opened by this process, by path
+    openBooks = {}
+
+    @classmethod
+    def open(cls, path):
+        """
+        Opens a book once per process, e.g. for every ChessBrain of a worker to share.
+        :param path: str path of the book file
+        :return: OpeningBook object
+        """
+        if path not in cls.openBooks:
+            cls.openBooks[path] = OpeningBook(path)
+        return cls.openBooks[path]
+
+    def __init__(self, path):
+        self.path = path
+        self.bookFile = open(path, "rb")
+        fileSize = os.fstat(self.bookFile.fileno()).st_size
+        if fileSize % OpeningBook.entryStruct.size:
+            raise Exception(f"{path} is not an opening book: its size is not a multiple of the entry size")
+
+        self.entryCount = fileSize // OpeningBook.entryStruct.size
+        # Empty files cannot be memory-mapped
+        self.data = mmap.mmap(self.bookFile.fileno(), 0, access=mmap.ACCESS_READ) if fileSize else b""
+
+    def close(self):
+        if self.data:
+            self.data.close()
+        self.bookFile.close()
+        OpeningBook.openBooks.pop(self.path, None)
+
+    def getEntry(self, index):
+        """
+        :return: tuple of the (hash, move, weight, learn) values of the entry at index
+        """
+        return OpeningBook.entryStruct.unpack_from(self.data, index * OpeningBook.entryStruct.size)
+
+    def findEntries(self, positionHash):
+        """
+        Binary searches for the entries of a position.
+        :param positionHash: int Zobrist hash of the position
+        :return: list of (move, weight) tuples. Empty if the position is not in the book
+        """
+        low = 0
+        high = self.entryCount
+        while low < high:
+            middle = (low + high) // 2
+            if self.getEntry(middle)[0] < positionHash:
+                low = middle + 1
+            else:
+                high = middle
+
+        entries = []
+        while low < self.entryCount:
+            entryHash, move, weight, _ = self.getEntry(low)
+            if entryHash != positionHash:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    def getMove(self, chessBoard):
+        """
+        Picks a book move for the current player at random, weighted by the entries' weights.
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :return: tuple of (piece, x index, y index, str promotion piece name or None) in the board's terms, or None if
+        the position has no legal book moves
+        """
+        moves = []
+        for move, weight in self.findEntries(chessBoard.game.positionHash):
+            decodedMove = OpeningBook.decodeMove(chessBoard, move)
+            # Entries of other positions may share the hash, so only legal moves are kept
+            if decodedMove and weight:
+                moves.append((decodedMove, weight))
+
+        if not moves:
+            return None
+
+        pick = randrange(sum(weight for _, weight in moves))
+        for decodedMove, weight in moves:
+            if pick < weight:
+                return decodedMove
+            pick -= weight
+
+    @staticmethod
+    def encodeMove(fromPos, toPos, promotionName=None):
+        """
+        :param fromPos: tuple of the origin tile's (x, y) indices
+        :param toPos: tuple of the destination tile's (x, y) indices
+        :param promotionName: str name of the piece a pawn promotes to, or None
+        :return: int move in the book's format
+        """
+        # Book ranks count up from white's side while y indices count down from black's side
+        return toPos[0] | (7 - toPos[1]) << 3 | fromPos[0] << 6 | (7 - fromPos[1]) << 9 | \
+            OpeningBook.promotionNames.index(promotionName) << 12
+
+    @staticmethod
+    def decodeMove(chessBoard, move):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :param move: int move in the book's format
+        :return: tuple of (piece, x index, y index, str promotion piece name or None), or None if the move is not legal
+        for the current player
+        """
+        toPos = (move & 7, 7 - (move >> 3 & 7))
+        fromPos = (move >> 6 & 7, 7 - (move >> 9 & 7))
+        promotionIndex = move >> 12 & 7
+        if promotionIndex >= len(OpeningBook.promotionNames):
+            return None
+
+        piece = chessBoard.board[fromPos[0]][fromPos[1]].currentPiece
+        if not piece or piece.colorPrefix != chessBoard.game.currentColor or \
+                toPos not in piece.moveset.getListifiedVerifiedset():
+            return None
+        return piece, toPos[0], toPos[1], OpeningBook.promotionNames[promotionIndex]
+
+    @staticmethod
+    def build(pgnFiles, outPath, pieceValues, maxPly=16, minGames=1):
+        """
+        Builds a book from PGN files. Each move played within the first maxPly plies of a game is weighted by its
+        result for the player who made it: 2 for a win, 1 for a draw or unfinished game and 0 for a loss, so moves that
+        only ever lost are left out.
+        :param pgnFiles: list of file objects of PGN files
+        :param outPath: str path of the book file to write
+        :param pieceValues: dict of piece names to values, needed to create the replay boards
+        :param maxPly: int number of plies of each game to add
+        :param minGames: int minimum number of games a move must have been played in to be added
+        :return: tuple of (int games read, int entries written)
+        """
+        # (hash, move) to [games, weight]
+        moveStats = {}
+        gameCount = 0
+
+        for pgnFile in pgnFiles:
+            for headers, sanMoves, result in Pgn.readGames(pgnFile):
+                if headers.get("SetUp") == "1":
+                    continue
+                gameCount += 1
+
+                chessBoard = ChessBoardSim.fromFen(Fen.startingFen, pieceValues)
+                for san in sanMoves[:maxPly]:
+                    try:
+                        piece, toPos, promotionName = San.toMove(chessBoard, san)
+                    except Exception:
+                        # The rest of the game cannot be followed, e.g. it contains a move the rules here do not allow
+                        break
+
+                    moverWon = "1-0" if chessBoard.game.currentColor == "w_" else "0-1"
+                    if result == moverWon:
+                        resultWeight = 2
+                    elif result in ["1-0", "0-1"]:
+                        resultWeight = 0
+                    else:
+                        resultWeight = 1
+
+                    key = (chessBoard.game.positionHash,
+                           OpeningBook.encodeMove((piece.xIndex, piece.yIndex), toPos, promotionName))
+                    stats = moveStats.setdefault(key, [0, 0])
+                    stats[0] += 1
+                    stats[1] += resultWeight
+
+                    chessBoard.playMove(piece, toPos[0], toPos[1], promotionName or "queen")
+                    if chessBoard.gameOver:
+                        break
+
+        entries = [(positionHash, move, weight) for (positionHash, move), (games, weight) in moveStats.items()
+                   if games >= minGames and weight]
+
+        # Weights are scaled down to fit in 16 bits if needed, keeping every entry's weight at least 1
+        maxWeight = max((weight for _, _, weight in entries), default=0)
+        scale = max(1, maxWeight / 0xFFFF)
+        entries = [(positionHash, move, max(1, int(weight / scale))) for positionHash, move, weight in entries]
+        entries.sort(key=lambda entry: (entry[0], -entry[2], entry[1]))
+
+        with open(outPath, "wb") as bookFile:
+            for positionHash, move, weight in entries:
+                bookFile.write(OpeningBook.entryStruct.pack(positionHash, move, weight, 0))
+
+        return gameCount, len(entries)
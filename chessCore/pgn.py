@@ -0,0 +1,321 @@
+"""
+Standard algebraic notation (SAN) and PGN game records.
+"""
+import re
+
+from chessCore.fen import Fen
+from chessCore.chessboardBot import ChessBoardSim
+
+
+class San:
+    """
+    Writes moves in standard algebraic notation, e.g. "Nbd7", "exd6", "O-O", "e8=Q+". A move's SAN depends on the
+    position it is played from, so fromMove must be called before the move is applied and suffix after it.
+    """
+    pieceLetters = {"king": "K", "queen": "Q", "rook": "R", "bishop": "B", "knight": "N", "pawn": ""}
+
+    @staticmethod
+    def fromMove(chessBoard, piece, toPos, promotionName=None):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object, in the position before the move
+        :param piece: ChessPiece object being moved
+        :param toPos: tuple of the destination tile's (x, y) indices
+        :param promotionName: str name of the piece a pawn promotes to, or None
+        :return: str SAN of the move, without the check/checkmate suffix
+        """
+        fromPos = (piece.xIndex, piece.yIndex)
+        if piece.name == "king" and abs(toPos[0] - fromPos[0]) == 2:
+            return "O-O" if toPos[0] > fromPos[0] else "O-O-O"
+
+        # Pawns can only change file by capturing, which covers en passant as well
+        isCapture = chessBoard.board[toPos[0]][toPos[1]].currentPiece is not None or \
+            (piece.name == "pawn" and toPos[0] != fromPos[0])
+        toName = Fen.tileName(toPos)
+
+        if piece.name == "pawn":
+            if isCapture:
+                san = f"{Fen.tileName(fromPos)[0]}x{toName}"
+            else:
+                san = toName
+            if promotionName:
+                san += "=" + San.pieceLetters[promotionName]
+            return san
+
+        return San.pieceLetters[piece.name] + San.disambiguation(chessBoard, piece, toPos) + \
+            ("x" if isCapture else "") + toName
+
+    @staticmethod
+    def disambiguation(chessBoard, piece, toPos):
+        """
+        :return: str of the origin file, rank or both, as needed to tell piece apart from other pieces of the same
+        kind that can also move to toPos
+        """
+        rivals = [other for other in chessBoard.getPieceSet(piece.colorPrefix).pieces
+                  if other is not piece and other.name == piece.name and
+                  toPos in other.moveset.getListifiedVerifiedset()]
+        if not rivals:
+            return ""
+
+        fromName = Fen.tileName((piece.xIndex, piece.yIndex))
+        if all(other.xIndex != piece.xIndex for other in rivals):
+            return fromName[0]
+        elif all(other.yIndex != piece.yIndex for other in rivals):
+            return fromName[1]
+        return fromName
+
+    @staticmethod
+    def suffix(chessBoard):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object, in the position after the move
+        :return: str "#" for checkmate, "+" for check, otherwise ""
+        """
+        if chessBoard.gameOver == "CHECKMATE":
+            return "#"
+        elif chessBoard.game.inCheck[chessBoard.game.currentColor]:
+            return "+"
+        return ""
+
+    @staticmethod
+    def toMove(chessBoard, san):
+        """
+        Finds the legal move of the current player that a SAN string describes.
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :param san: str SAN of the move. Check/checkmate suffixes and annotations such as "!?" are ignored
+        :return: tuple of (ChessPiece object, tuple of the destination's (x, y) indices, str promotion piece name or
+        None)
+        """
+        san = san.rstrip("+#!?")
+        promotionName = None
+        if "=" in san:
+            promotionName = {letter: name for name, letter in San.pieceLetters.items()}[san[san.index("=") + 1]]
+
+        for piece in chessBoard.getPieceSet(chessBoard.game.currentColor).pieces:
+            for toPos in piece.moveset.getListifiedVerifiedset():
+                if San.fromMove(chessBoard, piece, toPos, promotionName if piece.name == "pawn" else None) == san:
+                    return piece, toPos, promotionName
+
+        raise Exception(f"Illegal or unknown move: {san}")
+
+
+class GameRecord:
+    """
+    Records the SAN of every move played on a board, starting with the position the record was created for. A move is
+    started before it is applied, as SAN depends on the position it is played from, and finished once the turn has
+    passed to the opponent, i.e. after the promotion selection of promoting moves.
+    :var self.sanList: list of str SAN of the finished moves
+    """
+    def __init__(self, startingFen=Fen.startingFen):
+        self.startingFen = startingFen
+        self.sanList = []
+        self.pendingSan = None
+        self.pendingPiece = None
+
+    def startMove(self, chessBoard, piece, toPos):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object, in the position before the move
+        :param piece: ChessPiece object about to be moved
+        :param toPos: tuple of the destination tile's (x, y) indices
+        :return: None
+        """
+        self.pendingSan = San.fromMove(chessBoard, piece, toPos)
+        self.pendingPiece = piece if piece.name == "pawn" and toPos[1] in (0, 7) else None
+
+    def finishMove(self, chessBoard):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object, in the position after the move
+        :return: None
+        """
+        if self.pendingSan is None:
+            return
+
+        san = self.pendingSan
+        if self.pendingPiece:
+            # The pawn has been renamed to the piece it was promoted to
+            san += "=" + San.pieceLetters[self.pendingPiece.name]
+        self.sanList.append(san + San.suffix(chessBoard))
+
+        self.pendingSan = None
+        self.pendingPiece = None
+
+
+class Pgn:
+    """
+    Formats and reads PGN game records.
+    """
+    rosterTags = ["Event", "Site", "Date", "Round", "White", "Black", "Result"]
+    results = ["1-0", "0-1", "1/2-1/2", "*"]
+    lineLength = 80
+
+    tagPattern = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+    # Comments, comments to the end of the line, variation brackets, NAGs, move numbers and everything else (SAN and
+    # results)
+    tokenPattern = re.compile(r"\{[^}]*\}?|;.*|[()]|\$\d+|\d+\.+|[^\s(){};]+")
+    moveNumberPattern = re.compile(r"\d+\.+$")
+
+    @staticmethod
+    def formatGame(headers, sanMoves, result, startingFen=Fen.startingFen):
+        """
+        :param headers: dict of tag names to values. Missing seven tag roster tags are filled with "?"
+        :param sanMoves: list of str SAN moves, starting with white's move unless startingFen says otherwise
+        :param result: str "1-0", "0-1", "1/2-1/2" or "*"
+        :param startingFen: str FEN the game started from. Recorded in the SetUp/FEN tags if it is not the standard
+        starting position
+        :return: str of the PGN record, ending with a blank line
+        """
+        tags = {tag: headers.get(tag, "?") for tag in Pgn.rosterTags}
+        tags["Result"] = result
+        tags.update({tag: value for tag, value in headers.items() if tag not in tags})
+        if startingFen != Fen.startingFen:
+            tags["SetUp"] = "1"
+            tags["FEN"] = startingFen
+
+        lines = [f'[{tag} "{Pgn.escapeTagValue(value)}"]' for tag, value in tags.items()]
+        lines.append("")
+        lines.extend(Pgn.wrapMovetext(Pgn.movetextTokens(sanMoves, startingFen) + [result]))
+        return "\n".join(lines) + "\n\n"
+
+    @staticmethod
+    def getResult(chessBoard):
+        """
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :return: str of the game's result in PGN notation. "*" if the game has not ended
+        """
+        if chessBoard.gameOver == "CHECKMATE":
+            # The player to move is the one that has been checkmated
+            return "0-1" if chessBoard.game.currentColor == "w_" else "1-0"
+        elif chessBoard.gameOver:
+            return "1/2-1/2"
+        return "*"
+
+    @staticmethod
+    def escapeTagValue(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+    @staticmethod
+    def movetextTokens(sanMoves, startingFen=Fen.startingFen):
+        """
+        :return: list of str tokens of the movetext, i.e. move numbers and SAN moves
+        """
+        fenFields = startingFen.split()
+        blackToMove = fenFields[1] == "b"
+        moveNumber = int(fenFields[5]) if len(fenFields) > 5 else 1
+
+        tokens = []
+        if blackToMove and sanMoves:
+            tokens.append(f"{moveNumber}...")
+        for san in sanMoves:
+            if not blackToMove:
+                tokens.append(f"{moveNumber}.")
+            else:
+                moveNumber += 1
+            tokens.append(san)
+            blackToMove = not blackToMove
+        return tokens
+
+    @staticmethod
+    def wrapMovetext(tokens):
+        lines = []
+        line = ""
+        for token in tokens:
+            if line and len(line) + 1 + len(token) > Pgn.lineLength:
+                lines.append(line)
+                line = token
+            else:
+                line = f"{line} {token}" if line else token
+        if line:
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def readGames(fileObj):
+        """
+        Generator over the games of a PGN file. The file is read line by line, so only the game being read is held in
+        memory. Comments, variations and NAGs are skipped.
+        :param fileObj: file object (or any iterable of lines) of the PGN file
+        :return: generator of (dict of tag names to values, list of str SAN moves, str result) tuples
+        """
+        headers = {}
+        sanMoves = []
+        inComment = False
+        variationDepth = 0
+
+        for line in fileObj:
+            line = line.strip()
+            if inComment:
+                commentEnd = line.find("}")
+                if commentEnd == -1:
+                    continue
+                line = line[commentEnd + 1:]
+                inComment = False
+
+            if line.startswith("[") and not sanMoves and not variationDepth:
+                match = Pgn.tagPattern.match(line)
+                if match:
+                    headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                    continue
+
+            for token in Pgn.tokenPattern.findall(line):
+                if token.startswith(";"):
+                    break
+                elif token.startswith("{"):
+                    inComment = not token.endswith("}")
+                elif token == "(":
+                    variationDepth += 1
+                elif token == ")":
+                    variationDepth -= 1
+                elif variationDepth or token.startswith("$") or Pgn.moveNumberPattern.match(token):
+                    continue
+                elif token in Pgn.results:
+                    yield headers, sanMoves, token
+                    headers = {}
+                    sanMoves = []
+                else:
+                    sanMoves.append(token)
+
+        # A final game without a result token
+        if headers or sanMoves:
+            yield headers, sanMoves, headers.get("Result", "*")
+
+    @staticmethod
+    def replayGame(headers, sanMoves, pieceValues):
+        """
+        Generator that plays a game's moves on a ChessBoardSim, yielding after every move. The same board object is
+        yielded each time, so positions that are needed later must be copied (e.g. with toBytes).
+        :param headers: dict of the game's tags. The SetUp/FEN tags give the starting position
+        :param sanMoves: iterable of str SAN moves
+        :param pieceValues: dict of piece names to values, used for the board's score
+        :return: generator of (str SAN, ChessBoardSim object) tuples
+        """
+        startingFen = headers["FEN"] if headers.get("SetUp") == "1" and "FEN" in headers else Fen.startingFen
+        chessBoard = ChessBoardSim.fromFen(startingFen, pieceValues)
+
+        for san in sanMoves:
+            piece, toPos, promotionName = San.toMove(chessBoard, san)
+            chessBoard.playMove(piece, toPos[0], toPos[1], promotionName or "queen")
+            yield san, chessBoard
+
+
+class PgnWriter:
+    """
+    Appends games to a PGN file one at a time, flushing after each so that a long run never holds more than one game
+    in memory and an interrupted run loses at most the game in progress.
+    """
+    def __init__(self, fileObj):
+        self.fileObj = fileObj
+
+    def writeGame(self, headers, sanMoves, result, startingFen=Fen.startingFen):
+        """
+        See Pgn.formatGame for the parameters.
+        :return: None
+        """
+        self.fileObj.write(Pgn.formatGame(headers, sanMoves, result, startingFen))
+        self.fileObj.flush()
+
+    def writeRecord(self, gameRecord, headers, result):
+        """
+        :param gameRecord: GameRecord object of the game
+        :param headers: dict of tag names to values
+        :param result: str PGN result
+        :return: None
+        """
+        self.writeGame(headers, gameRecord.sanList, result, gameRecord.startingFen)
@@ -0,0 +1,236 @@
+"""
+Profiling of whole runs for finding hot spots, either with cProfile, which records every call, or with a sampling
+profiler cheap enough for long runs. Both results can be written as collapsed stacks, the input of flamegraph tools
+such as flamegraph.pl, inferno or speedscope: one line per call stack, with its frames from the outermost call inwards
+separated by semicolons, followed by a space and a count.
+
+Memory is profiled with tracemalloc, see MemoryProfile.
+"""
+import os
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+
+
+def formatFrame(fileName, lineNum, functionName):
+    """
+    :return: str name of a function in a collapsed stack, e.g. "MoveSet.verifyMoveset (moveset.py:120)"
+    """
+    # cProfile names built-in functions with the file "~"
+    if fileName == "~":
+        return functionName.replace(";", ",")
+    # Semicolons separate the frames of a collapsed stack and the last space separates the count
+    return f"{functionName} ({os.path.basename(fileName)}:{lineNum})".replace(";", ",")
+
+
+def writeCollapsed(stacks, path):
+    """
+    :param stacks: dict of tuple of str frames, outermost first, to int count
+    :param path: str path of the file to write
+    :return: None
+    """
+    with open(path, "w") as collapsedFile:
+        for stack, count in sorted(stacks.items()):
+            if count > 0:
+                collapsedFile.write(f"{';'.join(stack)} {count}\n")
+
+
+def collapseProfile(stats, minMicroseconds=1):
+    """
+    Estimates collapsed stacks from a cProfile profile. cProfile only records the time spent in each function per
+    caller, not whole stacks, so the time of a function reached along a stack is divided among its callees in proportion
+    to the time each of them was called for from it. Recursive calls are counted as time spent in the calling frame.
+    :param stats: pstats.Stats object
+    :param minMicroseconds: int stacks that took less than this are left out, to keep the output a readable size
+    :return: Counter of tuple of str frames to int microseconds
+    """
+    profile = stats.stats
+    callees = {}
+    for function, (_, _, _, _, callers) in profile.items():
+        for caller, (_, _, _, callerCumulativeTime) in callers.items():
+            callees.setdefault(caller, []).append((function, callerCumulativeTime))
+
+    stacks = Counter()
+
+    def visit(function, stack, seconds):
+        _, _, ownTime, cumulativeTime, _ = profile[function]
+        stack = stack + (formatFrame(*function),)
+        selfSeconds = seconds * ownTime / cumulativeTime if cumulativeTime else seconds
+        for callee, calleeTime in callees.get(function, []):
+            calleeSeconds = seconds * calleeTime / cumulativeTime if cumulativeTime else 0
+            if formatFrame(*callee) in stack:
+                selfSeconds += calleeSeconds
+            elif calleeSeconds * 1e6 >= minMicroseconds:
+                visit(callee, stack, calleeSeconds)
+        stacks[stack] += round(selfSeconds * 1e6)
+
+    for function, (_, _, _, cumulativeTime, callers) in profile.items():
+        if not callers:
+            visit(function, (), cumulativeTime)
+    return stacks
+
+
+class StackSampler:
+    """
+    Samples the call stack of a thread at a fixed interval, from a thread of its own. Unlike cProfile this does not slow
+    down the calls being profiled, so it suits long runs, but functions are only seen in proportion to the time they
+    take. Samples are taken when the sampling thread gets the GIL, so while sampling the interpreter's switch interval
+    (see sys.setswitchinterval, 5ms by default) is lowered to the sampling interval if it is longer.
+    :var self.stacks: Counter of tuple of str frames, outermost first, to int number of samples
+    :var self.samples: int number of samples taken
+    """
+    def __init__(self, interval=0.005, threadId=None):
+        """
+        :param interval: float seconds between samples
+        :param threadId: int identifier of the thread to sample, defaults to the one creating the sampler
+        """
+        self.interval = interval
+        self.threadId = threadId if threadId is not None else threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopEvent = threading.Event()
+        self.thread = None
+        self.switchInterval = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stop()
+
+    def start(self):
+        self.stopEvent.clear()
+        self.switchInterval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self.switchInterval, self.interval))
+        self.thread = threading.Thread(target=self.run, name="StackSampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+            sys.setswitchinterval(self.switchInterval)
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            frame = sys._current_frames().get(self.threadId)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(formatFrame(code.co_filename, code.co_firstlineno,
+                                         getattr(code, "co_qualname", code.co_name)))
+                frame = frame.f_back
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def getReport(self, top=25):
+        """
+        :param top: int number of functions listed
+        :return: str table of the functions seen in the most samples, with the share of samples each was on the stack
+        for (cumulative) and at the top of it (self)
+        """
+        if not self.samples:
+            return "No samples taken"
+        cumulative = Counter()
+        ownSamples = Counter()
+        for stack, count in self.stacks.items():
+            for frame in set(stack):
+                cumulative[frame] += count
+            ownSamples[stack[-1]] += count
+
+        lines = [f"{self.samples} samples at {self.interval * 1000:g}ms intervals",
+                 f"{'Cumulative':>10} {'Self':>7}  Function"]
+        for frame, count in cumulative.most_common(top):
+            lines.append(f"{count / self.samples:>10.1%} {ownSamples[frame] / self.samples:>7.1%}  {frame}")
+        return "\n".join(lines)
+
+
+class MemoryProfile:
+    """
+    Memory allocated by the code run within a with block, measured with tracemalloc. Tracing slows allocations down
+    several times, so it is only started for the block, unless it was already on.
+
+    Searches record their own peak in their SearchStats while tracing is on, which resets tracemalloc's peak, so the
+    peak of a block with searches in it only covers the time since the last search started.
+    :var self.peakBytes: int highest memory use within the block, above that at its start
+    :var self.bytes: int memory still allocated at the end of the block, above that at its start
+    :var self.blocks: int memory blocks still allocated at the end of the block, above those at its start
+    :var self.statistics: list of tracemalloc.StatisticDiff objects of the allocation sites whose memory changed,
+    largest growth first
+    """
+    # Allocations of tracemalloc's own snapshots and of imports are left out
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+               tracemalloc.Filter(False, "<frozen importlib._bootstrap>"), tracemalloc.Filter(False, "<unknown>")]
+
+    def __init__(self, frames=1, keyType="lineno"):
+        """
+        :param frames: int frames of the call stack stored per allocation. More than 1 is needed for the "traceback"
+        keyType, and slows tracing down further
+        :param keyType: str grouping of the allocation sites, "lineno", "filename" or "traceback"
+        """
+        self.frames = frames
+        self.keyType = keyType
+        self.startedTracing = False
+        self.startSnapshot = None
+        self.startBytes = 0
+        self.peakBytes = 0
+        self.bytes = 0
+        self.blocks = 0
+        self.statistics = []
+
+    def __enter__(self):
+        self.startedTracing = not tracemalloc.is_tracing()
+        if self.startedTracing:
+            tracemalloc.start(self.frames)
+        self.startSnapshot = tracemalloc.take_snapshot().filter_traces(MemoryProfile.filters)
+        tracemalloc.reset_peak()
+        self.startBytes = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        currentBytes, peakBytes = tracemalloc.get_traced_memory()
+        self.peakBytes = peakBytes - self.startBytes
+        endSnapshot = tracemalloc.take_snapshot().filter_traces(MemoryProfile.filters)
+        if self.startedTracing:
+            tracemalloc.stop()
+
+        self.statistics = endSnapshot.compare_to(self.startSnapshot, self.keyType)
+        self.startSnapshot = None
+        self.bytes = sum(statistic.size_diff for statistic in self.statistics)
+        self.blocks = sum(statistic.count_diff for statistic in self.statistics)
+
+    def getReport(self, top=10, perCount=1):
+        """
+        :param top: int number of allocation sites listed
+        :param perCount: int number of objects or operations the memory is divided by, e.g. the copies made in
+        measureAllocations
+        :return: str table of the allocation sites whose memory grew the most
+        """
+        lines = [f"{'Bytes':>10} {'Blocks':>8}  Allocation site"]
+        for statistic in self.statistics[:top]:
+            if statistic.size_diff <= 0:
+                break
+            frame = statistic.traceback[0]
+            lines.append(f"{statistic.size_diff / perCount:>10,.0f} {statistic.count_diff / perCount:>8.1f}  "
+                         f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return "\n".join(lines)
+
+
+def measureAllocations(function, count=100, frames=1):
+    """
+    Measures what the objects created by a function cost by calling it repeatedly, keeping every result alive.
+    :param function: function taking no arguments
+    :param count: int number of calls, over which the memory is averaged
+    :param frames: int frames stored per allocation, see MemoryProfile
+    :return: MemoryProfile object of the calls. Divide its bytes and blocks by count for the cost of one call
+    """
+    results = []
+    with MemoryProfile(frames) as profile:
+        for _ in range(count):
+            results.append(function())
+    return profile
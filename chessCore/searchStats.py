@@ -0,0 +1,79 @@
+"""
+Statistics of a bot's search, for comparing the performance of engine versions.
+"""
+
+
+class SearchStats:
+    """
+    Statistics of one ChessBrain.getMove call. Searches that do not prune or use a hash table leave the respective
+    counters as None rather than 0, so that "not applicable" is not mistaken for "never happened".
+    :var self.engine: str name of what chose the move, e.g. "minimax", "book" or "tablebase"
+    :var self.nodes: int positions visited
+    :var self.leafEvaluations: int positions scored without being searched further
+    :var self.nodesPerDepth: list of int positions visited at each ply from the root, index 0 being the root
+    :var self.cutoffs: int branches pruned by a cutoff, None if the search does not prune
+    :var self.firstMoveCutoffs: int cutoffs caused by the first move searched, None if the search does not prune
+    :var self.hashProbes: int hash table lookups, None if the search has no hash table
+    :var self.hashHits: int lookups that found a usable entry, None if the search has no hash table
+    :var self.iterations: list of (int depth, int nodes, float seconds) tuples, one per iteration of an iterative
+    deepening search, or a single one for a fixed depth search. Nodes and seconds are those of the iteration alone
+    :var self.seconds: float wall time of the whole search
+    :var self.peakBytes: int highest memory use during the search above that at its start, None unless tracemalloc
+    was tracing (see profiling.MemoryProfile)
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.nodes = 0
+        self.leafEvaluations = 0
+        self.nodesPerDepth = []
+        self.cutoffs = None
+        self.firstMoveCutoffs = None
+        self.hashProbes = None
+        self.hashHits = None
+        self.iterations = []
+        self.seconds = 0.0
+        self.peakBytes = None
+
+    def countNode(self, depth):
+        self.nodes += 1
+        while len(self.nodesPerDepth) <= depth:
+            self.nodesPerDepth.append(0)
+        self.nodesPerDepth[depth] += 1
+
+    def getNodesPerSecond(self):
+        return self.nodes / self.seconds if self.seconds else None
+
+    def getFirstMoveCutoffRatio(self):
+        """
+        :return: float fraction of cutoffs caused by the first move searched, a measure of move ordering. None if the
+        search does not prune or made no cutoffs
+        """
+        if not self.cutoffs:
+            return None
+        return self.firstMoveCutoffs / self.cutoffs
+
+    def getHashHitRate(self):
+        if not self.hashProbes:
+            return None
+        return self.hashHits / self.hashProbes
+
+    def getBranchingFactors(self):
+        """
+        :return: list of float effective branching factors, the ratio of the nodes at each ply to those at the ply
+        before it, starting with the root's
+        """
+        return [round(self.nodesPerDepth[depth + 1] / self.nodesPerDepth[depth], 3)
+                for depth in range(len(self.nodesPerDepth) - 1) if self.nodesPerDepth[depth]]
+
+    def toDict(self):
+        """
+        :return: dict of the statistics and the values derived from them, which JSON can represent
+        """
+        nodesPerSecond = self.getNodesPerSecond()
+        return {"engine": self.engine, "nodes": self.nodes, "leafEvaluations": self.leafEvaluations,
+                "nodesPerSecond": round(nodesPerSecond, 1) if nodesPerSecond is not None else None,
+                "nodesPerDepth": self.nodesPerDepth, "branchingFactors": self.getBranchingFactors(),
+                "cutoffs": self.cutoffs, "firstMoveCutoffRatio": self.getFirstMoveCutoffRatio(),
+                "hashProbes": self.hashProbes, "hashHitRate": self.getHashHitRate(),
+                "iterations": [[depth, nodes, round(seconds, 6)] for depth, nodes, seconds in self.iterations],
+                "seconds": round(self.seconds, 6), "peakBytes": self.peakBytes}
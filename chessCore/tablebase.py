@@ -0,0 +1,573 @@
+"""
+Endgame tablebases for pawnless endings of up to four pieces (kings included), e.g. KQvK, KRvK, KBNvK and KQvKR.
+
+Tables are generated offline by retrograde analysis and store the distance to mate of every position. They use their
+own compact move generation rather than MoveSet, as generation visits millions of positions.
+"""
+import mmap
+import os
+import struct
+
+# Squares are numbered x * 8 + y, using the same x and y indices as ChessBoard.board
+orthogonalDirections = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+diagonalDirections = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+knightOffsets = [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)]
+pieceDirections = {"Q": orthogonalDirections + diagonalDirections, "R": orthogonalDirections, "B": diagonalDirections}
+
+
+def generateStepTargets(offsets):
+    """
+    :param offsets: list of (dx, dy) tuples
+    :return: list of 64 lists of the squares reachable from each square with a single step of one of the offsets
+    """
+    return [[(x + dx) * 8 + y + dy for dx, dy in offsets if 0 <= x + dx < 8 and 0 <= y + dy < 8]
+            for x in range(8) for y in range(8)]
+
+
+def generateRays(directions):
+    """
+    :param directions: list of (dx, dy) tuples
+    :return: list of 64 lists of rays, each ray being the list of squares in one direction, nearest first
+    """
+    rays = []
+    for x in range(8):
+        for y in range(8):
+            squareRays = []
+            for dx, dy in directions:
+                ray = []
+                rayX, rayY = x + dx, y + dy
+                while 0 <= rayX < 8 and 0 <= rayY < 8:
+                    ray.append(rayX * 8 + rayY)
+                    rayX += dx
+                    rayY += dy
+                squareRays.append(ray)
+            rays.append(squareRays)
+    return rays
+
+
+def generateBetweenMasks(directions):
+    """
+    :param directions: list of (dx, dy) tuples
+    :return: 64x64 list of bitmasks of the squares strictly between two squares on a common line in one of the
+    directions, or None if the squares do not share such a line
+    """
+    masks = [[None] * 64 for _ in range(64)]
+    for fromSquare, squareRays in enumerate(generateRays(directions)):
+        for ray in squareRays:
+            between = 0
+            for toSquare in ray:
+                masks[fromSquare][toSquare] = between
+                between |= 1 << toSquare
+    return masks
+
+
+def generateSymmetries():
+    """
+    :return: list of the 8 symmetries of the board (rotations and reflections), each a list mapping every square to
+    its image. Pawnless positions without castling rights are equivalent to all of their images
+    """
+    transforms = [lambda x, y: (x, y), lambda x, y: (7 - x, y), lambda x, y: (x, 7 - y), lambda x, y: (7 - x, 7 - y),
+                  lambda x, y: (y, x), lambda x, y: (7 - y, x), lambda x, y: (y, 7 - x), lambda x, y: (7 - y, 7 - x)]
+    symmetries = []
+    for transform in transforms:
+        images = [transform(square // 8, square % 8) for square in range(64)]
+        symmetries.append([x * 8 + y for x, y in images])
+    return symmetries
+
+
+def generateKingSlotSquares(symmetries):
+    """
+    :param symmetries: list of symmetries, see generateSymmetries
+    :return: sorted list of the smallest image of every square under the symmetries
+    """
+    return sorted({min(symmetry[square] for symmetry in symmetries) for square in range(64)})
+
+
+def generateKingSymmetries(symmetries):
+    """
+    :param symmetries: list of symmetries, see generateSymmetries
+    :return: list of 64 lists of the symmetries that map each square onto its smallest image
+    """
+    return [[symmetry for symmetry in symmetries if symmetry[square] == min(other[square] for other in symmetries)]
+            for square in range(64)]
+
+
+class Material:
+    """
+    The pieces of an ending, named like "KQvKR": white's pieces, "v", black's pieces, each side starting with its
+    king and listing the rest in the order QRBN. Positions of an ending are tuples of squares in the same order, i.e.
+    (white king, black king, white pieces..., black pieces...).
+    :var self.types: list of str piece letters, in position order
+    :var self.colors: list of int colors (0 white, 1 black), in position order
+    """
+    pieceOrder = "QRBN"
+    pieceStrengths = {"Q": 9, "R": 5, "B": 3, "N": 3}
+
+    def __init__(self, name):
+        whiteName, blackName = name.upper().split("V")
+        if not (whiteName.startswith("K") and blackName.startswith("K")):
+            raise Exception(f"Invalid ending name: {name}")
+        self.whitePieces = Material.sortPieces(whiteName[1:])
+        self.blackPieces = Material.sortPieces(blackName[1:])
+        if any(piece not in Material.pieceOrder for piece in self.whitePieces + self.blackPieces):
+            raise Exception(f"Only pawnless endings are supported: {name}")
+
+        self.name = f"K{self.whitePieces}vK{self.blackPieces}"
+        self.types = ["K", "K"] + list(self.whitePieces) + list(self.blackPieces)
+        self.colors = [0, 1] + [0] * len(self.whitePieces) + [1] * len(self.blackPieces)
+        self.pieceCount = len(self.types)
+
+    @staticmethod
+    def sortPieces(pieces):
+        return "".join(sorted(pieces, key=Material.pieceOrder.index))
+
+    @staticmethod
+    def sideStrength(pieces):
+        return len(pieces), sum(Material.pieceStrengths[piece] for piece in pieces), pieces
+
+    def isCanonical(self):
+        """
+        Tables are only generated for one orientation of each ending, the one where white is at least as strong as
+        black. Other endings are looked up with the colors swapped.
+        :return: bool
+        """
+        return Material.sideStrength(self.whitePieces) >= Material.sideStrength(self.blackPieces)
+
+    def flipped(self):
+        return Material(f"K{self.blackPieces}vK{self.whitePieces}")
+
+    def flipPosition(self, squares):
+        """
+        :param squares: tuple of squares of a position of this ending
+        :return: tuple of the same squares in the order of the flipped ending
+        """
+        whiteCount = len(self.whitePieces)
+        return (squares[1], squares[0]) + squares[2 + whiteCount:] + squares[2:2 + whiteCount]
+
+    def withoutPiece(self, index):
+        """
+        :param index: int position index of a non-king piece
+        :return: Material object of the ending after the piece has been captured
+        """
+        whitePieces = list(self.whitePieces)
+        blackPieces = list(self.blackPieces)
+        if self.colors[index] == 0:
+            whitePieces.pop(index - 2)
+        else:
+            blackPieces.pop(index - 2 - len(self.whitePieces))
+        return Material(f"K{''.join(whitePieces)}vK{''.join(blackPieces)}")
+
+    def getSubEndings(self):
+        """
+        :return: set of names of the canonical endings that captures lead to, excluding bare kings
+        """
+        subEndings = set()
+        for index in range(2, self.pieceCount):
+            subMaterial = self.withoutPiece(index)
+            if subMaterial.pieceCount > 2:
+                subEndings.add((subMaterial if subMaterial.isCanonical() else subMaterial.flipped()).name)
+        return subEndings
+
+
+class Tablebase:
+    """
+    A directory of tablebase files, one per ending, named after the ending (e.g. "KQvK.tb"). Files are memory-mapped
+    when first probed, so processes probing the same files share the operating system's cached copy.
+
+    Each file is a header followed by one byte per index. Index = (kingSlot * 64 ** (pieces - 1) + the squares of the
+    other pieces as base 64 digits) * 2 + side to move (0 white, 1 black), where kingSlot is the slot of the white
+    king's square among the 10 squares that the board's symmetries map every square onto. Values are:
+
+        0       draw
+        1-254   the position is mate in (value - 1) plies. The side to move wins if the number of plies is odd, and is
+                mated if it is even (0 plies: it is checkmated already)
+        255     illegal position, or one that is stored under a symmetric index instead
+
+    Positions with castling rights are never probed, as the tables do not model castling.
+    """
+    maxPieces = 4
+    headerStruct = struct.Struct("<4sB8s")
+    magic = b"CBTB"
+    draw = 0
+    illegal = 255
+
+    knightTargets = generateStepTargets(knightOffsets)
+    kingTargets = generateStepTargets(orthogonalDirections + diagonalDirections)
+    knightTargetSets = [set(targets) for targets in knightTargets]
+    kingTargetSets = [set(targets) for targets in kingTargets]
+    pieceRays = {piece: generateRays(directions) for piece, directions in pieceDirections.items()}
+    betweenMasks = {piece: generateBetweenMasks(directions) for piece, directions in pieceDirections.items()}
+
+    symmetries = generateSymmetries()
+    # The smallest image of every square under the symmetries. Canonical positions have the white king on one of these
+    kingSlotSquares = generateKingSlotSquares(symmetries)
+    kingSlots = {square: slot for slot, square in enumerate(kingSlotSquares)}
+    # For every square, the symmetries that map it onto its king slot square. The canonical image of a position is
+    # always one of these applied to it, as the white king's square is compared first
+    kingSymmetries = generateKingSymmetries(symmetries)
+
+    engineLetters = {"king": "K", "queen": "Q", "rook": "R", "bishop": "B", "knight": "N"}
+
+    # Tablebases opened by this process, by directory
+    openTablebases = {}
+
+    @classmethod
+    def open(cls, directory):
+        """
+        Opens a tablebase directory once per process, e.g. for every ChessBrain of a worker to share.
+        :param directory: str path of the directory holding the table files
+        :return: Tablebase object
+        """
+        if directory not in cls.openTablebases:
+            cls.openTablebases[directory] = Tablebase(directory)
+        return cls.openTablebases[directory]
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Ending name to a bytes-like table, or None if the ending has no file
+        self.tables = {}
+
+    def getTable(self, name):
+        """
+        :param name: str canonical ending name
+        :return: bytes-like table of the ending without its header, or None if there is no file for it
+        """
+        if name not in self.tables:
+            path = os.path.join(self.directory, f"{name}.tb")
+            table = None
+            if os.path.exists(path):
+                with open(path, "rb") as tableFile:
+                    data = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, _, fileName = Tablebase.headerStruct.unpack_from(data)
+                if magic != Tablebase.magic or fileName.rstrip(b"\0").decode() != name:
+                    raise Exception(f"{path} is not a tablebase of {name}")
+                table = memoryview(data)[Tablebase.headerStruct.size:]
+            self.tables[name] = table
+        return self.tables[name]
+
+    @staticmethod
+    def getIndex(squares, sideToMove):
+        """
+        :param squares: tuple of the squares of a legal position, in Material order
+        :param sideToMove: int 0 for white, 1 for black
+        :return: int index of the position, using its canonical image under the board's symmetries
+        """
+        kingSymmetries = Tablebase.kingSymmetries[squares[0]]
+        canonical = tuple(kingSymmetries[0][square] for square in squares)
+        for symmetry in kingSymmetries[1:]:
+            canonical = min(canonical, tuple(symmetry[square] for square in squares))
+
+        index = Tablebase.kingSlots[canonical[0]]
+        for square in canonical[1:]:
+            index = index * 64 + square
+        return index * 2 + sideToMove
+
+    @staticmethod
+    def getPosition(index, pieceCount):
+        """
+        Inverse of getIndex, although the returned position is not necessarily canonical.
+        :return: tuple of (tuple of squares, int side to move)
+        """
+        sideToMove = index & 1
+        index >>= 1
+        squares = []
+        for _ in range(pieceCount - 1):
+            squares.append(index & 63)
+            index >>= 6
+        squares.append(Tablebase.kingSlotSquares[index])
+        return tuple(reversed(squares)), sideToMove
+
+    @staticmethod
+    def getTableSize(pieceCount):
+        return len(Tablebase.kingSlotSquares) * 64 ** (pieceCount - 1) * 2
+
+    @staticmethod
+    def attacks(pieceType, fromSquare, toSquare, occupied):
+        """
+        :param pieceType: str piece letter
+        :param fromSquare: int square of the attacking piece
+        :param toSquare: int square attacked
+        :param occupied: int bitmask of the occupied squares
+        :return: bool
+        """
+        if pieceType == "K":
+            return toSquare in Tablebase.kingTargetSets[fromSquare]
+        elif pieceType == "N":
+            return toSquare in Tablebase.knightTargetSets[fromSquare]
+        between = Tablebase.betweenMasks[pieceType][fromSquare][toSquare]
+        return between is not None and not between & occupied
+
+    @staticmethod
+    def isAttacked(material, squares, square, attackerColor, occupied):
+        for index in range(material.pieceCount):
+            if material.colors[index] == attackerColor and squares[index] != square and \
+                    Tablebase.attacks(material.types[index], squares[index], square, occupied):
+                return True
+        return False
+
+    @staticmethod
+    def isLegal(material, squares, sideToMove):
+        """
+        :return: bool whether no two pieces share a square and the side not to move is not in check
+        """
+        if len(set(squares)) != material.pieceCount:
+            return False
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        return not Tablebase.isAttacked(material, squares, squares[1 - sideToMove], sideToMove, occupied)
+
+    @staticmethod
+    def getTargets(pieceType, square, occupied):
+        """
+        :return: list of the squares a piece could move to if every piece on them could be captured
+        """
+        if pieceType == "K":
+            return Tablebase.kingTargets[square]
+        elif pieceType == "N":
+            return Tablebase.knightTargets[square]
+
+        targets = []
+        for ray in Tablebase.pieceRays[pieceType][square]:
+            for target in ray:
+                targets.append(target)
+                if occupied >> target & 1:
+                    break
+        return targets
+
+    @staticmethod
+    def generateMoves(material, squares, sideToMove):
+        """
+        Generates the legal moves of a legal position.
+        :return: generator of (tuple of squares after the move, int index of the captured piece or None) tuples. The
+        squares still include the captured piece's entry, at the capturing piece's square
+        """
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        opponentKing = squares[1 - sideToMove]
+
+        for index in range(material.pieceCount):
+            if material.colors[index] != sideToMove:
+                continue
+            fromSquare = squares[index]
+            for target in Tablebase.getTargets(material.types[index], fromSquare, occupied):
+                capturedIndex = None
+                if occupied >> target & 1:
+                    capturedIndex = squares.index(target)
+                    if material.colors[capturedIndex] == sideToMove or target == opponentKing:
+                        continue
+
+                newSquares = squares[:index] + (target,) + squares[index + 1:]
+                newOccupied = occupied & ~(1 << fromSquare) | 1 << target
+                king = newSquares[sideToMove]
+                # A captured piece no longer attacks anything
+                if any(material.colors[other] != sideToMove and other != capturedIndex and
+                       Tablebase.attacks(material.types[other], newSquares[other], king, newOccupied)
+                       for other in range(material.pieceCount)):
+                    continue
+                yield newSquares, capturedIndex
+
+    @staticmethod
+    def generateUnmoves(material, squares, sideToMove):
+        """
+        Generates the positions from which the side that is not to move could have reached this position with a
+        move that did not capture. Pawnless pieces move the same way backwards as forwards.
+        :return: generator of tuples of squares, for positions with the other side to move
+        """
+        occupied = 0
+        for square in squares:
+            occupied |= 1 << square
+        mover = 1 - sideToMove
+
+        for index in range(material.pieceCount):
+            if material.colors[index] != mover:
+                continue
+            for origin in Tablebase.getTargets(material.types[index], squares[index], occupied):
+                if occupied >> origin & 1:
+                    continue
+                newSquares = squares[:index] + (origin,) + squares[index + 1:]
+                if Tablebase.isLegal(material, newSquares, mover):
+                    yield newSquares
+
+    def probeSquares(self, material, squares, sideToMove):
+        """
+        :param material: Material object, in either orientation
+        :param squares: tuple of the squares of a legal position, in material's order
+        :param sideToMove: int 0 for white, 1 for black
+        :return: int table value of the position (see the class description), or None if its table is missing
+        """
+        if material.pieceCount == 2:
+            return Tablebase.draw
+        if not material.isCanonical():
+            squares = material.flipPosition(squares)
+            sideToMove = 1 - sideToMove
+            material = material.flipped()
+
+        table = self.getTable(material.name)
+        if table is None:
+            return None
+        return table[Tablebase.getIndex(squares, sideToMove)]
+
+    def probe(self, chessBoard):
+        """
+        Looks up the position of a board.
+        :param chessBoard: ChessBoard or ChessBoardSim object
+        :return: tuple of (str "WIN", "LOSS" or "DRAW" for the player to move, int plies to mate, 0 for draws), or
+        None if the position is not covered by the available tables
+        """
+        pieceSets = [chessBoard.whitePieces, chessBoard.blackPieces]
+        if len(pieceSets[0].pieces) + len(pieceSets[1].pieces) > Tablebase.maxPieces:
+            return None
+
+        sides = []
+        for pieceSet in pieceSets:
+            side = {}
+            for piece in pieceSet.pieces:
+                if piece.name not in Tablebase.engineLetters:
+                    return None
+                side.setdefault(Tablebase.engineLetters[piece.name], []).append(piece.xIndex * 8 + piece.yIndex)
+            # Castling would allow moves the tables do not have
+            if pieceSet.king.unMoved and any(piece.name == "rook" and piece.unMoved for piece in pieceSet.pieces):
+                return None
+            sides.append(side)
+
+        material = Material("K" + "".join(letter * len(sides[0].get(letter, [])) for letter in Material.pieceOrder) +
+                            "vK" + "".join(letter * len(sides[1].get(letter, [])) for letter in Material.pieceOrder))
+        squares = [sides[0]["K"][0], sides[1]["K"][0]]
+        for side in sides:
+            for letter in Material.pieceOrder:
+                squares.extend(side.get(letter, []))
+
+        sideToMove = 0 if chessBoard.game.currentColor == "w_" else 1
+        value = self.probeSquares(material, tuple(squares), sideToMove)
+        if value is None or value == Tablebase.illegal:
+            return None
+        return Tablebase.describeValue(value)
+
+    @staticmethod
+    def describeValue(value):
+        """
+        :param value: int table value of a legal position
+        :return: tuple of (str "WIN", "LOSS" or "DRAW" for the player to move, int plies to mate, 0 for draws)
+        """
+        if value == Tablebase.draw:
+            return "DRAW", 0
+        plies = value - 1
+        return ("WIN" if plies % 2 else "LOSS"), plies
+
+    def generate(self, name, progress=None):
+        """
+        Generates the table of an ending, and first those of the endings its captures lead to if they are missing,
+        then writes it to the directory.
+
+        Every legal position's moves are generated once to count its non-capturing moves, and to score its captures
+        with the tables of the smaller endings. Starting from the checkmates, solved positions are then visited in
+        order of their distance to mate, each solving the positions that could have led to it: a position is won once
+        any move leads to a lost position, and lost once every move leads to a won one.
+        :param name: str ending name, e.g. "KQvKR"
+        :param progress: function called with a str message as generation progresses, or None
+        :return: None
+        """
+        material = Material(name)
+        if not material.isCanonical():
+            material = material.flipped()
+        if material.pieceCount > Tablebase.maxPieces:
+            raise Exception(f"Tablebases are limited to {Tablebase.maxPieces} pieces: {name}")
+
+        for subEnding in sorted(material.getSubEndings()):
+            if self.getTable(subEnding) is None:
+                self.generate(subEnding, progress)
+
+        subMaterials = {index: material.withoutPiece(index) for index in range(2, material.pieceCount)}
+        tableSize = Tablebase.getTableSize(material.pieceCount)
+        values = bytearray([Tablebase.illegal]) * tableSize
+        # Number of distinct positions that each position's non-capturing moves lead to which have not been solved as
+        # wins for the opponent yet. A count of cannotLose marks positions with a capture that wins or draws
+        cannotLose = 255
+        remainingMoves = bytearray(tableSize)
+        # Longest distance to mate, in plies, of captures that lose
+        captureLossPlies = bytearray(tableSize)
+        # Positions to visit by distance to mate in plies. Positions are solved when visited, unless already solved
+        levels = {}
+
+        for index in range(tableSize):
+            if progress and index % 1000000 == 0:
+                progress(f"{material.name}: scored {index}/{tableSize} positions")
+
+            squares, sideToMove = Tablebase.getPosition(index, material.pieceCount)
+            if not Tablebase.isLegal(material, squares, sideToMove) or \
+                    Tablebase.getIndex(squares, sideToMove) != index:
+                continue
+            values[index] = Tablebase.draw
+
+            children = set()
+            captureWinPlies = None
+            captureDraw = False
+            moveCount = 0
+            for newSquares, capturedIndex in Tablebase.generateMoves(material, squares, sideToMove):
+                moveCount += 1
+                if capturedIndex is None:
+                    children.add(Tablebase.getIndex(newSquares, 1 - sideToMove))
+                    continue
+
+                subSquares = newSquares[:capturedIndex] + newSquares[capturedIndex + 1:]
+                childValue = self.probeSquares(subMaterials[capturedIndex], subSquares, 1 - sideToMove)
+                result, plies = Tablebase.describeValue(childValue)
+                if result == "LOSS":
+                    captureWinPlies = plies + 1 if captureWinPlies is None else min(captureWinPlies, plies + 1)
+                elif result == "DRAW":
+                    captureDraw = True
+                else:
+                    captureLossPlies[index] = max(captureLossPlies[index], plies)
+
+            if not moveCount:
+                if Tablebase.isAttacked(material, squares, squares[sideToMove], 1 - sideToMove,
+                                        sum(1 << square for square in squares)):
+                    levels.setdefault(0, []).append(index)
+                # Stalemates stay draws
+                remainingMoves[index] = cannotLose
+            elif captureWinPlies is not None:
+                levels.setdefault(captureWinPlies, []).append(index)
+                remainingMoves[index] = cannotLose
+            elif captureDraw:
+                remainingMoves[index] = cannotLose
+            elif not children:
+                # Every move is a losing capture
+                levels.setdefault(captureLossPlies[index] + 1, []).append(index)
+            else:
+                remainingMoves[index] = len(children)
+
+        plies = 0
+        while levels:
+            for index in levels.pop(plies, []):
+                if values[index] != Tablebase.draw:
+                    continue
+                values[index] = plies + 1
+                squares, sideToMove = Tablebase.getPosition(index, material.pieceCount)
+
+                parents = {Tablebase.getIndex(parentSquares, 1 - sideToMove)
+                           for parentSquares in Tablebase.generateUnmoves(material, squares, sideToMove)}
+                for parent in parents:
+                    if values[parent] != Tablebase.draw:
+                        continue
+                    if plies % 2 == 0:
+                        # The position is lost for its side to move, so moving into it wins
+                        levels.setdefault(plies + 1, []).append(parent)
+                    elif remainingMoves[parent] != cannotLose:
+                        remainingMoves[parent] -= 1
+                        if remainingMoves[parent] == 0:
+                            levels.setdefault(max(plies, captureLossPlies[parent]) + 1, []).append(parent)
+
+            if progress and plies % 10 == 0:
+                progress(f"{material.name}: solved mates in {plies} plies")
+            plies += 1
+            if plies >= Tablebase.illegal - 1 and levels:
+                raise Exception(f"{material.name}: distances to mate do not fit in the table")
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{material.name}.tb")
+        with open(path, "wb") as tableFile:
+            tableFile.write(Tablebase.headerStruct.pack(Tablebase.magic, material.pieceCount, material.name.encode()))
+            tableFile.write(values)
+        self.tables.pop(material.name, None)
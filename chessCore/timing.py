@@ -0,0 +1,241 @@
+"""
+Measurement of named sections of code, for finding where the time goes. Measuring costs nothing until it is switched on:
+instead of timing calls left in the measured code, the functions of interest are wrapped with timers by instrument and
+put back by restore.
+"""
+import functools
+import math
+import time
+from collections import deque
+
+
+class RollingStats:
+    """
+    The most recent samples of a measurement, e.g. durations in seconds, with percentiles over them.
+    :var self.count: int number of samples ever added, including those that have since been dropped
+    :var self.total: float sum of every sample ever added
+    """
+    def __init__(self, maxSamples=1000):
+        """
+        :param maxSamples: int number of recent samples kept for percentiles
+        """
+        self.samples = deque(maxlen=maxSamples)
+        self.count = 0
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def getLatest(self):
+        return self.samples[-1] if self.samples else None
+
+    def getMean(self):
+        return self.total / self.count if self.count else None
+
+    def getPercentile(self, percent):
+        """
+        :param percent: float between 0 and 100
+        :return: the nearest-rank percentile of the kept samples, or None if there are none
+        """
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class Histogram:
+    """
+    Every sample of a duration, counted in buckets that double in width: the bucket of index i holds durations of
+    under 2 ** i microseconds (and at least half that). Unlike RollingStats nothing is dropped, at the cost of
+    percentiles only being known to within a factor of two.
+    :var self.count: int number of samples added
+    :var self.total: float sum of every sample added, in seconds
+    :var self.max: float largest sample added, in seconds
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, seconds):
+        bucket = int(seconds * 1e6).bit_length()
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def getMean(self):
+        return self.total / self.count if self.count else None
+
+    def getPercentile(self, percent):
+        """
+        :param percent: float between 0 and 100
+        :return: float upper bound in seconds of the bucket holding the percentile, or None if there are no samples
+        """
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(2 ** bucket / 1e6, self.max)
+
+    def format(self, barWidth=40):
+        """
+        :param barWidth: int characters of the bar of the fullest bucket
+        :return: list of str lines, one per bucket from the first to the last non-empty one
+        """
+        if not self.count:
+            return []
+        fullest = max(self.buckets.values())
+        lines = []
+        for bucket in range(min(self.buckets), max(self.buckets) + 1):
+            bucketCount = self.buckets.get(bucket, 0)
+            bar = "#" * math.ceil(bucketCount / fullest * barWidth)
+            lines.append(f"    < {formatMicroseconds(2 ** bucket):>8} {bucketCount:>9} {bar}")
+        return lines
+
+
+def formatMicroseconds(microseconds):
+    if microseconds >= 1e6:
+        return f"{microseconds / 1e6:g}s"
+    elif microseconds >= 1e3:
+        return f"{microseconds / 1e3:g}ms"
+    return f"{microseconds:g}us"
+
+
+class Timings:
+    """
+    Durations of named sections, in seconds.
+    """
+    def __init__(self, maxSamples=1000, histograms=False):
+        """
+        :param maxSamples: int number of recent durations of each section kept for percentiles
+        :param histograms: bool whether to keep every duration in a Histogram, e.g. to report on a whole game, rather
+        than the most recent ones in a RollingStats
+        """
+        self.maxSamples = maxSamples
+        self.histograms = histograms
+        self.stats = {}
+        # (object, attribute name, original attribute or None if it was not set on the object itself) of each
+        # instrumented function, in the order they were instrumented
+        self.instrumented = []
+
+    def add(self, name, seconds):
+        stats = self.stats.get(name)
+        if stats is None:
+            stats = self.stats[name] = Histogram() if self.histograms else RollingStats(self.maxSamples)
+        stats.add(seconds)
+
+    def get(self, name):
+        """
+        :return: RollingStats or Histogram object of the section, or None if it has not been measured yet
+        """
+        return self.stats.get(name)
+
+    def wrap(self, name, function):
+        """
+        :param name: str name of the section, or a function of the call's arguments returning it, e.g. to name the
+        section after the class of the object called on
+        :param function: function to time
+        :return: function that calls the given one, adding the time each call takes to the named section
+        """
+        @functools.wraps(function)
+        def timedFunction(*args, **kwargs):
+            startTime = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(name(*args, **kwargs) if callable(name) else name, time.perf_counter() - startTime)
+        return timedFunction
+
+    def instrument(self, obj, attrName, name=None):
+        """
+        Replaces a method with a timed one until restore is called. Instrumenting an instance times only that
+        instance's calls, instrumenting a class times the calls of all of its instances.
+        :param obj: object or class whose method to time
+        :param attrName: str name of the method
+        :param name: str name of the section, or a function returning it (see wrap), defaults to attrName
+        :return: None
+        """
+        original = obj.__dict__.get(attrName) if hasattr(obj, "__dict__") else None
+        # Instance attributes and functions found in a class's __dict__ are wrapped as they are, other methods are
+        # looked up to be wrapped bound to the instance
+        function = original if isinstance(obj, type) and original is not None else getattr(obj, attrName)
+        if isinstance(function, (staticmethod, classmethod)):
+            raise Exception(f"Cannot instrument the static or class method {attrName}")
+
+        setattr(obj, attrName, self.wrap(name or attrName, function))
+        self.instrumented.append((obj, attrName, original))
+
+    def getReport(self, names=None, showHistograms=True):
+        """
+        :param names: list of str names of the sections to report, in order. Defaults to all of them, slowest first
+        :param showHistograms: bool whether to include each Histogram's buckets
+        :return: str table of the call count, total, mean and percentiles of each section
+        """
+        if names is None:
+            names = sorted(self.stats, key=lambda sectionName: self.stats[sectionName].total, reverse=True)
+        lines = [f"{'Section':<48} {'Calls':>9} {'Total ms':>10} {'Mean us':>9} {'p50 us':>9} {'p99 us':>9}"]
+        for name in names:
+            stats = self.stats.get(name)
+            if not stats:
+                continue
+            lines.append(f"{name:<48} {stats.count:>9} {stats.total * 1e3:>10.1f} {stats.getMean() * 1e6:>9.1f} "
+                         f"{stats.getPercentile(50) * 1e6:>9.1f} {stats.getPercentile(99) * 1e6:>9.1f}")
+            if showHistograms and isinstance(stats, Histogram):
+                lines.extend(stats.format())
+        return "\n".join(lines)
+
+    def restore(self):
+        """
+        Undoes every instrument call, newest first.
+        :return: None
+        """
+        while self.instrumented:
+            obj, attrName, original = self.instrumented.pop()
+            if original is None:
+                delattr(obj, attrName)
+            else:
+                setattr(obj, attrName, original)
+
+
+# Methods of Game that a board's postMovementUpdates goes through after its setPieceMovesets, in order
+postMovementPhases = ["updateCheckStatus", "alternateCurrentColor", "currentlyInCheck", "verifyCheckBlockingMovesets",
+                      "preventKingCapture", "checkLegalMoveExists", "checkGameOver"]
+
+
+def instrumentPhases(timings, gameClass, boardClasses):
+    """
+    Times each board class's postMovementUpdates and every phase of it until timings.restore is called. Sections are
+    named after the class of the board, e.g. "ChessBoardSim.preventKingCapture", which tells the moves played on a
+    window's board apart from those the bot plays on simulations while searching.
+    :param timings: Timings object to add the durations to
+    :param gameClass: Game class, whose methods are the phases
+    :param boardClasses: list of the board classes to time, e.g. [ChessBoardSim]
+    :return: list of str section names, each board's postMovementUpdates followed by its phases in order
+    """
+    sectionNames = []
+    for boardClass in boardClasses:
+        for methodName in ["postMovementUpdates", "setPieceMovesets"]:
+            timings.instrument(boardClass, methodName, f"{boardClass.__name__}.{methodName}")
+        sectionNames += [f"{boardClass.__name__}.{methodName}"
+                         for methodName in ["postMovementUpdates", "setPieceMovesets"] + postMovementPhases]
+
+    def getSectionNamer(methodName):
+        return lambda game, *args, **kwargs: f"{type(game.chessBoard).__name__}.{methodName}"
+
+    # The Game class is shared by every board class, so its methods are only wrapped once
+    for methodName in postMovementPhases:
+        timings.instrument(gameClass, methodName, getSectionNamer(methodName))
+    return sectionNames
@@ -0,0 +1,134 @@
+"""
+Structured tracing of the engine and window, written as one JSON object per line for reading by scripts.
+
+Events belong to a category and have a level. Each category's attribute on Trace holds the lowest level traced for it,
+so that call sites can check whether to trace before building anything:
+
+    if Trace.movegen <= Trace.DEBUG:
+        Trace.emit("movegen", Trace.DEBUG, "getMoves", piece=self.pieceName, verified=self.verifiedMoveset)
+
+While tracing is off this costs one attribute lookup and comparison, with no formatting.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+
+class Trace:
+    """
+    Process-wide tracing switches and output. Events are JSON objects with the keys "time" (seconds since tracing
+    started), "level", "category" and "event", followed by the event's own fields.
+    """
+    DEBUG = 10
+    INFO = 20
+    ERROR = 40
+    # Higher than any level, i.e. nothing is traced
+    OFF = 100
+    levelNames = {DEBUG: "debug", INFO: "info", ERROR: "error"}
+
+    # movegen: move generation. check: check detection and legal move restriction. search: bot searches.
+    # render: window drawing. game: moves, promotions and turns
+    categories = ["movegen", "check", "search", "render", "game"]
+
+    # Lowest level traced per category, compared with at call sites
+    movegen = OFF
+    check = OFF
+    search = OFF
+    render = OFF
+    game = OFF
+
+    # Fraction of each category's events written, e.g. 0.01 to trace long games at little cost
+    sampleRates = {}
+    outFile = None
+    ownsFile = False
+    startTime = None
+    # Separate from the random module, which the engine's random moves use, so that sampling does not change games
+    sampler = random.Random()
+    lock = threading.Lock()
+
+    @classmethod
+    def start(cls, out, categories=None, level=INFO, sampleRate=1.0, seed=None):
+        """
+        :param out: str path of the JSONL file to write, or a file object
+        :param categories: list of str categories to trace, defaults to all of them
+        :param level: int lowest level traced, e.g. Trace.DEBUG
+        :param sampleRate: float fraction of events written, or dict of category to fraction
+        :param seed: seed of the sampling, for reproducible traces
+        :return: None
+        """
+        cls.stop()
+        for category in categories or cls.categories:
+            if category not in cls.categories:
+                raise Exception(f"Unknown trace category {category}, expected one of {cls.categories}")
+            setattr(cls, category, level)
+
+        if isinstance(sampleRate, dict):
+            cls.sampleRates = dict(sampleRate)
+        else:
+            cls.sampleRates = dict.fromkeys(cls.categories, sampleRate)
+        cls.sampler.seed(seed)
+
+        cls.ownsFile = isinstance(out, (str, os.PathLike))
+        cls.outFile = open(out, "w") if cls.ownsFile else out
+        cls.startTime = time.perf_counter()
+
+    @classmethod
+    def stop(cls):
+        for category in cls.categories:
+            setattr(cls, category, cls.OFF)
+        if cls.outFile:
+            if cls.ownsFile:
+                cls.outFile.close()
+            else:
+                cls.outFile.flush()
+        cls.outFile = None
+
+    @classmethod
+    def emit(cls, category, level, event, **fields):
+        """
+        Writes an event, subject to sampling. Callers check the category's level first, see the module docstring.
+        :param category: str category of the event
+        :param level: int level of the event
+        :param event: str name of the event
+        :param fields: values of the event. Values that JSON cannot represent are written with str
+        :return: None
+        """
+        if cls.outFile is None or level < getattr(cls, category):
+            return
+        sampleRate = cls.sampleRates.get(category, 1.0)
+        if sampleRate < 1.0 and cls.sampler.random() >= sampleRate:
+            return
+
+        record = {"time": round(time.perf_counter() - cls.startTime, 6), "level": cls.levelNames.get(level, level),
+                  "category": category, "event": event}
+        record.update(fields)
+        line = json.dumps(record, default=str)
+        # Bots search on their own threads
+        with cls.lock:
+            cls.outFile.write(line + "\n")
+
+    @staticmethod
+    def addArguments(parser):
+        """
+        Adds the --trace options to an argparse parser, read back by startFromArguments.
+        :param parser: argparse.ArgumentParser object
+        :return: None
+        """
+        parser.add_argument("--trace", default=None, help="JSONL file to write trace events to")
+        parser.add_argument("--trace-categories", nargs="*", default=None, choices=Trace.categories,
+                            help="categories to trace (default all)")
+        parser.add_argument("--trace-level", default="info", choices=list(Trace.levelNames.values()))
+        parser.add_argument("--trace-sample", type=float, default=1.0, help="fraction of events written")
+
+    @classmethod
+    def startFromArguments(cls, args):
+        """
+        :param args: argparse.Namespace parsed with the options of addArguments
+        :return: None
+        """
+        if args.trace:
+            levels = {name: level for level, name in cls.levelNames.items()}
+            cls.start(args.trace, args.trace_categories, levels[args.trace_level], args.trace_sample,
+                      getattr(args, "seed", None))
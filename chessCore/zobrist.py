@@ -0,0 +1,107 @@
+from random import Random
+
+
+def generateKeyTable(random):
+    """
+    Generates an 8x8 table of random 64-bit keys, indexed the same way as ChessBoard.board.
+    :param random: Random object to draw keys from
+    :return: list of lists of int
+    """
+    return [[random.getrandbits(64) for y in range(8)] for x in range(8)]
+
+
+class Zobrist:
+    """
+    Zobrist hashing for chess positions. Each (color, piece, tile) combination is assigned a random 64-bit key and a
+    position's hash is the XOR of the keys of every piece on the board. Since XOR is its own inverse, a move only needs
+    to XOR out the piece's old key and XOR in its new one, so hashes are updated incrementally rather than recomputed.
+
+    Castling rights are hashed through the unMoved flag of kings and rooks, and the side to move through a single key
+    that is XOR'd in whenever black is to move. En passant rights are hashed through a key per file, only while a pawn
+    of the player to move stands next to the pawn that just double stepped, i.e. while the capture is possible.
+
+    Keys are generated from a fixed seed so that the same position hashes identically across runs and processes.
+    :var pieceKeys: dict of (colorPrefix, pieceName) to an 8x8 list of keys, indexed the same way as ChessBoard.board
+    :var unMovedKeys: 8x8 list of keys for kings/rooks that have not moved yet
+    :var blackToMoveKey: int key XOR'd in while black is the current color
+    :var enPassantKeys: list of 8 keys, indexed by the x index of the file en passant can capture on
+    """
+    seed = 174
+    pieceNames = ["pawn", "knight", "bishop", "rook", "queen", "king"]
+    colorPrefixes = ["w_", "b_"]
+
+    random = Random(seed)
+    pieceKeys = {}
+    for colorPrefix in colorPrefixes:
+        for pieceName in pieceNames:
+            pieceKeys[(colorPrefix, pieceName)] = generateKeyTable(random)
+    unMovedKeys = generateKeyTable(random)
+    blackToMoveKey = random.getrandbits(64)
+    # Drawn after the other keys so that those stay the same as before en passant was hashed
+    # (a loop, since a comprehension in a class body can't see the class's random)
+    enPassantKeys = []
+    for x in range(8):
+        enPassantKeys.append(random.getrandbits(64))
+    del colorPrefix, pieceName, x
+
+    @staticmethod
+    def pieceKey(piece):
+        """
+        Gets the key of the given piece on its current tile.
+        :param piece: ChessPiece (or simulation equivalent) object
+        :return: int key
+        """
+        return Zobrist.pieceKeys[(piece.colorPrefix, piece.name)][piece.xIndex][piece.yIndex]
+
+    @staticmethod
+    def unMovedKey(piece):
+        """
+        Gets the castling rights key of the given piece. Only unmoved kings and rooks affect castling, so all other
+        pieces return 0 (which leaves a hash unchanged when XOR'd).
+        :param piece: ChessPiece (or simulation equivalent) object
+        :return: int key
+        """
+        if piece.unMoved and piece.name in ["king", "rook"]:
+            return Zobrist.unMovedKeys[piece.xIndex][piece.yIndex]
+        return 0
+
+    @staticmethod
+    def enPassantKey(chessBoard, doublestepPawn, currentColor):
+        """
+        Gets the en passant key of a position. Without a pawn of the player to move next to the double stepped pawn the
+        right to capture it makes no difference, so positions that only differ in it hash the same.
+        :param chessBoard: ChessBoard (or simulation equivalent) object
+        :param doublestepPawn: ChessPiece object of the pawn that double stepped in the previous turn, or False
+        :param currentColor: str color prefix of the player to move
+        :return: int key, 0 if en passant is not possible
+        """
+        if not doublestepPawn:
+            return 0
+
+        for adjacentX in [doublestepPawn.xIndex - 1, doublestepPawn.xIndex + 1]:
+            if 0 <= adjacentX < 8:
+                adjacentPiece = chessBoard.board[adjacentX][doublestepPawn.yIndex].currentPiece
+                if adjacentPiece and adjacentPiece.name == "pawn" and adjacentPiece.colorPrefix == currentColor:
+                    return Zobrist.enPassantKeys[doublestepPawn.xIndex]
+        return 0
+
+    @staticmethod
+    def hashBoard(chessBoard, currentColor):
+        """
+        Computes the full hash of a board from scratch. Used to initialize a game's hash, after which it is updated
+        incrementally by the Game object.
+        :param chessBoard: ChessBoard (or simulation equivalent) object
+        :param currentColor: str color prefix of the player to move
+        :return: int hash of the position
+        """
+        positionHash = 0
+
+        for pieceSet in [chessBoard.blackPieces, chessBoard.whitePieces]:
+            for piece in pieceSet.pieces:
+                positionHash ^= Zobrist.pieceKey(piece) ^ Zobrist.unMovedKey(piece)
+
+        if currentColor == "b_":
+            positionHash ^= Zobrist.blackToMoveKey
+        positionHash ^= Zobrist.enPassantKey(chessBoard, chessBoard.game.recentDoublestep, currentColor)
+
+        return positionHash
@@ -3,21 +3,39 @@ TODO: bug list
     1. Create minimax algorithm
     2. Create a more generalized getMove, that can take player vs player, bot vs player, etc.
 """
-import pygame
-from chessGame import Game
-from chessGame import MoveSet
+import argparse
+import math
 
-from ChessBrain import ChessBrain
+import pygame
+from chessCore.chessGame import Game
+from chessCore.chessGame import MoveSet
+from chessCore.boardState import BoardState
+from chessCore.fen import Fen
+from chessCore.pgn import GameRecord, Pgn
+from chessCore.timing import RollingStats, Timings, instrumentPhases
+from chessCore.tracing import Trace
 
 # deleteme
 import time
 
+# Posted by a bot's search thread when its move is ready, waking the window if it is waiting for events
+botMoveEvent = pygame.event.custom_type()
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Play chess against the bot.")
+    parser.add_argument("--profile-phases", action="store_true",
+                        help="time each phase of the board updates after a move, reported when the game ends")
+    Trace.addArguments(parser)
+    args = parser.parse_args()
+    Trace.startFromArguments(args)
+
     pygame.init()
     surface = pygame.display.set_mode((1350, 800))
     pygame.display.set_caption("Chess")
-    a = ChessWindow(surface)
+    a = ChessWindow(surface, args.profile_phases)
     a.play()
+    Trace.stop()
 
 
 def alternator(current, optionsList):
@@ -33,6 +51,14 @@ def alternator(current, optionsList):
             return option
 
 
+def formatMs(seconds):
+    """
+    :param seconds: float, or None if there is nothing to show
+    :return: str of the time in milliseconds
+    """
+    return "-" if seconds is None else f"{seconds * 1000:.2f}ms"
+
+
 class Player:
     chessBoard = None
     currentPlayer = None
@@ -53,24 +79,61 @@ class Player:
         self.pieceSet = pieceSet
 
         if isBot:
+            # The engine is only imported once a bot is needed, so human-only games do not pay for it at startup
+            from chessCore.ChessBrain import ChessBrain
+            from botWorker import BotWorker
+
             self.getMoveMethod = Player.chessBoard.getBotMove
             # deleteme
             # DeepCopy.setChessPieceClass(ChessPiece)
             # DeepCopy.setMoveSetClass(MoveSet)
             self.brain = ChessBrain(Player.chessBoard, pieceSet)
+            self.worker = BotWorker(self.brain, Player.postBotMoveEvent)
         else:
             self.getMoveMethod = Player.chessBoard.handleHumanClick
 
     def getMove(self, event):
+        """
+        Humans move in reaction to the given event. Bots search on a background thread: the first call starts the
+        search and subsequent calls (once per frame) poll for its result, only then applying the move.
+        :param event: pygame event to react to, or None for bots
+        :return: bool of whether a bot move/promotion was applied during this call
+        """
         if self.isBot:
             if self.chessBoard.promotionBoard:
-                self.getMoveMethod(self.brain.getMove(), self.getPromotionSelection())
-            else:
-                self.getMoveMethod(self.brain.getMove())
+                # Promotion selection requires no search so it is applied immediately
+                self.getMoveMethod(None, self.getPromotionSelection())
+                return True
+
+            self.worker.requestMove()
+            move = self.worker.pollMove()
+            if move:
+                self.getMoveMethod(move)
+                return True
 
         elif not self.isBot and event.type == pygame.MOUSEBUTTONUP:
             self.getMoveMethod(pygame.mouse.get_pos())
 
+        return False
+
+    @staticmethod
+    def postBotMoveEvent():
+        pygame.event.post(pygame.event.Event(botMoveEvent))
+
+    def isWaitingForSearch(self):
+        """
+        :return: bool whether the bot is searching, in which case a botMoveEvent will be posted once it is done
+        """
+        return self.isBot and self.worker.isThinking()
+
+    def stopThinking(self):
+        """
+        Cancels any search in progress. Called when the game ends or the window closes.
+        :return: None
+        """
+        if self.isBot:
+            self.worker.cancel()
+
     def getPromotionSelection(self):
         assert self.isBot, "Promotion selection method call for bot called on non-bot player"
 
@@ -78,18 +141,42 @@ class Player:
 
 
 class ChessWindow:
-    def __init__(self, surface):
+    def __init__(self, surface, profilePhases=False):
+        """
+        :param surface: pygame.Surface of the window
+        :param profilePhases: bool whether to time each phase of postMovementUpdates, on the window's board and on the
+        bots' simulations, and report them when the game ends
+        """
         self.surface = surface
         self.close = False
         self.fps = 60
         self.clock = pygame.time.Clock()
-        self.backgroundColor = pygame.Color("black")
+
+        # Longest time in ms to wait for an event while nothing is happening
+        self.idleTimeout = 1000
+        # Seconds taken by the most recent frames that drew something, from waking up to the display update
+        self.frameTimes = RollingStats(10000)
+        self.frameStart = time.perf_counter()
+        # Wall and CPU seconds spent waiting for events while no bot was thinking
+        self.idleWallTime = 0
+        self.idleCpuTime = 0
+
+        # HudOverlay object while the timing overlay is shown (toggled with F3), otherwise None
+        self.hud = None
 
         # Board specific attribute
         self.boardMargin = 0.15   # Percent height a single margin takes up
         self.chessBoard = None
         self.createBoard()
 
+        # Timings of the phases of postMovementUpdates and their section names in order, None unless profiling
+        self.phaseTimings = None
+        self.phaseNames = None
+        if profilePhases:
+            from chessCore.chessboardBot import ChessBoardSim
+            self.phaseTimings = Timings(histograms=True)
+            self.phaseNames = instrumentPhases(self.phaseTimings, Game, [ChessBoard, ChessBoardSim])
+
         # Set whether each player is a human or a bot
         Player.setChessBoard(self.chessBoard)
         Player.currentPlayer = "w_"
@@ -112,45 +199,225 @@ class ChessWindow:
 
     def play(self):
         """
-        Main loop. Runs infinitely until the user closes the window.
+        Main loop. Runs infinitely until the user closes the window. While nothing is happening (a human is to move or a
+        bot is thinking) the loop sleeps until an event arrives, and frames are only drawn when something changed.
         :return: None
         """
         while not self.close:
             self.handleEvents()
-            self.draw()
+            if self.draw():
+                self.frameTimes.add(time.perf_counter() - self.frameStart)
 
             self.clock.tick(self.fps)
 
-    def handleEvents(self):
+        self.stopBots()
+        self.setHudShown(False)
+        self.reportPhases()
+        self.printFrameStats()
+
+    def reportPhases(self):
         """
-        Handles all user-generated events, i.e. clicking.
+        Prints the phase timings and stops timing. Called once, when the game ends or the window closes.
         :return: None
         """
-        # bots move independently of pygame events so it is called outside of event loop
-        if self.players[Player.currentPlayer].isBot and \
-                (time.time() - self.turnStartTime) > self.botDelay and \
-                not self.chessBoard.gameOver:
-            # reset timer to induce artificial delay
-            self.turnStartTime = time.time()
-            self.players[Player.currentPlayer].getMove(None)
+        if self.phaseTimings:
+            print(self.phaseTimings.getReport(self.phaseNames))
+            self.phaseTimings.restore()
+            self.phaseTimings = None
+
+    def printFrameStats(self):
+        if len(self.frameTimes) < 2:
+            return
+        print(f"Frames drawn: {self.frameTimes.count}  Median frame: {self.frameTimes.getPercentile(50) * 1000:.2f}ms  "
+              f"p99 frame: {self.frameTimes.getPercentile(99) * 1000:.2f}ms")
+        if self.idleWallTime:
+            print(f"Idle CPU: {self.idleCpuTime / self.idleWallTime * 100:.1f}% over {self.idleWallTime:.1f}s")
+
+    def stopBots(self):
+        for player in self.players.values():
+            player.stopThinking()
+
+    def setHudShown(self, shown):
+        """
+        Shows or hides the timing overlay. The timers it reads are only installed while it is shown.
+        :param shown: bool
+        :return: None
+        """
+        if shown and not self.hud:
+            self.hud = HudOverlay(self)
+        elif not shown and self.hud:
+            self.hud.close()
+            # Uncover the board beneath it
+            self.chessBoard.needsFullRedraw = True
+            self.hud = None
 
-        for event in pygame.event.get():
+    def handleEvents(self):
+        """
+        Handles all user-generated events, i.e. clicking, waiting for them if there is nothing else to do.
+        :return: None
+        """
+        for event in self.getEvents():
             if event.type == pygame.QUIT:
                 self.close = True
+            elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                # The window's contents were lost, e.g. it was restored after being minimized
+                self.chessBoard.needsFullRedraw = True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.setHudShown(not self.hud)
 
             # Handle human players
             if not self.players[Player.currentPlayer].isBot and \
                     not self.chessBoard.gameOver:
                 self.players[Player.currentPlayer].getMove(event)
 
+        # bots move independently of pygame events so it is called outside of event loop. The bot's search runs on
+        # a separate thread, so this only starts the search or collects its finished result without blocking the frame
+        if self.players[Player.currentPlayer].isBot and \
+                (time.time() - self.turnStartTime) > self.botDelay and \
+                not self.chessBoard.gameOver:
+            if self.players[Player.currentPlayer].getMove(None):
+                # reset timer to induce artificial delay
+                self.turnStartTime = time.time()
+
+        if self.chessBoard.gameOver:
+            self.stopBots()
+            self.reportPhases()
+
+    def getEvents(self):
+        """
+        Waits for events if the next frame has nothing to do otherwise, e.g. while a human is deciding on their move or a
+        bot is thinking. A bot's finished search posts an event, so its move is applied as soon as it is ready.
+        :return: list of pygame events
+        """
+        timeout = self.getIdleTimeout()
+        if not timeout:
+            self.frameStart = time.perf_counter()
+            return pygame.event.get()
+
+        botThinking = self.players[Player.currentPlayer].isWaitingForSearch()
+        waitStart = time.perf_counter()
+        cpuStart = time.process_time()
+        event = pygame.event.wait(timeout)
+        self.frameStart = time.perf_counter()
+        if not botThinking:
+            self.idleWallTime += self.frameStart - waitStart
+            self.idleCpuTime += time.process_time() - cpuStart
+
+        events = [event] if event.type != pygame.NOEVENT else []
+        return events + pygame.event.get()
+
+    def getIdleTimeout(self):
+        """
+        :return: int ms to wait for an event before the next frame, 0 if the next frame has work to do regardless
+        """
+        currentPlayer = self.players[Player.currentPlayer]
+        if self.chessBoard.gameOver or not currentPlayer.isBot or currentPlayer.isWaitingForSearch():
+            return self.idleTimeout
+
+        # A bot is to move: wait out the delay before its turn, if any, then start its search or collect its move
+        delay = self.botDelay - (time.time() - self.turnStartTime)
+        if delay > 0:
+            return min(self.idleTimeout, math.ceil(delay * 1000))
+        return 0
+
     def draw(self):
         """
-        Main drawing method, calls other objects' drawing methods to generate a visual representation.
-        :return: None
+        Main drawing method, calls other objects' drawing methods to generate a visual representation. Only the regions
+        of the window that changed since the last frame are redrawn and updated on the display.
+        :return: bool whether anything was drawn
+        """
+        dirtyRects = self.chessBoard.getDirtyRects()
+        if self.hud and self.hud.isOutdated():
+            dirtyRects.append(self.hud.rect)
+        if not dirtyRects:
+            return False
+
+        updatedRects = self.chessBoard.draw(dirtyRects)
+        if self.hud and self.hud.rect.collidelist(dirtyRects) != -1:
+            self.hud.draw()
+            updatedRects.append(self.hud.rect)
+        pygame.display.update(updatedRects)
+
+        if Trace.render <= Trace.DEBUG:
+            Trace.emit("render", Trace.DEBUG, "frame", rects=[tuple(rect) for rect in updatedRects],
+                       ms=round((time.perf_counter() - self.frameStart) * 1000, 3))
+        return True
+
+
+class HudOverlay:
+    """
+    Overlay in the top right corner of the window showing where the time goes during play: frame times, the last bot
+    search and the time spent updating the board after each move. It only exists while shown, and the timers it reads
+    are installed when it is created and removed by close, so play is not slowed down when it is hidden.
+    """
+    # Seconds between refreshes of the shown values. Refreshing on every frame would itself draw a frame every time
+    refreshInterval = 0.5
+
+    def __init__(self, window):
+        """
+        :param window: ChessWindow object to show the timings of
+        """
+        self.window = window
+        self.surface = window.surface
+        self.rect = pygame.Rect(self.surface.get_width() - 360, 10, 350, 100)
+        self.backgroundColor = pygame.Color(30, 30, 30)
+        self.textColor = pygame.Color(120, 255, 120)
+        self.textFont = pygame.font.SysFont("arial", 16)
+        self.lastRefresh = None
+
+        self.timings = Timings()
+        self.timings.instrument(window.chessBoard, "postMovementUpdates")
+        for colorPrefix, player in window.players.items():
+            if player.isBot:
+                self.timings.instrument(player.brain, "getMove", "botMove" + colorPrefix)
+
+    def close(self):
+        self.timings.restore()
+
+    def isOutdated(self):
+        return self.lastRefresh is None or time.perf_counter() - self.lastRefresh > HudOverlay.refreshInterval
+
+    def getLastSearch(self):
+        """
+        :return: tuple of (ChessBrain object, float seconds) of the most recently finished bot search, or (None, None)
         """
-        self.surface.fill(self.backgroundColor)
-        self.chessBoard.draw()
-        pygame.display.update()
+        opponentColor = "b_" if Player.currentPlayer == "w_" else "w_"
+        for colorPrefix in [opponentColor, Player.currentPlayer]:
+            player = self.window.players[colorPrefix]
+            searchTimes = self.timings.get("botMove" + colorPrefix)
+            # A searching brain's node count is of the search in progress
+            if player.isBot and searchTimes and not player.isWaitingForSearch():
+                return player.brain, searchTimes.getLatest()
+        return None, None
+
+    def getLines(self):
+        frameTimes = self.window.frameTimes
+        lines = ["Frame  p50 {}  p95 {}  p99 {}".format(*(formatMs(frameTimes.getPercentile(percent))
+                                                           for percent in (50, 95, 99)))]
+
+        brain, searchTime = self.getLastSearch()
+        if brain:
+            searchStats = brain.searchStats
+            lines.append(f"Bot move  {formatMs(searchTime)}  ({searchStats.engine})")
+            if searchStats.nodes:
+                lines.append(f"Depth {max(len(searchStats.nodesPerDepth) - 1, 0)}  Nodes {searchStats.nodes}  "
+                             f"({searchStats.getNodesPerSecond() or 0:,.0f}/s)")
+        else:
+            lines.append("Bot move  -")
+
+        updateTimes = self.timings.get("postMovementUpdates")
+        lines.append(f"postMovementUpdates  last {formatMs(updateTimes and updateTimes.getLatest())}  "
+                     f"p95 {formatMs(updateTimes and updateTimes.getPercentile(95))}")
+        return lines
+
+    def draw(self):
+        self.lastRefresh = time.perf_counter()
+        pygame.draw.rect(self.surface, self.backgroundColor, self.rect)
+        y = self.rect.y + 5
+        for line in self.getLines():
+            textSurface = self.textFont.render(line, True, self.textColor)
+            self.surface.blit(textSurface, (self.rect.x + 8, y))
+            y += textSurface.get_height() + 2
 
 
 class PromotionDisplay:
@@ -184,6 +451,7 @@ class PromotionDisplay:
         self.textSurface = self.textFont.render("Select a piece to promote to", False, (0, 0, 0))
 
         self.windowBackground = pygame.Rect(self.x, self.y, self.width, self.height)
+        self.rect = self.windowBackground
         self.promotionOptionList = []
         self.initPromotionOptions()
 
@@ -199,6 +467,7 @@ class PromotionDisplay:
 
         for optionIndex in range(len(strOptions)):
             tile = Tile(x * optionIndex + padding + self.x, y + self.y, pygame.Color(255, 255, 255))
+            # The option pieces share their images with the board's pieces, so opening this display loads nothing
             tile.currentPiece = ChessPiece(strOptions[optionIndex],
                                            PromotionDisplay.promotedPieceID,
                                            f"{self.colorDirectory}/{self.colorPrefix}{strOptions[optionIndex]}.png",
@@ -273,6 +542,12 @@ class CapturedPiecesMargin:
         self.rect = None
         self.backgroundColor = None
 
+        # Number of pieces in each row when the margin was last drawn, see ChessBoard.getDirtyRects
+        self.drawnState = None
+
+    def getDrawState(self):
+        return tuple(len(row) for row in self.capturedPieces)
+
     def setBackground(self, pygameColor):
         self.rect = pygame.Rect(0, self.row1Top, CapturedPiecesMargin.surface.get_width(), self.height)
         self.backgroundColor = pygameColor
@@ -288,10 +563,17 @@ class CapturedPiecesMargin:
 
         # Verify that chess image will not exceed height of a single row. Otherwise changes height and width to height
         if chessPieceObj.image.get_height() > (self.height / 2):
-            chessPieceObj.image = pygame.transform.scale(chessPieceObj.image, (self.rowHeight, self.rowHeight))
+            chessPieceObj.image = SpriteAtlas.getScaledSprite(chessPieceObj.image, int(self.rowHeight))
+
+    def drawBackground(self, surface):
+        pygame.draw.rect(surface, self.backgroundColor, self.rect)
 
     def draw(self):
-        pygame.draw.rect(CapturedPiecesMargin.surface, self.backgroundColor, self.rect)
+        """
+        Draws the captured pieces. The margin's background is part of the board's background layer.
+        :return: None
+        """
+        self.drawnState = self.getDrawState()
         for rowIndex in range(len(self.capturedPieces)):
             for colIndex in range(len(self.capturedPieces[rowIndex])):
                 pieceImage = self.capturedPieces[rowIndex][colIndex].image
@@ -314,6 +596,7 @@ class ChessBoard:
         self.top = top
         self.bottom = bottom
         self.size = (surface.get_width(), self.bottom - self.top)
+        self.backgroundColor = pygame.Color("black")
 
         # Tile specific attributes/methods
         self.board = []
@@ -325,17 +608,25 @@ class ChessBoard:
         self.blackPieces = None
         self.createPieces()
 
+        # Pre-rendered checkerboard and margins, which never change
+        self.background = None
+        self.createBackground()
+
         # Promotion board specific attributes/methods
         self.promotionBoard = None
 
         # Game flow specific attributes/methods
         self.game = Game(self)
+        self.game.initPositionHash()
         self.setPieceMovesets()
         self.recentMoveTiles = []
+        self.gameRecord = GameRecord()
 
-        # deleteme
-        self.testerImage = pygame.image.load("tester-img.png")
-        self.testerImage = pygame.transform.scale(self.testerImage, (30, 30))
+        # Change tracking for drawing, see getDirtyRects. The first frame draws the whole window
+        self.needsFullRedraw = True
+        self.drawnPromotionBoard = None
+        self.drawnGameOver = False
+        self.gameOverSurface = None
 
     def createPieces(self):
         blackPiecePrefix = "b_"
@@ -371,27 +662,52 @@ class ChessBoard:
             currentColor = alternator(currentColor, tileColorList)     # This is required to create the checker pattern
             self.board.append(row)
 
-    def dispGameOver(self):
-        textFont = pygame.font.SysFont("arial", 50)
-        textSurface = textFont.render(self.gameOver, False, (250, 140, 255))
+    def createBackground(self):
+        """
+        Renders the parts of the window that never change, the checkerboard and the margins' backgrounds, onto a
+        surface. Drawing then copies regions of it back instead of redrawing every tile.
+        :return: None
+        """
+        self.background = pygame.Surface(self.surface.get_size(), 0, self.surface)
+        self.background.fill(self.backgroundColor)
+        for row in self.board:
+            for tile in row:
+                pygame.draw.rect(self.background, tile.baseColor, tile.rect)
+        for pieceSet in [self.blackPieces, self.whitePieces]:
+            pieceSet.capturedPiecesMargin.drawBackground(self.background)
+
+    def getGameOverRect(self):
+        """
+        Renders the game over message the first time it is needed.
+        :return: pygame.Rect of the message, centered on the window
+        """
+        if self.gameOverSurface is None:
+            textFont = pygame.font.SysFont("arial", 50)
+            self.gameOverSurface = textFont.render(self.gameOver, False, (250, 140, 255))
+        return self.gameOverSurface.get_rect(center=self.surface.get_rect().center)
 
-        x = self.surface.get_width() / 2 - (textSurface.get_width() / 2)
-        y = self.surface.get_height() / 2 - (textSurface.get_height() / 2)
-        self.surface.blit(textSurface, (x, y))
+    def dispGameOver(self):
+        self.surface.blit(self.gameOverSurface, self.getGameOverRect())
 
     def getBotMove(self, pieceInfoTuple, promotionSelection = None):
-        piece = pieceInfoTuple[0]
-        rowNum = pieceInfoTuple[1]
-        colNum = pieceInfoTuple[2]
-
+        """
+        Applies a bot's move, or its promotion selection if the promotion board is open.
+        :param pieceInfoTuple: tuple of the ChessPiece to move and the row/col indices to move it to. Ignored (may be
+        None) while the promotion board is open
+        :param promotionSelection: int index of the promotion option chosen by the bot
+        :return: None
+        """
         if not self.gameOver:
             if self.promotionBoard:
                 self.promotionBoard.getBotPromotionSelection(promotionSelection)
+                self.game.rehashPosition()
 
                 self.promotionBoard = None
                 self.postMovementUpdates()
 
             else:
+                piece, rowNum, colNum = pieceInfoTuple
+
                 self.toggleClickAttributes(self.board[piece.xIndex][piece.yIndex])
                 self.currentlyClicked.currentPiece.moveset.setTileValidMove(True)
 
@@ -408,6 +724,7 @@ class ChessBoard:
                     # leftoff here. debug the chess game itself using the two bots' randomized moves. there is a weird
                     #   assertion error
                     # TODO: testing player turn changing
+                    self.game.rehashPosition()
                     self.promotionBoard = None
                     self.postMovementUpdates()
 
@@ -449,7 +766,12 @@ class ChessBoard:
         :param colNum: int index of the tile's col
         :return: None
         """
-        print(f"\n\n============={self.currentlyClicked.currentPiece.name} has moved")  # Diagnostic
+        if Trace.game <= Trace.INFO:
+            piece = self.currentlyClicked.currentPiece
+            Trace.emit("game", Trace.INFO, "move", piece=piece.colorPrefix + piece.name,
+                       fromPos=(piece.xIndex, piece.yIndex), toPos=(rowNum, colNum))
+
+        self.gameRecord.startMove(self, self.currentlyClicked.currentPiece, (rowNum, colNum))
 
         # If the valid new tile contains an opposing piece, capture it
         if tile.currentPiece:
@@ -494,6 +816,17 @@ class ChessBoard:
             self.game.alternateCurrentColor()
             Player.changeTurn()
 
+        self.restrictLegalMoves()
+
+        if not self.promotionBoard:
+            self.gameRecord.finishMove(self)
+
+    def restrictLegalMoves(self):
+        """
+        Restricts the current player's movesets to moves that are legal w.r.t. check, then decides whether the game has
+        ended. Expects every piece's moveset to have been generated and the check status to be up to date.
+        :return: None
+        """
         # Check immediately after turn change whether a check has occurred
         if self.game.inCheck[self.game.currentColor]:
             # Force a sacrifice or a king movement if the king is in check
@@ -512,6 +845,77 @@ class ChessBoard:
         # Check whether the game has ended (stalemate / checkmate)
         self.gameOver = self.game.checkGameOver()
 
+    def getState(self):
+        return BoardState.fromBoard(self)
+
+    def toBytes(self):
+        """
+        Creates a compact binary snapshot of the game. See BoardState for the format.
+        :return: bytes
+        """
+        return self.getState().toBytes()
+
+    def loadBytes(self, data):
+        """
+        Replaces the current game with the one stored in a binary snapshot created by toBytes.
+        :param data: bytes of the snapshot
+        :return: None
+        """
+        self.loadState(BoardState.fromBytes(data))
+
+    def toFen(self):
+        return Fen.fromState(self.getState())
+
+    def loadFen(self, fenStr):
+        """
+        Replaces the current game with the position described by the FEN string.
+        :param fenStr: str in FEN
+        :return: None
+        """
+        self.loadState(Fen.toState(fenStr))
+
+    def loadState(self, state):
+        """
+        Replaces the current game with the given state. Pieces and tiles are rebuilt directly rather than by replaying
+        moves. Captured pieces are not part of the state, so the captured piece margins are emptied.
+        :param state: BoardState object
+        :return: None
+        """
+        for row in self.board:
+            for tile in row:
+                if tile.clicked:
+                    tile.toggleClickColor()
+                    tile.clicked = False
+                tile.currentPiece = None
+                tile.validMove = False
+                tile.recentMove = False
+
+        self.recentMoveTiles = []
+        self.currentlyClicked = None
+        self.promotionBoard = None
+        self.needsFullRedraw = True
+        self.gameOverSurface = None
+
+        for pieceSet in [self.blackPieces, self.whitePieces]:
+            pieceSet.initPiecesFromState(state)
+
+        self.game = Game(self)
+        self.game.loadState(state)
+        Player.currentPlayer = self.game.currentColor
+
+        self.setPieceMovesets()
+        self.game.findCheckingPieces(self.getPieceSet(self.game.opponentColor),
+                                     self.getPieceSet(self.game.currentColor).king)
+        self.restrictLegalMoves()
+        self.gameRecord = GameRecord(self.toFen())
+
+    def toPgn(self, headers):
+        """
+        :param headers: dict of PGN tag names to values
+        :return: str PGN record of the moves played since the game started (or was last loaded)
+        """
+        return Pgn.formatGame(headers, self.gameRecord.sanList, Pgn.getResult(self), self.gameRecord.startingFen)
+
     def toggleTileRecentMove(self, tileList):
         """
         Sets the current recentMoveTiles' recentMove to false and clears the attribute. Then appends the provided
@@ -555,34 +959,74 @@ class ChessBoard:
         tile.clicked = not tile.clicked
 
     def checkPromotion(self, movedPawn):
-        print(movedPawn.yIndex)
         if (movedPawn.colorPrefix == "b_" and movedPawn.yIndex == 7) or \
                 (movedPawn.colorPrefix == "w_" and movedPawn.yIndex == 0):
             self.promotionBoard = PromotionDisplay(movedPawn.colorPrefix, self.surface, movedPawn)
+            if Trace.game <= Trace.INFO:
+                Trace.emit("game", Trace.INFO, "promotion", color=movedPawn.colorPrefix,
+                           position=(movedPawn.xIndex, movedPawn.yIndex))
 
-    def draw(self):
+    def getDirtyRects(self):
+        """
+        Finds the regions of the window whose contents changed since they were last drawn: tiles whose color,
+        highlight, valid move dot or piece changed (moves, clicks and promotions), captured piece margins that gained
+        pieces, and the promotion board and game over message appearing or disappearing.
+        :return: list of pygame.Rect objects. Empty if nothing changed
+        """
+        if self.needsFullRedraw:
+            return [self.surface.get_rect()]
 
-        for row in self.board:
-            for tile in row:
-                tile.draw()
+        dirtyRects = [tile.rect for row in self.board for tile in row if tile.getDrawState() != tile.drawnState]
+        for pieceSet in [self.blackPieces, self.whitePieces]:
+            margin = pieceSet.capturedPiecesMargin
+            if margin.getDrawState() != margin.drawnState:
+                dirtyRects.append(margin.rect)
+
+        if self.promotionBoard is not self.drawnPromotionBoard:
+            # The board that closed leaves tiles to redraw beneath it, the one that opened needs drawing
+            for promotionBoard in [self.promotionBoard, self.drawnPromotionBoard]:
+                if promotionBoard:
+                    dirtyRects.append(promotionBoard.rect)
+        if bool(self.gameOver) != self.drawnGameOver:
+            dirtyRects.append(self.getGameOverRect())
+
+        return dirtyRects
+
+    def draw(self, dirtyRects):
+        """
+        Redraws everything that overlaps the dirty regions, bottom layer first: tiles, pieces, valid move dots, then the
+        promotion board and the game over message.
+        :param dirtyRects: list of pygame.Rect objects returned by getDirtyRects
+        :return: list of pygame.Rect objects of the regions drawn to, for pygame.display.update
+        """
+        updatedRects = list(dirtyRects)
+        tiles = [tile for row in self.board for tile in row if tile.rect.collidelist(dirtyRects) != -1]
 
+        for rect in dirtyRects:
+            self.surface.blit(self.background, rect, rect)
+        for tile in tiles:
+            tile.draw(backgroundDrawn=True)
         for pieceSet in [self.blackPieces, self.whitePieces]:
-            pieceSet.draw()
+            pieceSet.draw(dirtyRects)
 
         # Drawing the valid move dots over the chess pieces
-        for row in self.board:
-            for tile in row:
-                tile.drawValidMove()
+        for tile in tiles:
+            tile.drawValidMove()
 
-        if self.promotionBoard:
+        # Overlays are drawn whole whenever anything beneath them was redrawn
+        if self.promotionBoard and self.promotionBoard.rect.collidelist(dirtyRects) != -1:
             self.promotionBoard.draw()
-
-        # deleteme
-        self.surface.blit(self.testerImage, (pygame.mouse.get_pos()))
+            updatedRects.append(self.promotionBoard.rect)
+        self.drawnPromotionBoard = self.promotionBoard
 
         # Display game over message
-        if self.gameOver:
+        if self.gameOver and self.getGameOverRect().collidelist(dirtyRects) != -1:
             self.dispGameOver()
+            updatedRects.append(self.getGameOverRect())
+        self.drawnGameOver = bool(self.gameOver)
+
+        self.needsFullRedraw = False
+        return updatedRects
 
 
 class PieceSet:
@@ -598,6 +1042,9 @@ class PieceSet:
         self.pieces = []
         self.king = None
 
+        # Number of each piece type still on the board, maintained incrementally on capture and promotion
+        self.pieceCounts = {"pawn": 0, "knight": 0, "bishop": 0, "rook": 0, "queen": 0, "king": 0}
+
         self.capturedPiecesMargin = CapturedPiecesMargin(marginTop, marginBottom - marginTop)
         CapturedPiecesMargin.setSurface(PieceSet.chessBoard.surface)
         self.capturedPiecesMargin.setBackground(pygame.Color(240, 230, 230))
@@ -620,7 +1067,7 @@ class PieceSet:
                               f"{self.directory}/{self.colorPrefix}pawn.png",
                               self.colorPrefix)
             pawn.setIndices((pawnX, pawnY))
-            self.pieces.append(pawn)
+            self.addPiece(pawn)
 
         for pieceNum in range(2):
             for pieceName in binaryPieces:
@@ -631,7 +1078,7 @@ class PieceSet:
                                    f"{self.directory}/{self.colorPrefix}{pieceName}.png",
                                    self.colorPrefix)
                 piece.setIndices((pieceX, pieceY))
-                self.pieces.append(piece)
+                self.addPiece(piece)
 
         self.setQueenKing()
 
@@ -647,10 +1094,50 @@ class PieceSet:
         queen.setIndices((queenX, queenY))
         king.setIndices((kingX, kingY))
 
-        self.pieces.append(queen)
-        self.pieces.append(king)
+        self.addPiece(queen)
+        self.addPiece(king)
         self.king = king
 
+    def addPiece(self, piece):
+        self.pieces.append(piece)
+        self.changePieceCount(piece.name, 1)
+
+    def initPiecesFromState(self, state):
+        """
+        Replaces this set's pieces with those of its color in the given state.
+        :param state: BoardState object
+        :return: None
+        """
+        self.pieces = []
+        self.king = None
+        self.pieceCounts = dict.fromkeys(self.pieceCounts, 0)
+        self.capturedPiecesMargin.capturedPieces = [[], []]
+        pieceNums = dict.fromkeys(self.pieceCounts, 0)
+
+        for colorPrefix, pieceName, pos in state.getPieces():
+            if colorPrefix != self.colorPrefix:
+                continue
+
+            piece = ChessPiece(pieceName, pieceNums[pieceName],
+                               f"{self.directory}/{self.colorPrefix}{pieceName}.png",
+                               self.colorPrefix)
+            pieceNums[pieceName] += 1
+            piece.setIndices(pos)
+            piece.loadState(state)
+
+            if pieceName == "king":
+                self.king = piece
+            self.addPiece(piece)
+
+    def changePieceCount(self, pieceName, amount):
+        """
+        Keeps self.pieceCounts up to date. Called whenever a piece is added, captured or promoted.
+        :param pieceName: str name of the piece type whose count changes
+        :param amount: int to add to the count (negative for removal)
+        :return: None
+        """
+        self.pieceCounts[pieceName] += amount
+
     @staticmethod
     def getXEdgeIndices(sideIndex, pieceNum):
         """
@@ -683,11 +1170,17 @@ class PieceSet:
         else:
             raise Exception("The image prefixes are hardcoded. Ensure that the hard code matches the actual file.")
 
-    def draw(self):
+    def draw(self, dirtyRects):
+        """
+        :param dirtyRects: list of pygame.Rect objects. Only pieces and the margin overlapping them are drawn
+        :return: None
+        """
         for piece in self.pieces:
             tile = PieceSet.chessBoard.board[piece.xIndex][piece.yIndex]
-            PieceSet.chessBoard.surface.blit(piece.image, self.getCenteredCoord(piece.image, tile))
-        self.capturedPiecesMargin.draw()
+            if tile.rect.collidelist(dirtyRects) != -1:
+                PieceSet.chessBoard.surface.blit(piece.image, self.getCenteredCoord(piece.image, tile))
+        if self.capturedPiecesMargin.rect.collidelist(dirtyRects) != -1:
+            self.capturedPiecesMargin.draw()
 
     @staticmethod
     def getCenteredCoord(image, tile):
@@ -699,7 +1192,7 @@ class PieceSet:
 
 
 class Tile:
-    validMoveImg = pygame.transform.scale(pygame.image.load("green-dot.png"), (20, 20))
+    validMoveImg = None
     surface = None
     width = None
     height = None
@@ -708,6 +1201,10 @@ class Tile:
     def setSurface(cls, surface):
         cls.surface = surface
 
+        # Loaded here rather than at class definition so that importing this module does not touch the display/disk
+        if not cls.validMoveImg:
+            cls.validMoveImg = pygame.transform.scale(pygame.image.load("green-dot.png"), (20, 20))
+
     @classmethod
     def setSize(cls, width, height):
         cls.width = width
@@ -718,6 +1215,7 @@ class Tile:
         self.y = y
         self.alternateColor = pygame.Color(255, 200, 200)
         self.color = color
+        self.baseColor = color
         self.currentPiece = None
 
         self.rect = pygame.Rect(x, y, Tile.width, Tile.height)
@@ -728,11 +1226,26 @@ class Tile:
         self.recentMove = False
         self.recentMoveColor = pygame.Color(204, 255, 204)
 
-    def draw(self):
+        # getDrawState when the tile was last drawn, so that only changed tiles are redrawn
+        self.drawnState = None
+
+    def getDrawState(self):
+        """
+        :return: tuple of everything that determines how the tile looks
+        """
+        return self.color, self.recentMove, self.validMove, self.currentPiece.image if self.currentPiece else None
+
+    def draw(self, backgroundDrawn=False):
+        """
+        :param backgroundDrawn: bool whether the board's background has just been drawn beneath the tile, in which case
+        a tile in its base color needs no drawing
+        :return: None
+        """
+        self.drawnState = self.getDrawState()
         # Override other colors if the tile was used in a recent move
         if self.recentMove:
             pygame.draw.rect(Tile.surface, self.recentMoveColor, self.rect)
-        else:
+        elif self.color != self.baseColor or not backgroundDrawn:
             pygame.draw.rect(Tile.surface, self.color, self.rect)
 
     def drawValidMove(self):
@@ -755,7 +1268,7 @@ class ChessPiece:
     def __init__(self, name, num, imageDirStr, colorPrefix):
         self.name = name
         self.num = num
-        self.image = pygame.image.load(imageDirStr)
+        self.image = SpriteAtlas.getSprite(imageDirStr)
         self.colorPrefix = colorPrefix
 
         self.xIndex = None
@@ -784,6 +1297,10 @@ class ChessPiece:
         tile.currentPiece = self
 
     def setName(self, name):
+        pieceSet = PieceSet.chessBoard.getPieceSet(self.colorPrefix)
+        pieceSet.changePieceCount(self.name, -1)
+        pieceSet.changePieceCount(name, 1)
+
         self.name = name
         self.moveset.pieceName = name
 
@@ -797,5 +1314,63 @@ class ChessPiece:
     def getMoveSet(self):
         self.moveset.getMoves()
 
+    def loadState(self, state):
+        """
+        Sets the piece's movement history from a BoardState, after it has been placed with setIndices.
+        :param state: BoardState object
+        :return: None
+        """
+        self.unMoved = (self.xIndex, self.yIndex) in state.unMoved
+        if self.name == "pawn":
+            self.startPos = BoardState.pawnStartPos(self.colorPrefix, (self.xIndex, self.yIndex))
+
+        self.moveset.unMoved = self.unMoved
+        self.moveset.startPos = self.startPos
+
+
+class SpriteAtlas:
+    """
+    Cache of the piece images, shared by every ChessPiece showing the same image. Each image is loaded from disk once,
+    converted to the display's pixel format (which makes blitting it much cheaper) and scaled down to fit in a tile
+    if it is too large, so that no loading or scaling happens while the game is played.
+    """
+    sprites = {}
+    scaledSprites = {}
+    # Fraction of a tile's smaller side that a sprite may take up
+    tileFill = 0.9
+
+    @classmethod
+    def getSprite(cls, imagePath):
+        """
+        :param imagePath: str path of the piece's image file
+        :return: pygame.Surface of the image
+        """
+        sprite = cls.sprites.get(imagePath)
+        if sprite is None:
+            sprite = pygame.image.load(imagePath)
+            # Converting needs the display's pixel format, i.e. a window to have been opened
+            if pygame.display.get_surface():
+                sprite = sprite.convert_alpha()
+
+            if Tile.width:
+                maxSize = int(min(Tile.width, Tile.height) * cls.tileFill)
+                if max(sprite.get_size()) > maxSize:
+                    sprite = pygame.transform.smoothscale(sprite, (maxSize, maxSize))
+            cls.sprites[imagePath] = sprite
+        return sprite
+
+    @classmethod
+    def getScaledSprite(cls, sprite, size):
+        """
+        :param sprite: pygame.Surface returned by getSprite
+        :param size: int width and height to scale to
+        :return: pygame.Surface of the scaled sprite, scaled only the first time it is requested
+        """
+        key = (sprite, size)
+        if key not in cls.scaledSprites:
+            cls.scaledSprites[key] = pygame.transform.smoothscale(sprite, (size, size))
+        return cls.scaledSprites[key]
+
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Plays chess games without pygame: no display, images or frame clock. Games are played on a ChessBoardSim, which runs
+the same movementUpdates/postMovementUpdates rules as the windowed ChessBoard.
+
+Usage examples:
+    python headlessChess.py --games 20 --white random --black random
+    python headlessChess.py --games 2 --white minimax --black random --depth 2
+    python headlessChess.py --games 2 --white mate --black minimax --depth 1
+    python headlessChess.py --games 2 --white mcts --black minimax --depth 1 --mcts-seconds 1
+    python headlessChess.py --moves e2e4 e7e5 g1f3 b8c6 --fen "<fen>"
+"""
+import argparse
+import random
+import time
+
+from chessCore.ChessBrain import ChessBrain
+from chessCore.chessGame import Game
+from chessCore.chessboardBot import ChessBoardSim, PromotionSim
+from chessCore.fen import Fen
+from chessCore.openingBook import OpeningBook
+from chessCore.tablebase import Tablebase
+from chessCore.pgn import GameRecord, Pgn
+from chessCore.timing import Timings, instrumentPhases
+from chessCore.tracing import Trace
+
+# Move choosers of createBrain: random moves, miniMax search, miniMax search that plays forced mates it finds, and
+# Monte Carlo tree search
+engineNames = ["random", "minimax", "mate", "mcts"]
+
+
+class HeadlessGame:
+    """
+    A single game played on a ChessBoardSim. Moves are either chosen by ChessBrain objects or given as coordinate
+    strings, e.g. "e2e4" or "e7e8n" for promotions.
+    :var self.chessBoard: ChessBoardSim object the game is played on
+    :var self.moveList: list of (fromPos, toPos, promotionName) tuples of the moves played. promotionName is None for
+    moves that are not promotions
+    :var self.gameRecord: GameRecord object holding the SAN of the moves played
+    :var self.searches: list of (str color prefix, SearchStats object) tuples of the bot moves played, in order
+    """
+    pieceValues = {"pawn": 10, "knight": 30, "bishop": 30, "rook": 40, "queen": 90, "king": 900}
+    promotionLetters = {"q": "queen", "n": "knight", "r": "rook", "b": "bishop"}
+
+    def __init__(self, fenStr=Fen.startingFen):
+        self.chessBoard = ChessBoardSim.fromFen(fenStr, HeadlessGame.pieceValues)
+        self.moveList = []
+        self.searches = []
+        self.gameRecord = GameRecord(fenStr)
+
+    def getPlies(self):
+        return len(self.moveList)
+
+    def makeMove(self, piece, rowNum, colNum, promotionName="queen"):
+        """
+        Plays a move for the current player, including the promotion selection if the move promotes a pawn.
+        :param piece: ChessPieceSim object to move
+        :param rowNum: int x index of the destination tile
+        :param colNum: int y index of the destination tile
+        :param promotionName: str name of the piece to promote to, if the move is a promotion
+        :return: None
+        """
+        if (rowNum, colNum) not in piece.moveset.getListifiedVerifiedset():
+            raise Exception(f"Illegal move: {piece.colorPrefix}{piece.name} to {Fen.tileName((rowNum, colNum))}")
+
+        fromPos = (piece.xIndex, piece.yIndex)
+        isPromotion = piece.name == "pawn" and colNum in (0, 7)
+
+        self.gameRecord.startMove(self.chessBoard, piece, (rowNum, colNum))
+        self.chessBoard.playMove(piece, rowNum, colNum, promotionName)
+        self.gameRecord.finishMove(self.chessBoard)
+
+        self.moveList.append((fromPos, (rowNum, colNum), promotionName if isPromotion else None))
+
+    def makeCoordinateMove(self, moveStr):
+        """
+        Plays a move given in coordinate notation.
+        :param moveStr: str such as "e2e4", with a trailing piece letter for promotions, e.g. "a7a8q"
+        :return: None
+        """
+        fromPos = Fen.tileIndices(moveStr[:2])
+        toPos = Fen.tileIndices(moveStr[2:4])
+        promotionName = HeadlessGame.promotionLetters[moveStr[4]] if len(moveStr) > 4 else "queen"
+
+        piece = self.chessBoard.board[fromPos[0]][fromPos[1]].currentPiece
+        if not piece or piece.colorPrefix != self.chessBoard.game.currentColor:
+            raise Exception(f"No piece of the current player on {moveStr[:2]}")
+
+        self.makeMove(piece, toPos[0], toPos[1], promotionName)
+
+    def playBots(self, brains, maxPlies):
+        """
+        Plays until the game ends or maxPlies moves have been played in total.
+        :param brains: dict of color prefix to the ChessBrain object playing that color
+        :param maxPlies: int
+        :return: dict of color prefix to a list of [float CPU seconds the brain spent choosing moves, int moves played,
+        int nodes searched, float wall seconds spent searching]
+        """
+        thinking = {colorPrefix: [0.0, 0, 0, 0.0] for colorPrefix in brains}
+        while not self.chessBoard.gameOver and self.getPlies() < maxPlies:
+            colorPrefix = self.chessBoard.game.currentColor
+            brain = brains[colorPrefix]
+
+            # CPU time of this process only, so searches that run on other processes are not fully counted
+            startTime = time.process_time()
+            (piece, rowNum, colNum), searchStats = brain.getMoveWithStats()
+            thinking[colorPrefix][0] += time.process_time() - startTime
+            thinking[colorPrefix][1] += 1
+            thinking[colorPrefix][2] += searchStats.nodes
+            thinking[colorPrefix][3] += searchStats.seconds
+            self.searches.append((colorPrefix, searchStats))
+
+            promotionName = PromotionSim.promotionOptions[brain.getPromotionChoice()]
+            self.makeMove(piece, rowNum, colNum, promotionName)
+        return thinking
+
+    def getResult(self):
+        """
+        :return: str of the result in PGN notation. "*" if the game has not ended
+        """
+        return Pgn.getResult(self.chessBoard)
+
+    def toPgn(self, headers):
+        """
+        :param headers: dict of PGN tag names to values, e.g. {"White": ..., "Black": ...}
+        :return: str PGN record of the game
+        """
+        return Pgn.formatGame(headers, self.gameRecord.sanList, self.getResult(), self.gameRecord.startingFen)
+
+    @staticmethod
+    def formatMove(move):
+        fromPos, toPos, promotionName = move
+        promotionLetter = ""
+        if promotionName:
+            promotionLetter = {name: letter for letter, name in HeadlessGame.promotionLetters.items()}[promotionName]
+        return f"{Fen.tileName(fromPos)}{Fen.tileName(toPos)}{promotionLetter}"
+
+
+def createBrain(chessBoard, colorPrefix, engine, depth, pieceValues=None, bookPath=None, tablebaseDir=None,
+                mctsSeconds=None, mctsWorkers=1):
+    """
+    :param chessBoard: ChessBoardSim object the brain plays on
+    :param colorPrefix: str color the brain plays
+    :param engine: str, one of engineNames
+    :param depth: int search depth used by minimax
+    :param pieceValues: dict of piece names to values that override the ones minimax evaluates positions with
+    :param bookPath: str path of an opening book file to play from, or None
+    :param tablebaseDir: str path of a directory of endgame tablebases to play from, or None
+    :param mctsSeconds: float seconds per move of the mcts engine, or None to search a fixed number of playouts
+    :param mctsWorkers: int number of processes running the mcts engine's playouts, see Mcts. Close the brain once
+    done with it to stop them
+    :return: ChessBrain object
+    """
+    brain = ChessBrain(chessBoard, chessBoard.getPieceSet(colorPrefix))
+    brain.recursionDepth = depth
+    if pieceValues:
+        brain.pieceValues.update(pieceValues)
+    if engine == "minimax":
+        brain.searchMethod = brain.getMiniMaxMove
+    elif engine == "mate":
+        brain.searchMethod = brain.getMateMove
+    elif engine == "mcts":
+        brain.searchMethod = brain.getMctsMove
+        brain.mctsSeconds = mctsSeconds
+        brain.mctsWorkers = mctsWorkers
+    if bookPath:
+        brain.openingBook = OpeningBook.open(bookPath)
+    if tablebaseDir:
+        brain.tablebase = Tablebase.open(tablebaseDir)
+    return brain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play chess games without a display.")
+    parser.add_argument("--games", type=int, default=1, help="number of games to play")
+    parser.add_argument("--white", choices=engineNames, default="random")
+    parser.add_argument("--black", choices=engineNames, default="random")
+    parser.add_argument("--depth", type=int, default=2, help="minimax search depth")
+    parser.add_argument("--mcts-seconds", type=float, default=None, help="mcts search time per move")
+    parser.add_argument("--mcts-workers", type=int, default=1, help="processes running each mcts search's playouts")
+    parser.add_argument("--max-plies", type=int, default=500, help="stop unfinished games after this many plies")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible games")
+    parser.add_argument("--fen", default=Fen.startingFen, help="starting position")
+    parser.add_argument("--moves", nargs="*", default=None,
+                        help="play these coordinate moves (e.g. e2e4) instead of bot moves")
+    parser.add_argument("--book", default=None, help="opening book file both bots play from")
+    parser.add_argument("--tablebases", default=None, help="endgame tablebase directory both bots play from")
+    parser.add_argument("--verbose", action="store_true", help="print the moves of every game")
+    parser.add_argument("--profile-phases", action="store_true",
+                        help="time each phase of the board updates after a move, reported after the games")
+    Trace.addArguments(parser)
+    args = parser.parse_args()
+    Trace.startFromArguments(args)
+
+    phaseTimings = Timings(histograms=True) if args.profile_phases else None
+    if phaseTimings:
+        phaseNames = instrumentPhases(phaseTimings, Game, [ChessBoardSim])
+
+    results = {}
+    totalPlies = 0
+    # Color prefix to [bot moves, nodes searched, wall seconds spent searching]
+    searchTotals = {"w_": [0, 0, 0.0], "b_": [0, 0, 0.0]}
+    startTime = time.perf_counter()
+
+    for gameNum in range(args.games):
+        if args.seed is not None:
+            random.seed(args.seed + gameNum)
+
+        game = HeadlessGame(args.fen)
+        if args.moves is not None:
+            for moveStr in args.moves:
+                game.makeCoordinateMove(moveStr)
+        else:
+            brains = {colorPrefix: createBrain(game.chessBoard, colorPrefix, engine, args.depth, bookPath=args.book,
+                                               tablebaseDir=args.tablebases, mctsSeconds=args.mcts_seconds,
+                                               mctsWorkers=args.mcts_workers)
+                      for colorPrefix, engine in [("w_", args.white), ("b_", args.black)]}
+            try:
+                thinking = game.playBots(brains, args.max_plies)
+            finally:
+                for brain in brains.values():
+                    brain.close()
+            for colorPrefix, (_, moves, nodes, searchSeconds) in thinking.items():
+                for index, value in enumerate([moves, nodes, searchSeconds]):
+                    searchTotals[colorPrefix][index] += value
+
+        result = game.getResult()
+        results[result] = results.get(result, 0) + 1
+        totalPlies += game.getPlies()
+
+        if args.verbose:
+            print(f"Game {gameNum + 1}: {result} {game.chessBoard.gameOver or ''}")
+            print("    " + " ".join(HeadlessGame.formatMove(move) for move in game.moveList))
+            print(f"    {game.chessBoard.toFen()}")
+
+    elapsed = time.perf_counter() - startTime
+    print(f"Games: {args.games}  Results: {results}")
+    print(f"Plies: {totalPlies}  Time: {elapsed:.2f}s")
+    print(f"Games/sec: {args.games / elapsed:.3f}  Plies/sec: {totalPlies / elapsed:.1f}")
+    if args.moves is None:
+        print("Search: " + "  ".join(f"{colorName} ({engine}): {nodes / max(moves, 1):.0f} nodes/move, "
+                                     f"{nodes / searchSeconds if searchSeconds else 0:,.0f} nodes/sec"
+                                     for colorName, engine, (moves, nodes, searchSeconds) in
+                                     [("White", args.white, searchTotals["w_"]),
+                                      ("Black", args.black, searchTotals["b_"])]))
+    if phaseTimings:
+        phaseTimings.restore()
+        print(phaseTimings.getReport(phaseNames))
+    Trace.stop()
+
+
+if __name__ == "__main__":
+    main()
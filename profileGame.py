@@ -0,0 +1,170 @@
+"""
+Profiles headless games to find where the time goes. A seeded bot game, or a scripted one from coordinate moves, is
+played under cProfile or a sampling profiler, the top functions are printed, and the profile is written for other
+tools:
+    - <out>.prof: the cProfile profile, for pstats, snakeviz and the like (cProfile only)
+    - <out>.folded: collapsed stacks for flamegraph tools, e.g. flamegraph.pl <out>.folded > flamegraph.svg. Those of a
+    cProfile run are estimated from its caller/callee times, those of a sampled run are the sampled stacks
+
+cProfile slows down every call, small ones the most, so long runs are better profiled with --sample, which records
+the stack every few milliseconds instead.
+
+--memory profiles memory with tracemalloc instead of time: the peak memory of each search, the memory and allocated
+blocks of a search node (a ChessBoardSim copy with a move played on it, as miniMax makes for every move it searches)
+and the allocation sites of a node.
+
+Usage examples:
+    python profileGame.py --white minimax --black random --depth 2 --seed 1 --out minimax
+    python profileGame.py --moves e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 --out scripted
+    python profileGame.py --games 10 --white mcts --black minimax --depth 1 --sample 0.002 --out long
+    python profileGame.py --white minimax --black mate --depth 2 --memory
+"""
+import argparse
+import cProfile
+import io
+import pstats
+import random
+import statistics
+import time
+
+from chessCore.boardState import BoardState
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.fen import Fen
+from chessCore.mcts import getLegalMoves
+from chessCore.profiling import MemoryProfile, StackSampler, collapseProfile, measureAllocations, writeCollapsed
+from headlessChess import HeadlessGame, createBrain, engineNames
+
+
+def playGames(args):
+    """
+    :param args: argparse.Namespace of the game options, see main
+    :return: tuple of (int plies played, list of (str color prefix, SearchStats object) tuples of every bot move)
+    """
+    totalPlies = 0
+    searches = []
+    for gameNum in range(args.games):
+        random.seed(args.seed + gameNum)
+        game = HeadlessGame(args.fen) if args.fen else HeadlessGame()
+        if args.moves is not None:
+            for moveStr in args.moves:
+                game.makeCoordinateMove(moveStr)
+        else:
+            brains = {colorPrefix: createBrain(game.chessBoard, colorPrefix, engine, args.depth,
+                                               mctsSeconds=args.mcts_seconds, mctsWorkers=args.mcts_workers)
+                      for colorPrefix, engine in [("w_", args.white), ("b_", args.black)]}
+            try:
+                game.playBots(brains, args.max_plies)
+            finally:
+                for brain in brains.values():
+                    brain.close()
+        totalPlies += game.getPlies()
+        searches.extend(game.searches)
+    return totalPlies, searches
+
+
+def createSearchNode(chessBoard):
+    """
+    :param chessBoard: ChessBoardSim object of a position with legal moves
+    :return: ChessBoardSim object copied from chessBoard with its first legal move played, as miniMax makes per move
+    """
+    (fromX, fromY), (toX, toY) = getLegalMoves(chessBoard)[0]
+    chessSim = ChessBoardSim(chessBoard, HeadlessGame.pieceValues, chessBoard.game.currentColor)
+    chessSim.getBotMove(chessBoard.board[fromX][fromY].currentPiece, toX, toY)
+    return chessSim
+
+
+def measureSearchNode(fenStr, count=100, frames=1):
+    """
+    :param fenStr: str FEN of the position the nodes are made from
+    :param count: int number of nodes made, over which the memory is averaged
+    :param frames: int frames stored per allocation, see MemoryProfile
+    :return: MemoryProfile object of making the nodes
+    """
+    # Loaded from a snapshot so that its moves are legal ones, see Mcts.search
+    chessBoard = ChessBoardSim.fromState(BoardState.fromBoard(ChessBoardSim.fromFen(fenStr, HeadlessGame.pieceValues)),
+                                         HeadlessGame.pieceValues)
+    createSearchNode(chessBoard)
+    return measureAllocations(lambda: createSearchNode(chessBoard), count, frames)
+
+
+def getMemoryReport(searches, args):
+    """
+    :param searches: list of (str color prefix, SearchStats object) tuples of searches made while tracing memory
+    :param args: argparse.Namespace of the options, see main
+    :return: str report of the searches' peak memory and of the memory of a search node
+    """
+    lines = [f"{'Searches':<20} {'Count':>6} {'Nodes/search':>13} {'Peak KiB mean':>14} {'Peak KiB max':>13}"]
+    for colorPrefix, engine in [("w_", args.white), ("b_", args.black)]:
+        colorSearches = [searchStats for searchColor, searchStats in searches if searchColor == colorPrefix]
+        if not colorSearches:
+            continue
+        peaks = [searchStats.peakBytes / 1024 for searchStats in colorSearches]
+        lines.append(f"{colorPrefix + engine:<20} {len(colorSearches):>6} "
+                     f"{statistics.mean(searchStats.nodes for searchStats in colorSearches):>13.1f} "
+                     f"{statistics.mean(peaks):>14.1f} {max(peaks):>13.1f}")
+
+    nodeCount = 100
+    nodeProfile = measureSearchNode(args.fen or Fen.startingFen, nodeCount, args.memory_frames)
+    lines.append(f"\nSearch node: {nodeProfile.bytes / nodeCount:,.0f} bytes in {nodeProfile.blocks / nodeCount:.1f} "
+                 f"blocks")
+    lines.append(nodeProfile.getReport(args.top, nodeCount))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile headless games with cProfile or a sampling profiler.")
+    parser.add_argument("--games", type=int, default=1, help="number of games to play")
+    parser.add_argument("--white", choices=engineNames, default="minimax")
+    parser.add_argument("--black", choices=engineNames, default="minimax")
+    parser.add_argument("--depth", type=int, default=2, help="minimax search depth")
+    parser.add_argument("--mcts-seconds", type=float, default=None, help="mcts search time per move")
+    parser.add_argument("--mcts-workers", type=int, default=1, help="processes running each mcts search's playouts")
+    parser.add_argument("--max-plies", type=int, default=40, help="stop unfinished games after this many plies")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game, incremented for each game")
+    parser.add_argument("--fen", default=None, help="starting position")
+    parser.add_argument("--moves", nargs="*", default=None,
+                        help="play these coordinate moves (e.g. e2e4) instead of bot moves")
+    parser.add_argument("--out", default="profile", help="path of the output files, without their extension")
+    parser.add_argument("--top", type=int, default=25, help="number of functions printed")
+    parser.add_argument("--sort", default="cumulative", choices=["cumulative", "tottime", "ncalls"],
+                        help="order of the printed cProfile functions")
+    parser.add_argument("--sample", type=float, default=None, metavar="SECONDS",
+                        help="sample the stack at this interval instead of profiling every call")
+    parser.add_argument("--memory", action="store_true", help="profile memory with tracemalloc instead of time")
+    parser.add_argument("--memory-frames", type=int, default=1, help="call stack frames stored per allocation")
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    if args.memory:
+        with MemoryProfile(args.memory_frames) as gameProfile:
+            totalPlies, searches = playGames(args)
+        elapsed = time.perf_counter() - startTime
+        print(getMemoryReport(searches, args))
+        print(f"\nStill allocated after the games: {gameProfile.bytes:,} bytes in {gameProfile.blocks:,} blocks")
+    elif args.sample:
+        with StackSampler(args.sample) as sampler:
+            totalPlies, _ = playGames(args)
+        elapsed = time.perf_counter() - startTime
+        print(sampler.getReport(args.top))
+        writeCollapsed(sampler.stacks, args.out + ".folded")
+        print(f"\nWrote {args.out}.folded")
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        totalPlies, _ = playGames(args)
+        profiler.disable()
+        elapsed = time.perf_counter() - startTime
+        profiler.dump_stats(args.out + ".prof")
+
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        writeCollapsed(collapseProfile(stats), args.out + ".folded")
+        stats.strip_dirs().sort_stats(args.sort).print_stats(args.top)
+        print(report.getvalue().strip())
+        print(f"\nWrote {args.out}.prof and {args.out}.folded")
+
+    print(f"Games: {args.games}  Plies: {totalPlies}  Time: {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Plays bot-vs-bot matches between two ChessBrain configurations across a process pool. Every finished game is appended
+to a PGN file as soon as it completes, and the running win/draw/loss count and Elo difference are printed.
+
+Each game is played start to finish by a single worker from a task that holds everything it needs (both
+configurations, seed, opening length), so workers share no mutable state and the match scales across all cores.
+
+Usage examples:
+    python selfPlay.py --games 100 --depth-a 2 --depth-b 1 --opening-plies 4 --pgn match.pgn
+    python selfPlay.py --games 50 --engine-b random --weights-a knight=32,bishop=33
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import random
+import time
+
+from headlessChess import HeadlessGame, createBrain, engineNames
+from chessCore.fen import Fen
+
+
+class MatchScore:
+    """
+    Win/draw/loss count of a match from the point of view of configuration A.
+    """
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    def getGames(self):
+        return self.wins + self.draws + self.losses
+
+    def addResult(self, result, aColor):
+        """
+        :param result: str PGN result of a finished game, i.e. "1-0", "0-1" or "1/2-1/2". Unfinished games ("*"), e.g.
+        ones stopped at the ply limit, count as draws
+        :param aColor: str color prefix configuration A played
+        :return: None
+        """
+        points = MatchScore.pointsFor(result, aColor)
+        if points == 1:
+            self.wins += 1
+        elif points == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    @staticmethod
+    def pointsFor(result, aColor):
+        """
+        :return: float points configuration A scored in a game: 1, 0.5 or 0. See addResult for the parameters
+        """
+        if result == "1-0":
+            return 1 if aColor == "w_" else 0
+        elif result == "0-1":
+            return 1 if aColor == "b_" else 0
+        return 0.5
+
+    def getScore(self):
+        """
+        :return: float fraction of the points A scored, or None before any game has finished
+        """
+        if not self.getGames():
+            return None
+        return (self.wins + self.draws / 2) / self.getGames()
+
+    @staticmethod
+    def eloFromScore(score):
+        """
+        :param score: float fraction of the points scored
+        :return: float Elo difference that corresponds to the expected score. +/-inf for a score of 1 or 0
+        """
+        if score >= 1:
+            return math.inf
+        elif score <= 0:
+            return -math.inf
+        return 400 * math.log10(score / (1 - score))
+
+    def getElo(self):
+        score = self.getScore()
+        return None if score is None else MatchScore.eloFromScore(score)
+
+    def getEloMargin(self):
+        """
+        :return: float half width of the 95% confidence interval of the Elo difference, or None without enough games
+        """
+        games = self.getGames()
+        score = self.getScore()
+        if games < 2:
+            return None
+
+        variance = (self.wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + self.losses * score ** 2) / games
+        margin = 1.96 * math.sqrt(variance / games)
+        return (MatchScore.eloFromScore(score + margin) - MatchScore.eloFromScore(score - margin)) / 2
+
+    def __str__(self):
+        elo = self.getElo()
+        margin = self.getEloMargin()
+        eloStr = "n/a" if elo is None else f"{elo:+.1f}"
+        if margin is not None and math.isfinite(margin):
+            eloStr += f" +/- {margin:.1f}"
+        return f"W/D/L: {self.wins}/{self.draws}/{self.losses}  Elo: {eloStr}"
+
+
+def describeConfig(config):
+    description = config["engine"]
+    if config["engine"] in ["minimax", "mate"]:
+        description += f" d{config['depth']}"
+    elif config["engine"] == "mcts" and config["mctsSeconds"]:
+        description += f" {config['mctsSeconds']}s"
+    if config["pieceValues"]:
+        description += " " + ",".join(f"{name}={value}" for name, value in sorted(config["pieceValues"].items()))
+    if config["book"]:
+        description += f" book={config['book']}"
+    if config["tablebases"]:
+        description += f" tablebases={config['tablebases']}"
+    return description
+
+
+def playGame(task):
+    """
+    Pool worker. Plays one whole game.
+    :param task: dict with the keys "gameNum", "white" and "black" (configuration dicts with the keys "name",
+    "engine", "depth", "pieceValues", "book", "tablebases" and "mctsSeconds"), "seed", "openingPlies", "maxPlies"
+    and "fen"
+    :return: tuple of (gameNum, str PGN result, str PGN record, dict of configuration name to a list of [float CPU
+    seconds spent choosing moves, int moves played, int nodes searched, float wall seconds spent searching])
+    """
+    random.seed(task["seed"])
+    game = HeadlessGame(task["fen"])
+
+    configs = {"w_": task["white"], "b_": task["black"]}
+    brains = {colorPrefix: createBrain(game.chessBoard, colorPrefix, config["engine"], config["depth"],
+                                       config["pieceValues"], config["book"], config["tablebases"],
+                                       config["mctsSeconds"])
+              for colorPrefix, config in configs.items()}
+
+    # Random opening moves, so that deterministic engines do not play the same game over and over
+    openingBrains = {colorPrefix: createBrain(game.chessBoard, colorPrefix, "random", 0) for colorPrefix in configs}
+    game.playBots(openingBrains, task["openingPlies"])
+    try:
+        thinking = game.playBots(brains, task["maxPlies"])
+    finally:
+        for brain in brains.values():
+            brain.close()
+
+    headers = {"Event": "Self-play", "Site": "selfPlay.py", "Date": time.strftime("%Y.%m.%d"),
+               "Round": task["gameNum"] + 1,
+               "White": f"{configs['w_']['name']} ({describeConfig(configs['w_'])})",
+               "Black": f"{configs['b_']['name']} ({describeConfig(configs['b_'])})",
+               "Seed": task["seed"], "OpeningPlies": task["openingPlies"]}
+    if game.chessBoard.gameOver:
+        headers["Termination"] = game.chessBoard.gameOver.lower()
+    elif game.getPlies() >= task["maxPlies"]:
+        headers["Termination"] = "ply limit"
+
+    return task["gameNum"], game.getResult(), game.toPgn(headers), \
+        {configs[colorPrefix]["name"]: colorThinking for colorPrefix, colorThinking in thinking.items()}
+
+
+def createTasks(configA, configB, games, seed, openingPlies, maxPlies, fenStr):
+    """
+    Creates the games of a match. Colors alternate every game, and each pair of games shares a seed so that both
+    configurations play the same random opening once with each color.
+    :return: list of task dicts, see playGame
+    """
+    tasks = []
+    for pairNum in range((games + 1) // 2):
+        tasks.extend(createPair(configA, configB, pairNum, seed, openingPlies, maxPlies, fenStr))
+    return tasks[:games]
+
+
+def createPair(configA, configB, pairNum, seed, openingPlies, maxPlies, fenStr):
+    """
+    :return: list of the two task dicts of a pair of games: games 2 * pairNum, with A playing white, and
+    2 * pairNum + 1, with B playing white. Both games start with the same random opening
+    """
+    return [{"gameNum": 2 * pairNum + swapped, "white": white, "black": black, "seed": seed + pairNum,
+             "openingPlies": openingPlies, "maxPlies": maxPlies, "fen": fenStr}
+            for swapped, (white, black) in enumerate([(configA, configB), (configB, configA)])]
+
+
+def parsePieceValues(valuesStr):
+    """
+    :param valuesStr: str such as "knight=32,bishop=33", or None
+    :return: dict of piece names to int values
+    """
+    pieceValues = {}
+    if valuesStr:
+        for item in valuesStr.split(","):
+            name, value = item.split("=")
+            if name not in HeadlessGame.pieceValues:
+                raise Exception(f"Unknown piece name: {name}")
+            pieceValues[name] = int(value)
+    return pieceValues
+
+
+def addConfigArguments(parser):
+    for label in ["a", "b"]:
+        parser.add_argument(f"--engine-{label}", choices=engineNames, default="minimax")
+        parser.add_argument(f"--depth-{label}", type=int, default=2, help="minimax search depth")
+        parser.add_argument(f"--mcts-seconds-{label}", type=float, default=None, help="mcts search time per move")
+        parser.add_argument(f"--weights-{label}", default=None,
+                            help="piece values overriding the defaults, e.g. knight=32,bishop=33")
+        parser.add_argument(f"--book-{label}", default=None, help="opening book file to play from")
+        parser.add_argument(f"--tablebases-{label}", default=None, help="endgame tablebase directory to play from")
+
+
+def getConfigs(args):
+    return [{"name": label.upper(), "engine": getattr(args, f"engine_{label}"), "depth": getattr(args, f"depth_{label}"),
+             "pieceValues": parsePieceValues(getattr(args, f"weights_{label}")), "book": getattr(args, f"book_{label}"),
+             "tablebases": getattr(args, f"tablebases_{label}"), "mctsSeconds": getattr(args, f"mcts_seconds_{label}")}
+            for label in ["a", "b"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a bot-vs-bot match across a process pool.")
+    parser.add_argument("--games", type=int, default=100)
+    addConfigArguments(parser)
+    parser.add_argument("--opening-plies", type=int, default=4, help="random moves played at the start of each game")
+    parser.add_argument("--max-plies", type=int, default=300, help="games longer than this are scored as draws")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fen", default=Fen.startingFen, help="starting position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--pgn", default="selfPlay.pgn", help="file finished games are appended to")
+    args = parser.parse_args()
+
+    configA, configB = getConfigs(args)
+    print(f"A: {describeConfig(configA)}  B: {describeConfig(configB)}  Workers: {args.workers}")
+
+    tasks = createTasks(configA, configB, args.games, args.seed, args.opening_plies, args.max_plies, args.fen)
+    score = MatchScore()
+    # Configuration name to [CPU seconds spent choosing moves, moves played, nodes searched, wall seconds spent
+    # searching], to compare strength per CPU second and watch the engines' search speed
+    thinking = {config["name"]: [0.0, 0, 0, 0.0] for config in [configA, configB]}
+    startTime = time.perf_counter()
+
+    with multiprocessing.Pool(args.workers) as pool, open(args.pgn, "a") as pgnFile:
+        for gameNum, result, pgnStr, gameThinking in pool.imap_unordered(playGame, tasks):
+            pgnFile.write(pgnStr)
+            pgnFile.flush()
+            for name, gameTotals in gameThinking.items():
+                for index, value in enumerate(gameTotals):
+                    thinking[name][index] += value
+
+            aColor = "w_" if tasks[gameNum]["white"] is configA else "b_"
+            score.addResult(result, aColor)
+            print(f"Game {gameNum + 1}: {result}  {score}")
+
+    elapsed = time.perf_counter() - startTime
+    print(f"Finished {score.getGames()} games in {elapsed:.1f}s ({score.getGames() / elapsed:.2f} games/sec)")
+    print("CPU time per move: " + "  ".join(f"{name}: {seconds / max(moves, 1) * 1000:.1f}ms"
+                                            for name, (seconds, moves, _, _) in thinking.items()))
+    print("Search: " + "  ".join(f"{name}: {nodes / max(moves, 1):.0f} nodes/move, "
+                                 f"{nodes / searchSeconds if searchSeconds else 0:,.0f} nodes/sec"
+                                 for name, (_, moves, nodes, searchSeconds) in thinking.items()))
+
+
+if __name__ == "__main__":
+    main()
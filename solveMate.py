@@ -0,0 +1,48 @@
+"""
+Solves mate-in-N puzzles with the forced mate search of chessCore/mateSolver.py.
+
+Usage examples:
+    python solveMate.py "r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1" --moves 2
+    python solveMate.py --file puzzles.txt --moves 3
+"""
+import argparse
+import time
+
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.mateSolver import MateSolver
+from headlessChess import HeadlessGame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find forced mates.")
+    parser.add_argument("fens", nargs="*", help="positions to solve")
+    parser.add_argument("--file", default=None, help="file of further positions to solve, one FEN per line")
+    parser.add_argument("--moves", type=int, default=3, help="longest mate to look for, in moves of the attacker")
+    args = parser.parse_args()
+
+    fens = list(args.fens)
+    if args.file:
+        with open(args.file) as fenFile:
+            fens.extend(line.strip() for line in fenFile if line.strip())
+
+    solver = MateSolver(HeadlessGame.pieceValues)
+    solvedCount = 0
+    startTime = time.perf_counter()
+
+    for fen in fens:
+        positionStart = time.perf_counter()
+        line = solver.solve(ChessBoardSim.fromFen(fen, HeadlessGame.pieceValues), args.moves)
+        elapsed = time.perf_counter() - positionStart
+
+        if line:
+            solvedCount += 1
+            print(f"{fen}: mate in {(len(line) + 1) // 2}: {' '.join(line)}")
+        else:
+            print(f"{fen}: no mate in {args.moves}")
+        print(f"    Nodes: {solver.nodes}  Time: {elapsed:.3f}s")
+
+    print(f"Solved: {solvedCount}/{len(fens)}  Time: {time.perf_counter() - startTime:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
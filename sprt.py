@@ -0,0 +1,228 @@
+"""
+A/B testing of engine changes with a sequential probability ratio test (SPRT). Configuration A (the change) plays
+configuration B (the baseline) in pairs of games that share a random opening, once with each color, on a process pool.
+After every finished pair the log-likelihood ratio (LLR) of the hypotheses
+
+    H0: the Elo difference of A over B is elo0
+    H1: the Elo difference of A over B is elo1
+
+is updated, and the test stops as soon as it crosses one of the bounds set by the error rates alpha and beta. This
+usually needs far fewer games than a fixed-length match of similar confidence.
+
+Every finished pair is appended to a JSONL result log. Rerunning with the same log resumes the test, skipping the pairs
+that have already been played.
+
+Usage example:
+    python sprt.py --depth-a 2 --depth-b 1 --elo0 0 --elo1 50 --log depthTest.jsonl
+"""
+import argparse
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import time
+
+from selfPlay import MatchScore, addConfigArguments, getConfigs, describeConfig, createPair, playGame
+from chessCore.fen import Fen
+
+
+class Sprt:
+    """
+    SPRT over paired games. Each pair scores A between 0 and 2 points, and pairs rather than games are treated as the
+    independent samples (the pentanomial model), since the two games of a pair share an opening and are correlated.
+    The LLR uses the normal approximation of the generalized SPRT.
+    :var self.pairCounts: list of the number of pairs A scored 0, 0.5, 1, 1.5 and 2 points in
+    """
+    def __init__(self, elo0, elo1, alpha, beta):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.alpha = alpha
+        self.beta = beta
+        self.pairCounts = [0] * 5
+
+    def getPairs(self):
+        return sum(self.pairCounts)
+
+    def addPair(self, points):
+        """
+        :param points: float points A scored over both games of a pair
+        :return: None
+        """
+        self.pairCounts[round(points * 2)] += 1
+
+    @staticmethod
+    def scoreFromElo(elo):
+        return 1 / (1 + 10 ** (-elo / 400))
+
+    def getBounds(self):
+        """
+        :return: tuple of the (lower, upper) LLR bounds. H0 is accepted at the lower bound, H1 at the upper
+        """
+        return math.log(self.beta / (1 - self.alpha)), math.log((1 - self.beta) / self.alpha)
+
+    def getLLR(self):
+        pairs = self.getPairs()
+        if not pairs:
+            return 0
+
+        # Mean and variance of the per-game score of a pair, i.e. a pair's points / 2
+        pairScores = [index / 4 for index in range(5)]
+        mean = sum(count * score for count, score in zip(self.pairCounts, pairScores)) / pairs
+        variance = sum(count * (score - mean) ** 2 for count, score in zip(self.pairCounts, pairScores)) / pairs
+        if variance <= 0:
+            return 0
+
+        score0 = Sprt.scoreFromElo(self.elo0)
+        score1 = Sprt.scoreFromElo(self.elo1)
+        return pairs * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+    def getDecision(self):
+        """
+        :return: str "H0" or "H1" once the corresponding hypothesis has been accepted, otherwise None
+        """
+        lower, upper = self.getBounds()
+        llr = self.getLLR()
+        if llr <= lower:
+            return "H0"
+        elif llr >= upper:
+            return "H1"
+        return None
+
+    def __str__(self):
+        lower, upper = self.getBounds()
+        return f"LLR: {self.getLLR():.2f} ({lower:.2f}, {upper:.2f})  Pairs: {self.pairCounts}"
+
+
+def getSettings(args, configA, configB):
+    """
+    :return: dict of everything that must not change when resuming a test from its log
+    """
+    return {"type": "settings", "a": configA, "b": configB, "elo0": args.elo0, "elo1": args.elo1,
+            "alpha": args.alpha, "beta": args.beta, "seed": args.seed, "openingPlies": args.opening_plies,
+            "maxPlies": args.max_plies, "fen": args.fen}
+
+
+def readLog(logPath, settings):
+    """
+    Reads the pairs finished in a previous run. The log starts with a record of the settings it was created with, which
+    must match the current ones.
+    :param logPath: str path of the JSONL result log
+    :param settings: dict, see getSettings
+    :return: list of the pair dicts in the log, or None if the log has no records yet, i.e. does not exist or is empty
+    """
+    if not os.path.exists(logPath):
+        return None
+
+    logSettings = None
+    pairs = []
+    with open(logPath) as logFile:
+        for line in logFile:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "settings":
+                if record != settings:
+                    raise Exception(f"{logPath} was created with different settings: {record}")
+                logSettings = record
+            elif logSettings is None:
+                raise Exception(f"{logPath} has results before its settings record")
+            else:
+                pairs.append(record)
+    return pairs if logSettings is not None else None
+
+
+def recordPair(results, sprt, score):
+    """
+    :param results: list of the str PGN results of a pair's games, A playing white in the first
+    :param sprt: Sprt object
+    :param score: MatchScore object
+    :return: None
+    """
+    aColors = ["w_", "b_"]
+    sprt.addPair(sum(MatchScore.pointsFor(result, aColor) for result, aColor in zip(results, aColors)))
+    for result, aColor in zip(results, aColors):
+        score.addResult(result, aColor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an SPRT A/B match between two bot configurations.")
+    addConfigArguments(parser)
+    parser.add_argument("--elo0", type=float, default=0, help="Elo difference of the null hypothesis")
+    parser.add_argument("--elo1", type=float, default=20, help="Elo difference of the alternative hypothesis")
+    parser.add_argument("--alpha", type=float, default=0.05, help="probability of accepting H1 when H0 is true")
+    parser.add_argument("--beta", type=float, default=0.05, help="probability of accepting H0 when H1 is true")
+    parser.add_argument("--max-games", type=int, default=20000, help="stop without a decision after this many games")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random moves played at the start of each game")
+    parser.add_argument("--max-plies", type=int, default=300, help="games longer than this are scored as draws")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fen", default=Fen.startingFen, help="starting position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--log", default="sprt.jsonl", help="JSONL result log, used to resume the test")
+    parser.add_argument("--pgn", default=None, help="optional file finished games are appended to")
+    args = parser.parse_args()
+
+    configA, configB = getConfigs(args)
+    settings = getSettings(args, configA, configB)
+
+    sprt = Sprt(args.elo0, args.elo1, args.alpha, args.beta)
+    score = MatchScore()
+    finishedPairs = readLog(args.log, settings)
+    if finishedPairs is None:
+        finishedPairs = []
+        with open(args.log, "a") as logFile:
+            logFile.write(json.dumps(settings) + "\n")
+    for pair in finishedPairs:
+        recordPair(pair["results"], sprt, score)
+
+    print(f"A: {describeConfig(configA)}  B: {describeConfig(configB)}  Workers: {args.workers}")
+    print(f"H0: {args.elo0:+g} Elo  H1: {args.elo1:+g} Elo  alpha: {args.alpha}  beta: {args.beta}")
+    if finishedPairs:
+        print(f"Resuming after {len(finishedPairs)} pairs.  {score}  {sprt}")
+
+    donePairNums = {pair["pair"] for pair in finishedPairs}
+    tasks = [task for pairNum in range(args.max_games // 2) if pairNum not in donePairNums
+             for task in createPair(configA, configB, pairNum, args.seed, args.opening_plies, args.max_plies, args.fen)]
+
+    # Results of pairs of which only one game has finished so far, by pair number
+    halfPairs = {}
+    decision = sprt.getDecision()
+    startTime = time.perf_counter()
+
+    if decision is None and tasks:
+        with multiprocessing.Pool(args.workers) as pool, open(args.log, "a") as logFile, \
+                (open(args.pgn, "a") if args.pgn else contextlib.nullcontext()) as pgnFile:
+            for gameNum, result, pgnStr, _ in pool.imap_unordered(playGame, tasks):
+                if pgnFile:
+                    pgnFile.write(pgnStr)
+                    pgnFile.flush()
+
+                pairNum = gameNum // 2
+                halfPairs.setdefault(pairNum, [None, None])[gameNum % 2] = result
+                if None in halfPairs[pairNum]:
+                    continue
+
+                results = halfPairs.pop(pairNum)
+                logFile.write(json.dumps({"pair": pairNum, "results": results}) + "\n")
+                logFile.flush()
+
+                recordPair(results, sprt, score)
+                print(f"Pair {pairNum + 1}: {' '.join(results)}  {score}  {sprt}")
+
+                decision = sprt.getDecision()
+                if decision:
+                    # Leaving the with block terminates the games still in progress
+                    break
+
+    elapsed = time.perf_counter() - startTime
+    if decision == "H1":
+        print(f"H1 accepted: the Elo difference of A over B is {args.elo1:+g} rather than {args.elo0:+g}")
+    elif decision == "H0":
+        print(f"H0 accepted: the Elo difference of A over B is {args.elo0:+g} rather than {args.elo1:+g}")
+    else:
+        print(f"No decision after {score.getGames()} games")
+    print(f"{score}  {sprt}  Time: {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
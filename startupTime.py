@@ -0,0 +1,128 @@
+"""
+Measures cold-start times of the engine. Every measurement runs in a fresh interpreter so that nothing is already
+imported or cached, and is repeated to take the median. Results are printed and appended to a JSONL file, one line per
+run tagged with the git commit, so that regressions in startup cost can be tracked over time.
+
+Measurements:
+    - coreImport: import chessCore
+    - engineReady: import chessCore, build the starting position and make a first bot move
+    - poolWorker: spawn a multiprocessing pool worker that imports chessCore and returns a first result
+    - guiImport: import chessboard (pygame and the window code), for comparison
+
+Usage:
+    python startupTime.py --repeats 5 --log startupTimes.jsonl
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CORE_IMPORT = """
+import time
+start = time.perf_counter()
+import chessCore
+print(time.perf_counter() - start)
+"""
+
+ENGINE_READY = """
+import time
+start = time.perf_counter()
+from chessCore.chessboardBot import ChessBoardSim
+from chessCore.ChessBrain import ChessBrain
+from chessCore.fen import Fen
+chessBoard = ChessBoardSim.fromFen(Fen.startingFen, {"pawn": 10, "knight": 30, "bishop": 30, "rook": 40, "queen": 90,
+                                                     "king": 900})
+ChessBrain(chessBoard, chessBoard.getPieceSet("w_")).getMove()
+print(time.perf_counter() - start)
+"""
+
+POOL_WORKER = """
+import time
+import multiprocessing
+
+def firstResult(_):
+    from chessCore.chessboardBot import ChessBoardSim
+    from chessCore.fen import Fen
+    pieceValues = {"pawn": 10, "knight": 30, "bishop": 30, "rook": 40, "queen": 90, "king": 900}
+    return ChessBoardSim.fromFen(Fen.startingFen, pieceValues).toFen()
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        pool.map(firstResult, [0])
+    print(time.perf_counter() - start)
+"""
+
+GUI_IMPORT = """
+import os
+import time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ["PYGAME_HIDE_SUPPORT_PROMPT"] = "1"
+start = time.perf_counter()
+import chessboard
+print(time.perf_counter() - start)
+"""
+
+measurements = {"coreImport": CORE_IMPORT, "engineReady": ENGINE_READY, "poolWorker": POOL_WORKER,
+                "guiImport": GUI_IMPORT}
+
+
+def timeSnippet(code, repeats):
+    """
+    Runs code in fresh interpreters. The code must print the seconds it measured as its last line of output.
+    :param code: str of python source
+    :param repeats: int number of interpreters to start
+    :return: float median of the measured seconds, or None if the code failed (e.g. pygame is not installed)
+    """
+    # The code is run from a file rather than with -c, as spawned pool workers re-import the main module
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as codeFile:
+        codeFile.write(code)
+
+    repoDir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=repoDir)
+    times = []
+    try:
+        for _ in range(repeats):
+            result = subprocess.run([sys.executable, codeFile.name], capture_output=True, text=True, cwd=repoDir,
+                                    env=env, timeout=60)
+            if result.returncode != 0:
+                return None
+            times.append(float(result.stdout.split()[-1]))
+    except subprocess.TimeoutExpired:
+        return None
+    finally:
+        os.remove(codeFile.name)
+    return statistics.median(times)
+
+
+def getCommit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start times of the engine.")
+    parser.add_argument("--repeats", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--log", default="startupTimes.jsonl", help="JSONL file the results are appended to")
+    args = parser.parse_args()
+
+    record = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": getCommit(), "python": sys.version.split()[0],
+              "repeats": args.repeats}
+    for name, code in measurements.items():
+        seconds = timeSnippet(code, args.repeats)
+        record[name] = seconds
+        print(f"{name}: " + (f"{seconds * 1000:.1f}ms" if seconds is not None else "failed"))
+
+    with open(args.log, "a") as logFile:
+        logFile.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()